@@ -1,28 +1,63 @@
-from flask import Flask, send_from_directory, send_file, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context, g
 from flask_cors import CORS
 import os
 from dotenv import load_dotenv
 import json
 import traceback
-import PyPDF2
 import hashlib
-from openai import OpenAI
+from werkzeug.exceptions import NotFound
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import re
 import time
+import random
+import threading
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+import retrieval
+import embeddings
+import ranking
+import quiz_gen
+import ingest
+import metrics
+from atomic_file import atomic_write
+from jobs import JobQueue, JobStore
+from kb_store import KBStore
+from kb_cache import cache as kb_cache
+from response_cache import ResponseCache, cache_key
+from llm import LLMGateway, parse_model_limits
+from quiz_corpus import QuizCorpus
+from quiz_sessions import QuizSessions, FILTER_FIELDS, MAX_PAGE_SIZE
+from static_cache import StaticFiles
+from upload_spool import SpoolingRequest
+from chunked_upload import ChunkedUploads
+import sb_search
+import sb_store
+import sb_corpus
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
-client = OpenAI(api_key=os.getenv('OPENAI_API_KEY'))
+# Shared LLM gateway: pooled connections, per-model concurrency limits,
+# jittered retries on 429/5xx and an overall deadline per call
+llm = LLMGateway(
+    api_key=os.getenv('OPENAI_API_KEY'),
+    base_url=os.getenv('OPENAI_BASE_URL') or None,
+    max_connections=int(os.getenv('LLM_MAX_CONNECTIONS', 20)),
+    deadline=float(os.getenv('LLM_DEADLINE', 120)),
+    max_retries=int(os.getenv('LLM_MAX_RETRIES', 4)),
+    default_concurrency=int(os.getenv('LLM_CONCURRENCY', 8)),
+    model_concurrency=parse_model_limits(os.getenv('LLM_MODEL_CONCURRENCY', 'gpt-4=4'))
+)
+llm.observers.append(metrics.observe_llm)
 
 def get_ai_response(prompt, model="gpt-3.5-turbo"):
     try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
+        response = llm.complete(
+            model,
+            [{"role": "user", "content": prompt}],
             max_tokens=500,
             temperature=0.7
         )
@@ -31,45 +66,183 @@ def get_ai_response(prompt, model="gpt-3.5-turbo"):
         app.logger.error(f"Error getting AI response: {str(e)}")
         raise
 
+def stream_ai_response(prompt, model="gpt-3.5-turbo"):
+    """Yield completion text deltas as the model produces them."""
+    return llm.stream(
+        model,
+        [{"role": "user", "content": prompt}],
+        max_tokens=500,
+        temperature=0.7
+    )
+
+def sse_response(chunks):
+    """Send text chunks as server-sent events: data {"delta"} then a done event."""
+    def generate():
+        try:
+            for text in chunks:
+                yield f"data: {json.dumps({'delta': text}, ensure_ascii=False)}\n\n"
+            yield "event: done\ndata: {}\n\n"
+        except Exception as e:
+            app.logger.error(f"Error streaming AI response: {str(e)}\n{traceback.format_exc()}")
+            yield f"event: error\ndata: {json.dumps({'error': 'Internal server error'})}\n\n"
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'X-Accel-Buffering': 'no'})
+
+def cached_ai_response(key, prompt, model, kb_hashes, stream=False):
+    """Answer from the response cache, or call the model and remember the answer."""
+    cached = response_cache.get(key)
+    if cached is not None:
+        if stream:
+            return sse_response([cached])
+        return jsonify({"response": cached, "cached": True})
+
+    if stream:
+        def collect():
+            parts = []
+            for delta in stream_ai_response(prompt, model=model):
+                parts.append(delta)
+                yield delta
+            response_cache.put(key, "".join(parts).strip(), kb_hashes)
+        return sse_response(collect())
+
+    response = get_ai_response(prompt, model=model)
+    response_cache.put(key, response, kb_hashes)
+    return jsonify({"response": response})
+
 # Use correct static folder path
 STATIC_FOLDER = os.path.abspath(os.path.join(os.path.dirname(__file__), 'static'))
-app = Flask(__name__, static_folder=STATIC_FOLDER)
+# Flask's built-in static route is left out; serve_static below adds caching
+app = Flask(__name__, static_folder=None)
+app.static_folder = STATIC_FOLDER
+# Uploaded files are hashed while they are spooled to UPLOAD_FOLDER
+app.request_class = SpoolingRequest
 CORS(app, resources={r"/*": {"origins": "*"}})
 
-UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
+# Quiz files and quiz_index.json, served under /static/quizzes/; generated
+# quizzes are written here too
+QUIZ_DIR = os.getenv('QUIZ_DIR', os.path.join(STATIC_FOLDER, 'quizzes'))
+# Normalized, precompressed quiz bundles; stale ones are rebuilt at startup
+QUIZ_BUNDLE_DIR = os.getenv('QUIZ_BUNDLE_DIR', os.path.join(os.path.dirname(__file__), 'build', 'quizzes'))
+quiz_corpus = QuizCorpus(QUIZ_DIR, QUIZ_BUNDLE_DIR)
+# gunicorn runs the startup builds once in its master process before the
+# workers fork (see gunicorn.conf.py) and sets STARTUP_BUILDS=0 for them
+STARTUP_BUILDS = os.getenv('STARTUP_BUILDS', '1') != '0'
+if STARTUP_BUILDS:
+    quiz_corpus.build(logger=app.logger)
+quiz_sessions = QuizSessions(quiz_corpus)
+
+# CACHE_MODE=dev restores the old no-store headers on every response;
+# production serves static files and quizzes with ETags, 304s and
+# precompressed variants (see static_cache.py)
+CACHE_MODE = os.getenv('CACHE_MODE', 'production').lower()
+static_files = StaticFiles(
+    STATIC_FOLDER,
+    os.getenv('STATIC_VARIANT_DIR', os.path.join(os.path.dirname(__file__), 'build', 'static')),
+    # Only list names whose content never changes; index.html pins
+    # lucide.min.js with ?v=<content hash> instead
+    immutable_names=[n for n in os.getenv('STATIC_IMMUTABLE', '').split(',') if n]
+)
+
+UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', os.path.join(os.path.dirname(__file__), 'uploads'))
 ALLOWED_EXTENSIONS = {'txt', 'pdf', 'json'}
 MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB max file size
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
+app.config['RETRIEVAL_TOP_K'] = int(os.getenv('RETRIEVAL_TOP_K', 5))
+MAX_SEMANTIC_QUERIES = 32
+# Smart modes rank passages by blended BM25 + vector relevance (see ranking.py)
+app.config['HYBRID_ALPHA'] = float(os.getenv('HYBRID_ALPHA', ranking.HYBRID_ALPHA))
+app.config['MMR_LAMBDA'] = float(os.getenv('MMR_LAMBDA', ranking.MMR_LAMBDA))
+app.config['CONTEXT_TOKEN_BUDGETS'] = parse_model_limits(
+    os.getenv('CONTEXT_TOKEN_BUDGETS', 'gpt-3.5-turbo=1500,gpt-4=3000'))
+MODE_MODELS = {'smart': 'gpt-3.5-turbo', 'smartplus': 'gpt-4'}
+app.config['QUIZ_MAP_WORKERS'] = int(os.getenv('QUIZ_MAP_WORKERS', 4))
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
+# Files beyond MAX_CONTENT_LENGTH arrive as resumable chunked uploads
+app.config['UPLOAD_CHUNK_SIZE'] = int(os.getenv('UPLOAD_CHUNK_SIZE', 4 * 1024 * 1024))
+chunked_uploads = ChunkedUploads(
+    os.path.join(UPLOAD_FOLDER, 'chunked'),
+    max_file_size=int(os.getenv('MAX_CHUNKED_UPLOAD_SIZE', 1024 * 1024 * 1024)),
+    # A chunk and its request overhead must fit in MAX_CONTENT_LENGTH
+    max_chunk_size=MAX_CONTENT_LENGTH - 64 * 1024
+)
+
+# Job states are shared through SQLite, so any worker answers a status poll
+job_store = JobStore(os.path.join(UPLOAD_FOLDER, 'jobs.db'))
+# Uploads are converted in the background; job ids are the file hashes
+upload_jobs = JobQueue(int(os.getenv('UPLOAD_WORKERS', 2)), 'upload', logger=app.logger, store=job_store)
+quiz_jobs = JobQueue(int(os.getenv('QUIZ_WORKERS', 2)), 'quiz', logger=app.logger, store=job_store)
+quiz_index_lock = threading.Lock()
+
+# Registry of uploaded KBs; imports a legacy kb_index.json on first start
+kb_store = KBStore(os.path.join(UPLOAD_FOLDER, 'kb_index.db'),
+                   legacy_json_path=os.path.join(UPLOAD_FOLDER, 'kb_index.json'))
+
+# Completions for repeated questions over the same KBs are served from disk
+response_cache = ResponseCache(os.path.join(UPLOAD_FOLDER, 'response_cache.db'),
+                               ttl_seconds=int(os.getenv('RESPONSE_CACHE_TTL', 24 * 3600)),
+                               max_bytes=int(os.getenv('RESPONSE_CACHE_MAX_BYTES', 64 * 1024 * 1024)))
+
+# Cache lookups and KB load times are exported on /metrics
+kb_cache.observers.append(metrics.kb_cache_observer('kb'))
+embeddings.vector_cache.observers.append(metrics.kb_cache_observer('vectors'))
+response_cache.observers.append(metrics.response_cache_observer)
+
+# Full-text index and verse store over the Srimad-Bhagavatam chapters;
+# both are rebuilt in the background at startup when the chapters change
+SB_CORPUS_DIR = os.path.join(STATIC_FOLDER, 'quizzes', 'sb_advanced')
+SB_INDEX_DIR = os.getenv('SB_INDEX_DIR', os.path.join(os.path.dirname(__file__), 'build', 'sb_index'))
+SB_STORE_DIR = os.getenv('SB_STORE_DIR', os.path.join(os.path.dirname(__file__), 'build', 'sb_store'))
+sb_jobs = JobQueue(1, 'sb-index', logger=app.logger)
+sb_index_lock = threading.Lock()
+sb_index = None
+sb_verses = None
+
+def build_sb_index():
+    global sb_index
+    verses = sb_search.build_index(SB_CORPUS_DIR, SB_INDEX_DIR)
+    with sb_index_lock:
+        sb_index = sb_search.SBIndex(SB_INDEX_DIR, SB_CORPUS_DIR)
+    return {"verses": verses}
+
+def load_sb_index():
+    """The loaded SB index, or None while it has never been built."""
+    global sb_index
+    with sb_index_lock:
+        if sb_index is None and os.path.exists(os.path.join(SB_INDEX_DIR, 'meta.json')):
+            sb_index = sb_search.SBIndex(SB_INDEX_DIR, SB_CORPUS_DIR)
+        return sb_index
+
+def build_sb_store():
+    global sb_verses
+    count = sb_store.build_store(SB_CORPUS_DIR, SB_STORE_DIR)
+    with sb_index_lock:
+        sb_verses = sb_store.VerseStore(SB_STORE_DIR)
+    return {"verses": count}
+
+def load_sb_store():
+    """The opened verse store, or None while it has never been built."""
+    global sb_verses
+    with sb_index_lock:
+        if sb_verses is None and os.path.exists(os.path.join(SB_STORE_DIR, 'meta.json')):
+            sb_verses = sb_store.VerseStore(SB_STORE_DIR)
+        return sb_verses
+
+if STARTUP_BUILDS and sb_search.is_stale(SB_CORPUS_DIR, SB_INDEX_DIR):
+    sb_jobs.submit('sb-index', build_sb_index)
+if STARTUP_BUILDS and sb_store.is_stale(SB_CORPUS_DIR, SB_STORE_DIR):
+    sb_jobs.submit('sb-store', build_sb_store)
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def compute_file_hash(file):
-    file.seek(0)
-    hasher = hashlib.sha256()
-    while True:
-        chunk = file.read(8192)
-        if not chunk:
-            break
-        hasher.update(chunk)
-    file.seek(0)
-    return hasher.hexdigest()
-
 def process_text_file(file):
     content = file.read().decode('utf-8')
     return {"content": content}
 
-def process_pdf_file(file):
-    pdf_reader = PyPDF2.PdfReader(file)
-    text = ""
-    for page in pdf_reader.pages:
-        text += page.extract_text() + "\n"
-    return {"content": text}
-
 def process_json_file(file):
     try:
         content = json.load(file)
@@ -77,6 +250,78 @@ def process_json_file(file):
     except json.JSONDecodeError:
         return {"content": ""}
 
+def convert_upload(raw_path, file_extension, file_hash, original_filename):
+    """Turn a persisted upload into a knowledge base (runs in upload_jobs).
+
+    The KB is stored as a passage pack (see kb_pack.py) plus its index;
+    ``<hash>-knowledge.json`` remains its name in the registry.
+    """
+    kb_filename = f"{file_hash}-knowledge.json"
+    try:
+        if file_extension == 'pdf':
+            # PDFs are extracted page-parallel and streamed into the pack
+            ingest.ingest_pdf(raw_path, file_hash, app.config['UPLOAD_FOLDER'], name=original_filename)
+        elif file_extension == 'txt' and os.path.getsize(raw_path) > MAX_CONTENT_LENGTH:
+            # Text that only fits a chunked upload is streamed the same way;
+            # Srimad-Bhagavatam chapter chunking needs the whole text and is skipped
+            ingest.ingest_text(raw_path, file_hash, app.config['UPLOAD_FOLDER'], name=original_filename)
+        else:
+            with open(raw_path, 'rb') as file:
+                if file_extension == 'txt':
+                    knowledge = process_text_file(file)
+                elif file_extension == 'json':
+                    knowledge = process_json_file(file)
+
+            retrieval.write_index(app.config['UPLOAD_FOLDER'], file_hash, knowledge, name=original_filename)
+        kb_cache.invalidate(file_hash)
+        # Passages are embedded once here instead of in every browser
+        embeddings.write_kb_vectors(app.config['UPLOAD_FOLDER'], file_hash)
+        kb_store.add(kb_filename, original_filename, datetime.utcnow().isoformat() + 'Z')
+    finally:
+        ingest.clear_progress(file_hash)
+        if os.path.exists(raw_path):
+            os.remove(raw_path)
+    return {"knowledge_base": kb_filename}
+
+def submit_upload(file_hash, file_extension, original_filename, keep):
+    """Queue the conversion of an upload unless its KB exists or is in progress.
+
+    keep(raw_path) moves the uploaded file into place; it is only called
+    when a new job is queued. Returns the upload route's (body, status).
+    """
+    kb_filename = f"{file_hash}-knowledge.json"
+    existing_item = kb_store.get(kb_filename)
+    if existing_item:
+        return {
+            "success": True,
+            "message": f"Knowledge base for '{existing_item['original_name']}' already exists.",
+            "knowledge_base": kb_filename,
+            "job_id": file_hash,
+            "status": "done"
+        }, 200
+
+    # An identical file that is already being processed shares its job.
+    # A done job whose KB is not registered was deleted since (possibly
+    # through another worker), so the file is converted again.
+    job = upload_jobs.get(file_hash)
+    if job is not None and job['state'] == 'done':
+        upload_jobs.forget(file_hash)
+        job = None
+    if job is None or job['state'] == 'failed':
+        raw_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{file_hash}.{file_extension}")
+        keep(raw_path)
+        job, _ = upload_jobs.submit(file_hash, convert_upload, raw_path, file_extension,
+                                    file_hash, original_filename)
+
+    return {
+        "success": True,
+        "message": f"Upload of '{original_filename}' received; processing in the background.",
+        "knowledge_base": kb_filename,
+        "job_id": file_hash,
+        "status": job['state'],
+        "status_url": f"/api/upload/status/{file_hash}"
+    }, 202
+
 @app.route('/api/upload', methods=['POST'])
 def upload_file():
     try:
@@ -89,55 +334,137 @@ def upload_file():
             return jsonify({"error": f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
         
         original_filename = secure_filename(file.filename)
-        file_hash = compute_file_hash(file)
-        kb_filename = f"{file_hash}-knowledge.json"
-        kb_path = os.path.join(app.config['UPLOAD_FOLDER'], kb_filename)
+        file_extension = file.filename.rsplit('.', 1)[1].lower()
+        # The body was hashed as it was spooled; duplicates are just dropped
+        body, status = submit_upload(file.stream.sha256(), file_extension, original_filename,
+                                     file.stream.persist)
+        return jsonify(body), status
+    except Exception as e:
+        app.logger.error(f"Error in upload endpoint: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": "Internal server error"}), 500
 
-        index_path = os.path.join(app.config['UPLOAD_FOLDER'], 'kb_index.json')
-        
-        if os.path.exists(index_path):
-            with open(index_path, 'r', encoding='utf-8') as f:
-                kb_index = json.load(f)
-        else:
-            kb_index = []
-
-        if any(item['hash_name'] == kb_filename for item in kb_index):
-            existing_item = next(item for item in kb_index if item['hash_name'] == kb_filename)
-            return jsonify({
-                "success": True,
-                "message": f"Knowledge base for '{existing_item['original_name']}' already exists.",
-                "knowledge_base": kb_filename
-            })
-
-        file_extension = original_filename.rsplit('.', 1)[1].lower()
-        if file_extension == 'txt':
-            knowledge = process_text_file(file)
-        elif file_extension == 'pdf':
-            knowledge = process_pdf_file(file)
-        elif file_extension == 'json':
-            knowledge = process_json_file(file)
-        
-        with open(kb_path, 'w', encoding='utf-8') as f:
-            json.dump(knowledge, f, ensure_ascii=False, indent=2)
+@app.route('/api/upload/chunked', methods=['POST'])
+def chunked_upload_create():
+    """Start a resumable upload: {filename, size, chunk_size?, sha256?}."""
+    try:
+        data = request.get_json(silent=True) or {}
+        filename = str(data.get('filename', ''))
+        if not allowed_file(filename):
+            return jsonify({"error": f"File type not allowed. Allowed types: {', '.join(ALLOWED_EXTENSIONS)}"}), 400
+        sha256 = data.get('sha256')
+        if sha256 and kb_store.get(f"{sha256}-knowledge.json"):
+            # Nothing to send; answer like a finished upload
+            return upload_precheck(sha256)
+        try:
+            # JSON has to be parsed whole, so it keeps the single-request limit
+            upload = chunked_uploads.create(filename, data.get('size'),
+                                            data.get('chunk_size', app.config['UPLOAD_CHUNK_SIZE']), sha256,
+                                            max_size=MAX_CONTENT_LENGTH if filename.lower().endswith('.json') else None)
+        except (TypeError, ValueError) as e:
+            return jsonify({"error": str(e)}), 400
+        upload['upload_url'] = f"/api/upload/chunked/{upload['upload_id']}"
+        return jsonify(upload), 201
+    except Exception as e:
+        app.logger.error(f"Error creating chunked upload: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": "Internal server error"}), 500
 
-        kb_index.append({
-            "hash_name": kb_filename,
-            "original_name": original_filename,
-            "upload_date": datetime.utcnow().isoformat() + 'Z'
-        })
-        
-        with open(index_path, 'w', encoding='utf-8') as f:
-            json.dump(kb_index, f, ensure_ascii=False, indent=4)
+@app.route('/api/upload/chunked/<upload_id>', methods=['GET', 'DELETE'])
+def chunked_upload_status(upload_id):
+    if request.method == 'DELETE':
+        if not chunked_uploads.discard(upload_id):
+            return jsonify({"error": "Unknown upload"}), 404
+        return jsonify({"success": True})
+    upload = chunked_uploads.status(upload_id)
+    if upload is None:
+        return jsonify({"error": "Unknown upload"}), 404
+    return jsonify(upload)
+
+@app.route('/api/upload/chunked/<upload_id>/<int:index>', methods=['PUT'])
+def chunked_upload_chunk(upload_id, index):
+    """Store one chunk; the body is the raw bytes, X-Chunk-SHA256 their hash."""
+    try:
+        try:
+            upload = chunked_uploads.write_chunk(upload_id, index, request.stream,
+                                                 request.headers.get('X-Chunk-SHA256'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        if upload is None:
+            return jsonify({"error": "Unknown upload"}), 404
+        return jsonify({"upload_id": upload_id, "chunk": index, "missing": upload['missing']})
+    except Exception as e:
+        app.logger.error(f"Error storing upload chunk: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": "Internal server error"}), 500
 
-        return jsonify({
-            "success": True,
-            "message": f"Knowledge base for '{original_filename}' created successfully.",
-            "knowledge_base": kb_filename
-        })
+@app.route('/api/upload/chunked/<upload_id>/complete', methods=['POST'])
+def chunked_upload_complete(upload_id):
+    """Assemble a fully received upload and convert it like a single-request upload."""
+    try:
+        try:
+            finished = chunked_uploads.finish(upload_id)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 409
+        if finished is None:
+            return jsonify({"error": "Unknown upload"}), 404
+        data_path, file_hash, meta = finished
+        try:
+            body, status = submit_upload(file_hash, meta['filename'].rsplit('.', 1)[1].lower(),
+                                         secure_filename(meta['filename']),
+                                         lambda raw_path: os.replace(data_path, raw_path))
+        finally:
+            chunked_uploads.discard(upload_id)
+        return jsonify(body), status
     except Exception as e:
-        app.logger.error(f"Error in upload endpoint: {str(e)}\n{traceback.format_exc()}")
+        app.logger.error(f"Error completing chunked upload: {str(e)}\n{traceback.format_exc()}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/upload/<file_hash>')
+def upload_precheck(file_hash):
+    """Whether a file with this SHA-256 is known, so clients can skip sending it.
+
+    HEAD gives the answer in the status code alone: 200 when the KB exists
+    or is being processed, 404 when the file has to be uploaded.
+    """
+    if not re.fullmatch(r'[a-f0-9]{64}', file_hash):
+        return jsonify({"error": "Expected a lowercase hex SHA-256"}), 400
+    kb_filename = f"{file_hash}-knowledge.json"
+    existing_item = kb_store.get(kb_filename)
+    if existing_item:
+        return jsonify({
+            "exists": True,
+            "knowledge_base": kb_filename,
+            "original_name": existing_item['original_name'],
+            "job_id": file_hash,
+            "status": "done"
+        })
+    # Only a conversion still under way counts; the registry is the record
+    # of finished KBs, and one that was deleted has to be sent again
+    job = upload_jobs.get(file_hash)
+    if job is not None and job['state'] in ('queued', 'running'):
+        return jsonify({
+            "exists": True,
+            "knowledge_base": kb_filename,
+            "job_id": file_hash,
+            "status": job['state'],
+            "status_url": f"/api/upload/status/{file_hash}"
+        })
+    return jsonify({"exists": False}), 404
+
+@app.route('/api/upload/status/<job_id>')
+def upload_status(job_id):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        # Finished jobs are retired from the store; a KB that exists is done
+        kb_filename = f"{job_id}-knowledge.json"
+        if re.fullmatch(r'[a-f0-9]{64}', job_id) and retrieval.kb_exists(app.config['UPLOAD_FOLDER'], job_id):
+            return jsonify({"id": job_id, "state": "done", "result": {"knowledge_base": kb_filename}})
+        return jsonify({"error": "Unknown upload job"}), 404
+    if job['state'] == 'running':
+        # Page progress is only known to the worker converting the file
+        progress = ingest.get_progress(job_id)
+        if progress is not None:
+            job['progress'] = progress
+    return jsonify(job)
+
 @app.route('/api/chat', methods=['POST'])
 def chat():
     try:
@@ -152,6 +479,8 @@ def chat():
         
         mode = data['mode'].lower()
         question = data['question']
+        # Opt-in token streaming; the JSON response stays the default
+        stream = bool(data.get('stream'))
         kb_files = data.get('knowledge_bases', [])
 
         if not kb_files and 'knowledge_base' in data:
@@ -161,28 +490,38 @@ def chat():
             return jsonify({"error": "Please select a knowledge base for this mode."}), 400
 
         context = "No knowledge base provided."
-        if mode in ['Smart', 'SmartPlus'] and kb_files:
+        citation_note = ""
+        kb_hashes = []
+        if mode in ['local', 'smart', 'smartplus'] and kb_files:
             app.logger.info(f"Using knowledge bases: {kb_files}")
-            context_parts = []
             for h_name in kb_files:
-                # --- BEGIN FIX: Extract hash instead of just validating ---
                 match = re.search(r'^[a-f0-9]{64}', str(h_name))
                 if not match:
                     app.logger.warning(f"Could not find a valid hash in kb filename: {h_name}")
                     continue
-                actual_hash = match.group(0)
-                file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{actual_hash}-knowledge.json")
-                # --- END FIX ---
-                
-                if os.path.exists(file_path):
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        knowledge = json.load(f)
-                    context_parts.append(knowledge.get('content', ''))
-            
-            if context_parts:
-                context = "Information from uploaded document(s):\n" + "\n\n".join(context_parts)
+                kb_hashes.append(match.group(0))
+
+            # Only the best-matching passages go into the prompt, not whole KBs
+            if mode == 'local':
+                passages = retrieval.search(app.config['UPLOAD_FOLDER'], kb_hashes, question,
+                                            top_k=app.config['RETRIEVAL_TOP_K'])
+            else:
+                model = MODE_MODELS[mode]
+                passages = ranking.rank(
+                    app.config['UPLOAD_FOLDER'], kb_hashes, question,
+                    token_budget=app.config['CONTEXT_TOKEN_BUDGETS'].get(model, ranking.DEFAULT_TOKEN_BUDGET),
+                    alpha=app.config['HYBRID_ALPHA'], mmr_lambda=app.config['MMR_LAMBDA'])
+            if passages:
+                # Verse-chunked KBs carry citations like "SB 1.1.1"
+                context = "Information from uploaded document(s):\n" + "\n\n".join(
+                    f"[{p['citation']}] {p['text']}" if p.get('citation') else p['text'] for p in passages)
+                if any(p.get('citation') for p in passages):
+                    citation_note = ("Cite the bracketed reference, such as [SB 1.1.1], of each passage "
+                                     "you draw on, right after the statement it supports.")
 
         if mode == 'local':
+            if stream:
+                return sse_response([context])
             if context:
                 return jsonify({"response": context})
             else:
@@ -193,25 +532,25 @@ def chat():
             if not context:
                 return jsonify({"response": "I couldn't find any relevant information in the document to answer your question."})
             
-            prompt = f"""Based *only* on the following information, please answer the user's question. Do not use any external knowledge. If the answer is not contained in the provided text, say so.
+            prompt = f"""Based *only* on the following information, please answer the user's question. Do not use any external knowledge. If the answer is not contained in the provided text, say so. {citation_note}
 
             Provided Information:
             {context}
 
             Question: {question}
             """
-            response = get_ai_response(prompt, model="gpt-3.5-turbo")
-            return jsonify({"response": response})
+            key = cache_key(mode, data['role'], data['mood'], kb_hashes, question, MODE_MODELS[mode])
+            return cached_ai_response(key, prompt, MODE_MODELS[mode], kb_hashes, stream=stream)
 
         elif mode == 'smartplus':
-            prompt = f"""As {data['role']} in a {data['mood']} mood, please provide a comprehensive answer to the following question. Use the provided information from uploaded documents as primary context, but feel free to supplement with your general knowledge.
+            prompt = f"""As {data['role']} in a {data['mood']} mood, please provide a comprehensive answer to the following question. Use the provided information from uploaded documents as primary context, but feel free to supplement with your general knowledge. {citation_note}
 
             {context if context else "No specific context from documents was found."}
 
             Question: {question}
             """
-            response = get_ai_response(prompt, model="gpt-4")
-            return jsonify({"response": response})
+            key = cache_key(mode, data['role'], data['mood'], kb_hashes, question, MODE_MODELS[mode])
+            return cached_ai_response(key, prompt, MODE_MODELS[mode], kb_hashes, stream=stream)
 
         else:
             return jsonify({"error": f"Invalid mode: {mode}"}), 400
@@ -220,6 +559,40 @@ def chat():
         app.logger.error(f"Error in chat endpoint: {str(e)}\n{traceback.format_exc()}")
         return jsonify({"error": "Internal server error"}), 500
 
+@app.route('/api/semantic-search', methods=['POST'])
+def semantic_search():
+    try:
+        data = request.json
+        if not data:
+            return jsonify({"error": "No data provided"}), 400
+        # One query, or a batch scored together against each KB
+        queries = data.get('queries') if 'queries' in data else [data.get('query')]
+        if not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+            return jsonify({"error": "Provide a non-empty 'query' or list of 'queries'"}), 400
+        if len(queries) > MAX_SEMANTIC_QUERIES:
+            return jsonify({"error": f"At most {MAX_SEMANTIC_QUERIES} queries per request"}), 400
+        kb_files = data.get('knowledge_bases', [])
+        if not kb_files and 'knowledge_base' in data:
+            kb_files = [data['knowledge_base']]
+        kb_hashes = [m.group(0) for m in (re.search(r'^[a-f0-9]{64}', str(f)) for f in kb_files) if m]
+        if not kb_hashes:
+            return jsonify({"error": "Please select a knowledge base."}), 400
+        top_k = max(1, min(int(data.get('top_k', app.config['RETRIEVAL_TOP_K'])), 50))
+
+        start = time.perf_counter()
+        embedder = embeddings.get_embedder()
+        results = embeddings.search(app.config['UPLOAD_FOLDER'], kb_hashes, queries, top_k=top_k, embedder=embedder)
+        return jsonify({
+            "embedder": embedder.name,
+            "took_ms": round((time.perf_counter() - start) * 1000, 2),
+            "results": results if 'queries' in data else results[0],
+        })
+    except (TypeError, ValueError):
+        return jsonify({"error": "Invalid request"}), 400
+    except Exception as e:
+        app.logger.error(f"Error in semantic search endpoint: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": "Internal server error"}), 500
+
 @app.route('/api/settings', methods=['GET', 'POST'])
 def settings():
     if request.method == 'POST':
@@ -239,15 +612,18 @@ def settings():
 @app.route('/api/list-uploads')
 def list_uploads():
     try:
-        index_path = os.path.join(app.config['UPLOAD_FOLDER'], 'kb_index.json')
-        if os.path.exists(index_path):
-            with open(index_path, 'r', encoding='utf-8') as f:
-                kb_index = json.load(f)
-            # Sort by upload date, newest first
-            kb_index.sort(key=lambda x: x.get('upload_date', ''), reverse=True)
-            return jsonify(kb_index)
-        else:
-            return jsonify([])
+        sort = request.args.get('sort', 'upload_date')
+        descending = request.args.get('order', 'desc').lower() != 'asc'
+        limit = request.args.get('limit', type=int)
+        offset = request.args.get('offset', 0, type=int)
+        # Sorting and paging happen in the store; newest first by default
+        try:
+            items = kb_store.list(sort=sort, descending=descending, limit=limit, offset=offset)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        response = jsonify(items)
+        response.headers['X-Total-Count'] = str(kb_store.count())
+        return response
     except Exception as e:
         app.logger.error(f"Error listing uploads: {str(e)}")
         return jsonify({"error": "Internal server error"}), 500
@@ -263,28 +639,90 @@ def delete_upload(filename):
         hash_part = match.group(0)
         kb_filename = f"{hash_part}-knowledge.json"
         
-        # Delete the actual knowledge base file
-        kb_path = os.path.join(app.config['UPLOAD_FOLDER'], kb_filename)
-        if os.path.exists(kb_path):
-            os.remove(kb_path)
+        # Delete the knowledge base files
+        retrieval.delete_kb(app.config['UPLOAD_FOLDER'], hash_part)
+        embeddings.delete_vectors(app.config['UPLOAD_FOLDER'], hash_part)
+        kb_cache.invalidate(hash_part)
+        response_cache.purge_kb(hash_part)
         
-        # Remove the entry from the index
-        index_path = os.path.join(app.config['UPLOAD_FOLDER'], 'kb_index.json')
-        if os.path.exists(index_path):
-            with open(index_path, 'r', encoding='utf-8') as f:
-                kb_index = json.load(f)
-            
-            # The hash_name in the index includes the `-knowledge.json` suffix
-            index_filename_to_match = kb_filename
-            kb_index_updated = [item for item in kb_index if item.get('hash_name') != index_filename_to_match]
-            
-            with open(index_path, 'w', encoding='utf-8') as f:
-                json.dump(kb_index_updated, f, ensure_ascii=False, indent=4)
+        # Remove the entry from the index; hash_name includes the `-knowledge.json` suffix
+        kb_store.delete(kb_filename)
+        # A later upload of the same file must convert it again
+        upload_jobs.forget(hash_part)
                 
         return jsonify({"success": True, "message": f"File {filename} deleted."})
 
     except Exception as e:
         app.logger.error(f"Error deleting file {filename}: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"success": False, "error": "Internal server error"}), 500
+
+def append_quiz_index(quiz_filename, quiz_title):
+    """Add a generated quiz to quiz_index.json so the picker can list it.
+
+    The read-modify-write runs under a process lock plus an flock on a side
+    file (where available), and the new index replaces the old one
+    atomically, so concurrent jobs never lose or corrupt entries. The side
+    file lives in UPLOAD_FOLDER, outside the publicly served quiz directory.
+    """
+    index_path = os.path.join(QUIZ_DIR, 'quiz_index.json')
+    lock_path = os.path.join(app.config['UPLOAD_FOLDER'], 'quiz_index.lock')
+    with quiz_index_lock, open(lock_path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.exists(index_path):
+                with open(index_path, 'r', encoding='utf-8') as f:
+                    quiz_index = json.load(f)
+            else:
+                quiz_index = {"quizzes": []}
+            entry = {"file": quiz_filename, "title": quiz_title}
+            if quiz_index.get('default_music'):
+                entry['music'] = quiz_index['default_music']
+            # A regenerated quiz reuses its file name; list it only once
+            quizzes = [q for q in quiz_index.get('quizzes', []) if q.get('file') != quiz_filename]
+            quiz_index['quizzes'] = quizzes + [entry]
+            with atomic_write(index_path, 'w', encoding='utf-8') as f:
+                json.dump(quiz_index, f, ensure_ascii=False, indent=2)
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def run_quiz_job(job_id, kb_hashes, quiz_title):
+    """Generate a quiz from the given KBs and publish it (runs in quiz_jobs)."""
+    # Concatenate content from all selected knowledge bases
+    full_text_content = ""
+    for actual_hash in kb_hashes:
+        text = retrieval.kb_text(app.config['UPLOAD_FOLDER'], actual_hash)
+        if text is not None:
+            full_text_content += text + "\n\n"
+
+    if not full_text_content.strip():
+        raise ValueError("The selected knowledge base files are empty.")
+
+    # Sections are turned into candidate questions concurrently, then
+    # validated, deduplicated and merged into the requested count
+    quiz_data = quiz_gen.generate_quiz(
+        llm, full_text_content,
+        num_questions=quiz_gen.default_question_count(full_text_content),
+        workers=app.config['QUIZ_MAP_WORKERS'],
+        logger=app.logger,
+        on_progress=lambda done, total: quiz_jobs.update(
+            job_id, progress={"sections_done": done, "sections_total": total})
+    )
+
+    # Sanitize quiz title for the filename; the job id keeps it unique
+    safe_title = re.sub(r'[^a-zA-Z0-9_]', '_', quiz_title)
+    quiz_filename = f"quiz_{safe_title}_{job_id}.json"
+    quiz_filepath = os.path.join(QUIZ_DIR, quiz_filename)
+
+    # The quiz directory is served as-is, so never expose a partial file
+    with atomic_write(quiz_filepath, 'w', encoding='utf-8') as f:
+        json.dump(quiz_data, f, indent=2)
+    append_quiz_index(quiz_filename, quiz_title)
+    quiz_corpus.build([quiz_filename], logger=app.logger)
+
+    return {"file": quiz_filename, "questions": len(quiz_data['questions'])}
+
 @app.route('/api/generate_quiz', methods=['POST'])
 def generate_quiz_route():
     data = request.get_json()
@@ -295,131 +733,233 @@ def generate_quiz_route():
         return jsonify({"success": False, "error": "No knowledge base files provided."}), 400
 
     try:
-        # Concatenate content from all selected knowledge bases
-        full_text_content = ""
+        kb_hashes = []
         for h_name in kb_filenames:
-            # --- BEGIN FIX: Extract hash instead of just validating ---
             match = re.search(r'^[a-f0-9]{64}', str(h_name))
             if not match:
                 app.logger.warning(f"Could not find a valid hash in quiz-gen kb filename: {h_name}")
                 continue
-            actual_hash = match.group(0)
-            file_path = os.path.join(app.config['UPLOAD_FOLDER'], f"{actual_hash}-knowledge.json")
-            # --- END FIX ---
-
-            if os.path.exists(file_path):
-                with open(file_path, 'r', encoding='utf-8') as f:
-                    kb_data = json.load(f)
-                    full_text_content += kb_data.get('content', '') + "\n\n"
-        
-        if not full_text_content.strip():
-            return jsonify({"success": False, "error": "The selected knowledge base files are empty."}), 400
-
-        # --- BEGIN FIX: Make quiz generation prompt much stricter ---
-        num_questions = max(5, min(25, len(full_text_content.split()) // 200))
-
-        # System prompt with very specific instructions and a clear example
-        system_prompt = f"""
-You are an expert quiz creator. Your task is to generate a JSON object containing a quiz with exactly {num_questions} questions based on the provided text.
-
-RULES:
-1. The output MUST be a single, valid JSON object.
-2. The JSON object must have one top-level key: "questions".
-3. "questions" must be an array of question objects.
-4. Each question object must have the following keys: "question" (string), "options" (an array of 4 strings), and "answer" (a string that exactly matches one of the options).
-5. DO NOT include any text, explanations, or markdown formatting outside of the main JSON object.
-
-EXAMPLE JSON FORMAT:
-{{
-  "questions": [
-    {{
-      "question": "What is the capital of France?",
-      "options": ["London", "Berlin", "Paris", "Madrid"],
-      "answer": "Paris"
-    }},
-    {{
-      "question": "What is 2 + 2?",
-      "options": ["3", "4", "5", "6"],
-      "answer": "4"
-    }}
-  ]
-}}
-
-Now, create the quiz based on the following text:
-"""
-        
-        user_prompt = full_text_content
-        
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_prompt}
-        ]
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=messages,
-            temperature=0.5,
-        )
-        
-        response_text = response.choices[0].message['content']
-        # --- END FIX ---
-        
-        # Clean the response to ensure it's valid JSON
-        # Find the first '{' and the last '}' to extract the JSON object
-        start_index = response_text.find('{')
-        end_index = response_text.rfind('}')
-        if start_index == -1 or end_index == -1:
-            raise ValueError("AI response did not contain a valid JSON object.")
-        
-        json_string = response_text[start_index:end_index+1]
-        
-        quiz_data = json.loads(json_string)
-
-        # Sanitize quiz title for the filename
-        safe_title = re.sub(r'[^a-zA-Z0-9_]', '_', quiz_title)
-        quiz_filename = f"quiz_{safe_title}_{int(time.time())}.json"
-        quiz_filepath = os.path.join('static', 'quizzes', quiz_filename)
+            kb_hashes.append(match.group(0))
+        if not kb_hashes:
+            return jsonify({"success": False, "error": "No valid knowledge base files provided."}), 400
 
-        with open(quiz_filepath, 'w', encoding='utf-8') as f:
-            json.dump(quiz_data, f, indent=2)
+        # Identical requests (same KBs and title) share one job
+        job_key = json.dumps([sorted(set(kb_hashes)), quiz_title], ensure_ascii=False)
+        job_id = hashlib.sha256(job_key.encode('utf-8')).hexdigest()[:32]
+        job, _ = quiz_jobs.submit(job_id, run_quiz_job, job_id, sorted(set(kb_hashes)), quiz_title)
 
-        return jsonify({"success": True, "file": quiz_filename})
-    except json.JSONDecodeError:
-        app.logger.error(f"Quiz Generation Failed: AI returned invalid JSON. Response was:\n{response_text}")
-        return jsonify({"success": False, "error": "The AI returned an invalid format. Please try again."}), 500
+        return jsonify({
+            "success": True,
+            "job_id": job_id,
+            "status": job['state'],
+            "status_url": f"/api/generate_quiz/status/{job_id}"
+        }), 202
     except Exception as e:
         app.logger.error(f"An unexpected error occurred during quiz generation: {e}")
         return jsonify({"success": False, "error": f"An unexpected error occurred: {str(e)}"}), 500
 
+@app.route('/api/generate_quiz/status/<job_id>')
+def generate_quiz_status(job_id):
+    job = quiz_jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown quiz job"}), 404
+    return jsonify(job)
+
+@app.route('/api/kb-cache/stats')
+def kb_cache_stats():
+    return jsonify(kb_cache.stats())
+
+@app.route('/api/response-cache/stats')
+def response_cache_stats():
+    return jsonify(response_cache.stats())
+
+@app.route('/api/llm/stats')
+def llm_stats():
+    return jsonify(llm.stats())
+
+@app.route('/api/sb/search')
+def sb_search_route():
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "No query provided"}), 400
+    top_k = max(1, min(50, request.args.get('k', 10, type=int)))
+    canto = request.args.get('canto', type=int)
+    try:
+        index = load_sb_index()
+        if index is None:
+            job, _ = sb_jobs.submit('sb-index', build_sb_index)
+            return jsonify({"error": "The search index is being built, please try again shortly",
+                            "status": job['state']}), 503, {'Retry-After': '10'}
+
+        start = time.perf_counter()
+        total, results = index.search(query, top_k=top_k, canto=canto)
+        return jsonify({
+            "query": query,
+            "total": total,
+            "took_ms": round((time.perf_counter() - start) * 1000, 2),
+            "results": results
+        })
+    except Exception as e:
+        app.logger.error(f"Error searching SB for {query!r}: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/api/sb/<int:canto>/<int:chapter>/<verse>')
+def sb_verse(canto, chapter, verse):
+    try:
+        store = load_sb_store()
+        if store is None:
+            job, _ = sb_jobs.submit('sb-store', build_sb_store)
+            return jsonify({"error": "The verse store is being built, please try again shortly",
+                            "status": job['state']}), 503, {'Retry-After': '10'}
+
+        record = store.get(canto, chapter, verse)
+        if record is None:
+            return jsonify({"error": f"No verse {sb_corpus.ref(canto, chapter, verse)}"}), 404
+        fields = [f for f in request.args.get('fields', '').split(',') if f]
+        if fields:
+            record = {k: v for k, v in record.items()
+                      if k in fields or k in ('ref', 'canto', 'chapter', 'verse')}
+        return jsonify(record)
+    except Exception as e:
+        app.logger.error(f"Error reading SB {canto}.{chapter}.{verse}: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": "Internal server error"}), 500
+
 # --- Serve quizzes and quiz index ---
 @app.route('/api/quiz_data/<path:filename>')
 def get_quiz_data(filename):
-    quizzes_dir = os.path.join(app.static_folder, 'quizzes')
-    return send_from_directory(quizzes_dir, filename)
+    entry = quiz_corpus.current(filename)
+    if entry is None:
+        return static_files.send(QUIZ_DIR, filename)
+    return static_files.send(quiz_corpus.bundle_dir, entry['bundle'], mimetype='application/json')
+
+@app.route('/api/quiz_manifest')
+def get_quiz_manifest():
+    fields = ('questions', 'categories', 'difficulties', 'types')
+    return jsonify({filename: {k: entry[k] for k in fields}
+                    for filename, entry in quiz_corpus.manifest['quizzes'].items()})
+
+def quiz_filename(quiz_id):
+    return quiz_id if quiz_id.endswith('.json') else f"{quiz_id}.json"
+
+@app.route('/api/quiz/<path:quiz_id>/session')
+def quiz_session(quiz_id):
+    try:
+        index = quiz_sessions.get(quiz_filename(quiz_id))
+        if index is None:
+            return jsonify({"error": f"Unknown quiz: {quiz_id}"}), 404
+
+        size = max(1, min(MAX_PAGE_SIZE, request.args.get('n', 10, type=int)))
+        page = max(0, request.args.get('page', 0, type=int))
+        # The seed fixes the shuffle so later pages never repeat questions
+        seed = request.args.get('seed', type=int)
+        if seed is None:
+            seed = random.randrange(2 ** 31)
+        filters = {}
+        for field in FILTER_FIELDS:
+            values = [v for v in request.args.get(field, '').split(',') if v]
+            if values:
+                filters[field] = values
+
+        questions, total = index.page(filters, seed, size, page)
+        return jsonify({
+            "quiz": quiz_filename(quiz_id),
+            "version": index.version,
+            "seed": seed,
+            "page": page,
+            "total": total,
+            "next_page": page + 1 if (page + 1) * size < total else None,
+            "questions": questions
+        })
+    except Exception as e:
+        app.logger.error(f"Error creating quiz session for {quiz_id}: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": "Internal server error"}), 500
 
-@app.route('/static/quizzes/quiz_index.json')
-def serve_quiz_index():
-    quizzes_dir = os.path.join(app.static_folder, 'quizzes')
-    return send_from_directory(quizzes_dir, 'quiz_index.json')
+@app.route('/api/quiz/<path:quiz_id>/check', methods=['POST'])
+def quiz_check(quiz_id):
+    try:
+        index = quiz_sessions.get(quiz_filename(quiz_id))
+        if index is None:
+            return jsonify({"error": f"Unknown quiz: {quiz_id}"}), 404
+        data = request.get_json(silent=True) or {}
+        if data.get('version') and data['version'] != index.version:
+            return jsonify({"error": "Quiz has changed since the session started", "version": index.version}), 409
+
+        answers = data.get('answers')
+        if answers is None and 'id' in data:
+            answers = [data]
+        if not isinstance(answers, list) or not answers:
+            return jsonify({"error": "No answers provided"}), 400
+
+        results = []
+        for item in answers:
+            qid = item.get('id') if isinstance(item, dict) else None
+            if not isinstance(qid, int) or not 0 <= qid < len(index.questions):
+                return jsonify({"error": f"Invalid question id: {qid}"}), 400
+            results.append(index.check(qid, item.get('answer', '')))
+        return jsonify({"version": index.version, "results": results,
+                        "score": sum(r['correct'] for r in results)})
+    except Exception as e:
+        app.logger.error(f"Error checking answers for {quiz_id}: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({"error": "Internal server error"}), 500
+
+@app.route('/static/quizzes/<path:filename>')
+def serve_quiz_file(filename):
+    # Anything not in a separate QUIZ_DIR (the crawler's data) stays in static/quizzes
+    try:
+        return static_files.send(QUIZ_DIR, filename)
+    except NotFound:
+        if os.path.abspath(QUIZ_DIR) == os.path.join(app.static_folder, 'quizzes'):
+            raise
+        return static_files.send(os.path.join(app.static_folder, 'quizzes'), filename)
 
 # --- Serve main app page ---
 @app.route('/')
 def index():
-    index_path = os.path.join(app.static_folder, 'index.html')
-    return send_file(index_path)
+    return static_files.send(app.static_folder, 'index.html')
 
 # --- Serve any static file (JS, CSS, etc.) ---
 @app.route('/static/<path:path>')
 def serve_static(path):
-    return send_from_directory(app.static_folder, path)
+    return static_files.send(app.static_folder, path)
+
+@app.route('/metrics')
+def metrics_route():
+    body, content_type = metrics.render()
+    return Response(body, content_type=content_type)
+
+# Endpoints timed together as route "static" instead of one series per rule
+STATIC_ENDPOINTS = {'index', 'serve_static', 'serve_quiz_file'}
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.teardown_request
+def record_request_latency(exc):
+    # Runs after a streamed response has sent its last chunk
+    start = g.pop('request_start', None)
+    if start is None:
+        return
+    if request.endpoint in STATIC_ENDPOINTS:
+        route = 'static'
+    elif request.url_rule is not None:
+        route = request.url_rule.rule
+    else:
+        route = 'unmatched'
+    status = 500 if exc is not None else g.pop('response_status', 500)
+    metrics.observe_request(route, request.method, status, time.perf_counter() - start)
 
-# Add this to prevent caching during development
 @app.after_request
 def add_header(response):
-    print(f"Adding no-cache headers for {request.path}")
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    g.response_status = response.status_code
+    if CACHE_MODE == 'dev':
+        # Never cache anything while developing
+        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+        response.headers['Pragma'] = 'no-cache'
+        response.headers['Expires'] = '0'
+    elif 'Cache-Control' not in response.headers:
+        # API responses are computed per request
+        response.headers['Cache-Control'] = 'no-store'
     return response
 
 if __name__ == '__main__':
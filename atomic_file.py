@@ -0,0 +1,35 @@
+"""Atomic replacement of files that readers may open at any time.
+
+The new contents go to a temporary file next to the target, which is then
+renamed over it, so readers see either the old file or the new one. Each
+writer gets its own temporary name, so threads and processes writing the
+same target never clobber each other's partial file; the last rename wins.
+"""
+import os
+import uuid
+from contextlib import contextmanager
+
+
+def temp_path(path, suffix='.tmp'):
+    """A temporary name next to path that no other writer will use."""
+    return f"{path}.{uuid.uuid4().hex}{suffix}"
+
+
+def discard(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def atomic_write(path, mode='wb', encoding=None):
+    """Open a temporary file for writing; it replaces path if the block succeeds."""
+    tmp_path = temp_path(path)
+    try:
+        with open(tmp_path, mode, encoding=encoding) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        discard(tmp_path)
+        raise
@@ -0,0 +1,112 @@
+"""Compare the legacy JSON KB files with the segmented pack (kb_pack.py).
+
+"before" is a KB as uploads used to store it: a pretty-printed
+``<hash>-knowledge.json`` plus an index carrying every passage inline.
+"after" is the same document written by retrieval.write_index: a
+compressed passage pack plus an index without passages. Each request
+runs in a fresh process, as in a worker with a cold KB cache, and reports
+its latency and the growth of peak RSS over the process baseline.
+
+Usage: python benchmarks/bench_kb_format.py [--words 1000000] [--repeat 3]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import retrieval  # noqa: E402
+from synthetic import make_text  # noqa: E402
+
+QUESTION = "What did the king ask the sages about dharma?"
+
+
+def read_passage(folder, kb_hash):
+    passages = retrieval.load_passages(folder, kb_hash)[0]
+    return passages[len(passages) // 2]
+
+
+REQUESTS = {
+    # chat: BM25 top-5 passages for a question
+    "chat search": lambda folder, h: retrieval.search(folder, [h], QUESTION, top_k=5),
+    # citation lookup: one passage by id
+    "read passage": read_passage,
+    # quiz generation: the whole document text
+    "quiz text": lambda folder, h: retrieval.kb_text(folder, h),
+}
+
+
+def peak_rss_kb():
+    # VmHWM starts afresh at exec; ru_maxrss would carry over the parent's peak
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except FileNotFoundError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def child(folder, kb_hash, request):
+    baseline = peak_rss_kb()
+    start = time.perf_counter()
+    REQUESTS[request](folder, kb_hash)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"ms": elapsed * 1000, "rss_kb": peak_rss_kb() - baseline}))
+
+
+def write_legacy(folder, kb_hash, text):
+    """The pre-pack layout: JSON blob plus an index with inline passages."""
+    with open(os.path.join(folder, f"{kb_hash}-knowledge.json"), 'w', encoding='utf-8') as f:
+        json.dump({"content": text}, f, ensure_ascii=False, indent=2)
+    index = retrieval.build_index(retrieval.split_passages(text))
+    with open(retrieval.index_path(folder, kb_hash), 'w', encoding='utf-8') as f:
+        json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+
+
+def measure(folder, kb_hash, request, repeat):
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, __file__, '--child', folder, kb_hash, request],
+                             check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(out))
+    return min(r['ms'] for r in runs), min(r['rss_kb'] for r in runs)
+
+
+def folder_bytes(folder, kb_hash):
+    return sum(os.path.getsize(os.path.join(folder, name)) for name in os.listdir(folder) if name.startswith(kb_hash))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--words', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--child', nargs=3, metavar=('FOLDER', 'HASH', 'REQUEST'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(*args.child)
+        return
+
+    text = make_text(args.words)
+    kb_hash = '0' * 64
+    with tempfile.TemporaryDirectory() as before, tempfile.TemporaryDirectory() as after:
+        write_legacy(before, kb_hash, text)
+        retrieval.write_index(after, kb_hash, {"content": text})
+        print(f"{args.words} words: before {folder_bytes(before, kb_hash) / 1e6:.1f} MB on disk, "
+              f"after {folder_bytes(after, kb_hash) / 1e6:.1f} MB\n")
+
+        print(f"{'request':<14}{'before ms':>11}{'after ms':>10}{'before RSS MB':>15}{'after RSS MB':>14}")
+        for request in REQUESTS:
+            ms_before, rss_before = measure(before, kb_hash, request, args.repeat)
+            ms_after, rss_after = measure(after, kb_hash, request, args.repeat)
+            print(f"{request:<14}{ms_before:>11.1f}{ms_after:>10.1f}{rss_before / 1024:>15.1f}{rss_after / 1024:>14.1f}")
+
+
+if __name__ == '__main__':
+    main()
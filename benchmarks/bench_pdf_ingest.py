@@ -0,0 +1,65 @@
+"""Compare serial PDF extraction with the streaming, page-parallel ingest.
+
+Usage: python benchmarks/bench_pdf_ingest.py [--pages 300] [--workers 4]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import PyPDF2  # noqa: E402
+
+import ingest  # noqa: E402
+import retrieval  # noqa: E402
+from synthetic import make_pdf  # noqa: E402
+
+
+def serial_extract(pdf_bytes):
+    # The pre-streaming implementation of process_pdf_file()
+    reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+    text = ""
+    for page in reader.pages:
+        text += page.extract_text() + "\n"
+    return {"content": text}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', type=int, default=300)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    pdf_bytes = make_pdf(args.pages)
+    print(f"synthetic pdf: {args.pages} pages, {len(pdf_bytes) / 1e6:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as folder:
+        pdf_path = os.path.join(folder, 'doc.pdf')
+        with open(pdf_path, 'wb') as f:
+            f.write(pdf_bytes)
+
+        start = time.perf_counter()
+        knowledge = serial_extract(pdf_bytes)
+        with open(os.path.join(folder, 'serial.json'), 'w', encoding='utf-8') as f:
+            json.dump(knowledge, f, ensure_ascii=False, indent=2)
+        serial = time.perf_counter() - start
+        print(f"serial extract + dump:      {serial:.2f}s")
+
+        ingest.PDF_WORKERS = args.workers
+        kb_hash = '0' * 64
+        start = time.perf_counter()
+        ingest.ingest_pdf(pdf_path, kb_hash, folder)
+        streamed = time.perf_counter() - start
+        print(f"streaming ingest ({args.workers} workers): {streamed:.2f}s  (includes BM25 index)")
+
+        # The pack keeps words, not the page layout
+        assert retrieval.kb_text(folder, kb_hash).split() == knowledge['content'].split(), "streamed content differs"
+        print(f"speedup: {serial / streamed:.1f}x, progress: {ingest.get_progress(kb_hash)}")
+
+
+if __name__ == '__main__':
+    main()
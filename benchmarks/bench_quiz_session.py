@@ -0,0 +1,51 @@
+"""Compare the full quiz download with a 10-question server-side session.
+
+Usage: python benchmarks/bench_quiz_session.py [--quiz hollywood_quiz.json] [--n 10]
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import app  # noqa: E402
+
+
+def measure(client, url, headers, repeat):
+    best = float('inf')
+    size = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, headers=headers)
+        best = min(best, time.perf_counter() - start)
+        size = len(response.get_data())
+    return size, best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--quiz', default='hollywood_quiz.json')
+    parser.add_argument('--n', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    client = app.test_client()
+    raw_path = os.path.join(app.static_folder, 'quizzes', args.quiz)
+    cases = [
+        ("raw source file", f"/static/quizzes/{args.quiz}", {}),
+        ("bundle, identity", f"/api/quiz_data/{args.quiz}", {}),
+        ("bundle, gzip", f"/api/quiz_data/{args.quiz}", {'Accept-Encoding': 'gzip'}),
+        (f"session n={args.n}", f"/api/quiz/{args.quiz}/session?n={args.n}", {}),
+        (f"session n={args.n} + filter", f"/api/quiz/{args.quiz}/session?n={args.n}&difficulty=easy", {}),
+    ]
+    print(f"{args.quiz}: {os.path.getsize(raw_path)} bytes on disk\n")
+    print(f"{'path':<28}{'payload bytes':>14}{'best ms':>10}")
+    for name, url, headers in cases:
+        size, latency = measure(client, url, headers, args.repeat)
+        print(f"{name:<28}{size:>14}{latency * 1000:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
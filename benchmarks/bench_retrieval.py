@@ -0,0 +1,87 @@
+"""Compare whole-KB concatenation with passage retrieval for /api/chat.
+
+Usage: python benchmarks/bench_retrieval.py [--words 400000] [--kbs 2]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import retrieval  # noqa: E402
+
+QUESTIONS = [
+    "What did the king ask the sages about dharma?",
+    "Where was the river described in the third chapter?",
+    "Who taught the student about the festival of lights?",
+]
+
+
+def make_kb(words, seed):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(20000)] + "king sages dharma river chapter festival lights student".split()
+    return {"content": " ".join(rng.choice(vocab) for _ in range(words))}
+
+
+def concat_prompt(folder, hashes):
+    parts = []
+    for h in hashes:
+        with open(os.path.join(folder, f"{h}-knowledge.json"), 'r', encoding='utf-8') as f:
+            parts.append(json.load(f).get('content', ''))
+    return "Information from uploaded document(s):\n" + "\n\n".join(parts)
+
+
+def retrieval_prompt(folder, hashes, question, top_k):
+    passages = retrieval.search(folder, hashes, question, top_k=top_k)
+    return "Information from uploaded document(s):\n" + "\n\n".join(p['text'] for p in passages)
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--words', type=int, default=400000)
+    parser.add_argument('--kbs', type=int, default=2)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        hashes = []
+        for i in range(args.kbs):
+            h = f"{i:064x}"
+            knowledge = make_kb(args.words, i)
+            with open(os.path.join(folder, f"{h}-knowledge.json"), 'w', encoding='utf-8') as f:
+                json.dump(knowledge, f, ensure_ascii=False, indent=2)
+            start = time.perf_counter()
+            retrieval.write_index(folder, h, knowledge)
+            print(f"indexed kb {i}: {args.words} words in {time.perf_counter() - start:.2f}s")
+            hashes.append(h)
+
+        print(f"\n{'path':<14}{'prompt chars':>14}{'latency ms':>12}")
+        for question in QUESTIONS:
+            t_concat, p_concat = timed(lambda: concat_prompt(folder, hashes), args.repeat)
+            t_retr, p_retr = timed(lambda: retrieval_prompt(folder, hashes, question, args.top_k), args.repeat)
+            print(f"{'concatenate':<14}{len(p_concat):>14}{t_concat * 1000:>12.1f}")
+            print(f"{'retrieval':<14}{len(p_retr):>14}{t_retr * 1000:>12.1f}")
+
+            indexes = [retrieval.load_index(folder, h) for h in hashes]
+            terms = retrieval.tokenize(question)
+            t_warm, _ = timed(lambda: [retrieval.score_index(ix, terms) for ix in indexes], args.repeat)
+            print(f"{'  warm search':<14}{'':>14}{t_warm * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
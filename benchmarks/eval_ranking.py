@@ -0,0 +1,109 @@
+"""Recall@k of the chat retrieval stages on questions from the bundled quizzes.
+
+Every quiz question with a real explanation becomes a labelled pair: the
+explanation is a passage of a KB built from its quiz file, and the
+question, which never contains the answer, is the query. A query hits
+at k when its own explanation is among the first k passages returned
+across all the KBs.
+
+Usage: python benchmarks/eval_ranking.py [--k 1,3,5] [--alpha 0.3,0.5,0.7] [--embedder hashing]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import embeddings  # noqa: E402
+import ranking  # noqa: E402
+import retrieval  # noqa: E402
+from quiz_corpus import convert_to_flat_array  # noqa: E402
+
+QUIZ_DIR = os.path.join(os.path.dirname(__file__), '..', 'static', 'quizzes')
+MIN_EXPLANATION_WORDS = 8
+# Large enough that the token budget never cuts a top-k list short
+UNLIMITED_BUDGET = 10 ** 9
+
+
+def labelled_set(quiz_dir=QUIZ_DIR):
+    """Return ({kb_hash: [passage, ...]}, [(question, kb_hash, passage_id), ...])."""
+    kbs = {}
+    questions = []
+    for i, path in enumerate(sorted(glob.glob(os.path.join(quiz_dir, '*.json')))):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                items = convert_to_flat_array(json.load(f))
+        except ValueError:
+            continue
+        kb_hash = f"{i:064x}"
+        passages = []
+        seen = {}
+        for item in items:
+            if not isinstance(item, dict) or not item.get('question'):
+                continue
+            explanation = str(item.get('explanation', '')).strip()
+            if len(explanation.split()) < MIN_EXPLANATION_WORDS:
+                continue
+            if explanation not in seen:
+                seen[explanation] = len(passages)
+                passages.append(explanation)
+            questions.append((item['question'], kb_hash, seen[explanation]))
+        if passages:
+            kbs[kb_hash] = passages
+    return kbs, questions
+
+
+def evaluate(name, retrieve, questions, ks):
+    hits = {k: 0 for k in ks}
+    start = time.perf_counter()
+    for question, kb_hash, pid in questions:
+        ranked = [(r['kb'], r['passage']) for r in retrieve(question, max(ks))]
+        for k in ks:
+            hits[k] += (kb_hash, pid) in ranked[:k]
+    elapsed = time.perf_counter() - start
+    row = "".join(f"{hits[k] / len(questions):>10.3f}" for k in ks)
+    print(f"{name:<26}{row}{elapsed / len(questions) * 1000:>10.2f}")
+    return {k: hits[k] / len(questions) for k in ks}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--k', default='1,3,5')
+    parser.add_argument('--alpha', default='0.3,0.5,0.7', help="vector weights of the hybrid blends")
+    parser.add_argument('--mmr-lambda', type=float, default=ranking.MMR_LAMBDA)
+    parser.add_argument('--embedder', default=None, help="EMBEDDER spec, e.g. hashing:1024")
+    args = parser.parse_args()
+    ks = [int(k) for k in args.k.split(',')]
+    alphas = [float(a) for a in args.alpha.split(',')]
+
+    kbs, questions = labelled_set()
+    embedder = embeddings.get_embedder(args.embedder)
+    print(f"{len(questions)} questions over {sum(len(p) for p in kbs.values())} passages in {len(kbs)} KBs; "
+          f"embedder {embedder.name}\n")
+
+    with tempfile.TemporaryDirectory() as folder:
+        for kb_hash, passages in kbs.items():
+            retrieval.write_passage_index(folder, kb_hash, passages)
+            embeddings.write_vectors(folder, kb_hash, passages, embedder)
+        hashes = list(kbs)
+
+        def hybrid(alpha, mmr_lambda):
+            return lambda q, k: ranking.rank(folder, hashes, q, token_budget=UNLIMITED_BUDGET, alpha=alpha,
+                                             mmr_lambda=mmr_lambda, max_passages=k, embedder=embedder)
+
+        print(f"{'method':<26}" + "".join(f"{f'R@{k}':>10}" for k in ks) + f"{'ms/query':>10}")
+        evaluate("bm25", lambda q, k: retrieval.search(folder, hashes, q, top_k=k), questions, ks)
+        evaluate("vector", lambda q, k: embeddings.search(folder, hashes, [q], top_k=k, embedder=embedder)[0],
+                 questions, ks)
+        for alpha in alphas:
+            evaluate(f"hybrid a={alpha}", hybrid(alpha, 1.0), questions, ks)
+        for alpha in alphas:
+            evaluate(f"hybrid a={alpha} mmr={args.mmr_lambda}", hybrid(alpha, args.mmr_lambda), questions, ks)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,457 @@
+"""Offline load test of the HTTP API against tools/fake_openai.py.
+
+The fake OpenAI server and the app run as subprocesses on local ports.
+The app is served by Werkzeug's threaded server or by gunicorn with
+gunicorn.conf.py and ``--workers`` processes, and keeps its uploads in a
+temporary folder. Upload and quiz jobs are tracked in that folder's
+jobs.db, so status polls may be answered by any gunicorn worker.
+Scenarios run with ``--concurrency`` clients:
+
+* upload: an upload storm of synthetic text, JSON and PDF documents, a
+  share of them re-uploads of earlier ones. It times the upload request
+  and the wait until the KB is ready;
+* chat: local, smart and smartplus questions over two KBs. A share of
+  them are streamed, and a share repeat earlier questions, which the
+  response cache answers;
+* quiz: concurrent quiz generation jobs, timed from submission until
+  done. The app's QUIZ_DIR is a scratch directory whose quiz_index.json
+  lists no quizzes, so static/quizzes is left untouched.
+
+Each run prints p50/p95/p99 latency and throughput per request type and
+appends them, with the commit id, to benchmarks/results/load_test.jsonl.
+The last stored run with the same settings is shown next to the new
+numbers. With ``--max-regression`` the script exits non-zero when a p95
+grew, or a throughput fell, by more than that fraction.
+
+Usage: python benchmarks/load_test.py [--scenario all] [--requests 100] [--concurrency 8]
+           [--llm-latency 0.2] [--tokens-per-sec 200] [--server werkzeug] [--workers 2]
+           [--max-regression 0.2]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from synthetic import TOPIC_WORDS, VOCAB_SIZE, make_json, make_pdf, make_text  # noqa: E402
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'load_test.jsonl')
+QUIZ_INDEX = os.path.join(ROOT, 'static', 'quizzes', 'quiz_index.json')
+SCENARIOS = ('upload', 'chat', 'quiz')
+POLL_SECONDS = 0.05
+# Arguments that make two runs comparable
+SETTINGS = ('requests', 'concurrency', 'quiz_jobs', 'llm_latency', 'tokens_per_sec', 'server',
+            'workers', 'doc_words', 'duplicates', 'chat_mix', 'stream', 'repeat', 'seed')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"process exited with code {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+
+def serve(port):
+    """Child process: the app on Werkzeug's threaded server."""
+    from werkzeug.serving import make_server
+    from app import app
+    make_server('127.0.0.1', port, app, threaded=True).serve_forever()
+
+
+class Services:
+    """The fake OpenAI server and the app, with a scratch upload folder."""
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix='load-test-')
+        self.log_path = os.path.join(self.workdir, 'server.log')
+        self.processes = []
+        self.log = open(self.log_path, 'ab')
+
+    def _start(self, command, port, env=None):
+        process = subprocess.Popen(command, cwd=ROOT, env=env, stdout=self.log, stderr=subprocess.STDOUT)
+        self.processes.append(process)
+        try:
+            wait_for_port(port, process)
+        except RuntimeError as e:
+            with open(self.log_path, 'r', errors='replace') as f:
+                tail = f.read()[-3000:]
+            raise RuntimeError(f"{command[1]}: {e}\n{tail}") from None
+
+    def __enter__(self):
+        llm_port = free_port()
+        self._start([sys.executable, os.path.join(ROOT, 'tools', 'fake_openai.py'), '--port', str(llm_port),
+                     '--latency', str(self.args.llm_latency), '--tokens-per-sec', str(self.args.tokens_per_sec)],
+                    llm_port)
+
+        port = free_port()
+        env = dict(os.environ,
+                   OPENAI_API_KEY='load-test',
+                   OPENAI_BASE_URL=f"http://127.0.0.1:{llm_port}/v1",
+                   UPLOAD_FOLDER=os.path.join(self.workdir, 'uploads'),
+                   QUIZ_DIR=os.path.join(self.workdir, 'quizzes'),
+                   QUIZ_BUNDLE_DIR=os.path.join(self.workdir, 'quiz_bundles'),
+                   PROMETHEUS_MULTIPROC_DIR=os.path.join(self.workdir, 'metrics'),
+                   WEB_CONCURRENCY=str(self.args.workers),
+                   PORT=str(port))
+        os.makedirs(env['PROMETHEUS_MULTIPROC_DIR'])
+        os.makedirs(env['QUIZ_DIR'])
+        with open(QUIZ_INDEX, 'r', encoding='utf-8') as f:
+            quiz_index = json.load(f)
+        with open(os.path.join(env['QUIZ_DIR'], 'quiz_index.json'), 'w', encoding='utf-8') as f:
+            json.dump(dict(quiz_index, quizzes=[]), f)
+        if self.args.server == 'gunicorn':
+            command = [shutil.which('gunicorn') or 'gunicorn', '-c', os.path.join(ROOT, 'gunicorn.conf.py'), 'app:app']
+        else:
+            command = [sys.executable, os.path.abspath(__file__), '--serve', str(port)]
+        self._start(command, port, env)
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self
+
+    def __exit__(self, *exc):
+        for process in reversed(self.processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self.log.close()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def add(self, series, seconds):
+        with self._lock:
+            self.latencies.setdefault(series, []).append(seconds)
+
+    def error(self, series, message):
+        with self._lock:
+            self.errors.setdefault(series, []).append(message)
+
+
+def percentile(ordered, q):
+    """Linearly interpolated q-quantile (0..1) of a sorted list."""
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q
+    low = int(position)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+
+def summarize(recorder, wall_seconds):
+    series = {}
+    for name in sorted(set(recorder.latencies) | set(recorder.errors)):
+        ordered = sorted(recorder.latencies.get(name, []))
+        series[name] = {
+            "n": len(ordered),
+            "errors": len(recorder.errors.get(name, [])),
+            "p50_ms": round(percentile(ordered, 0.50) * 1000, 2) if ordered else None,
+            "p95_ms": round(percentile(ordered, 0.95) * 1000, 2) if ordered else None,
+            "p99_ms": round(percentile(ordered, 0.99) * 1000, 2) if ordered else None,
+            "rps": round(len(ordered) / wall_seconds, 2),
+        }
+    return series
+
+
+def run_clients(base_url, tasks, concurrency):
+    """Run tasks, callables taking an httpx.Client, on concurrency threads; return wall seconds."""
+    local = threading.local()
+    clients = []
+
+    def run(task):
+        if not hasattr(local, 'client'):
+            local.client = httpx.Client(base_url=base_url, timeout=600)
+            clients.append(local.client)
+        task(local.client)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for future in [pool.submit(run, task) for task in tasks]:
+            future.result()
+    wall = time.perf_counter() - start
+    for client in clients:
+        client.close()
+    return wall
+
+
+def timed(recorder, series, send):
+    """Time send(); record it, or record an error for exceptions and non-2xx answers."""
+    start = time.perf_counter()
+    try:
+        response = send()
+    except httpx.HTTPError as e:
+        recorder.error(series, f"{type(e).__name__}: {e}")
+        return None, start
+    elapsed = time.perf_counter() - start
+    if response.status_code >= 300:
+        recorder.error(series, f"HTTP {response.status_code}: {response.text[:200]}")
+        return None, start
+    recorder.add(series, elapsed)
+    return response, start
+
+
+def wait_for_job(client, status_url, timeout=600):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(status_url).json()
+        if job.get('state') in ('done', 'failed'):
+            return job
+        time.sleep(POLL_SECONDS)
+    return {"state": "failed", "error": "timed out"}
+
+
+def make_document(kind, words, seed):
+    """(filename, bytes, content type) of a synthetic document."""
+    if kind == 'pdf':
+        return f"doc{seed}.pdf", make_pdf(max(1, words // 400), seed=seed), 'application/pdf'
+    if kind == 'json':
+        return f"doc{seed}.json", make_json(words, seed).encode('utf-8'), 'application/json'
+    return f"doc{seed}.txt", make_text(words, seed).encode('utf-8'), 'text/plain'
+
+
+def upload_and_wait(client, recorder, document, prefix='upload'):
+    """Upload a document; record the request and the time until its KB is ready."""
+    response, start = timed(recorder, prefix, lambda: client.post('/api/upload', files={'file': document}))
+    if response is None:
+        return None
+    data = response.json()
+    if data['status'] != 'done':
+        job = wait_for_job(client, data['status_url'])
+        if job['state'] != 'done':
+            recorder.error(f"{prefix} ready", job.get('error') or job['state'])
+            return None
+    recorder.add(f"{prefix} ready", time.perf_counter() - start)
+    return data['knowledge_base']
+
+
+def setup_kbs(base_url, count, words, seed):
+    """Upload count text KBs outside the measurements; return their names."""
+    recorder = Recorder()
+    with httpx.Client(base_url=base_url, timeout=600) as client:
+        names = [upload_and_wait(client, recorder, make_document('txt', words, seed + i)) for i in range(count)]
+    if None in names:
+        raise RuntimeError(f"could not set up KBs: {recorder.errors}")
+    return names
+
+
+def scenario_upload(base_url, args, rng):
+    distinct = max(1, round(args.requests * (1 - args.duplicates)))
+    kinds = ('txt', 'json', 'pdf')
+    documents = [make_document(kinds[i % 3], args.doc_words, args.seed + i) for i in range(distinct)]
+    order = [i % distinct for i in range(args.requests)]
+    rng.shuffle(order)
+    recorder = Recorder()
+    tasks = [lambda client, d=documents[i]: upload_and_wait(client, recorder, d) for i in order]
+    return recorder, run_clients(base_url, tasks, args.concurrency)
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(','):
+        mode, _, weight = part.partition('=')
+        mix[mode.strip()] = float(weight or 1)
+    return mix
+
+
+def scenario_chat(base_url, args, rng):
+    kbs = setup_kbs(base_url, 2, args.doc_words, args.seed + 10000)
+    mix = parse_mix(args.chat_mix)
+    asked = []
+    requests = []
+    for _ in range(args.requests):
+        if asked and rng.random() < args.repeat:
+            question = rng.choice(asked)
+        else:
+            question = f"What does the {rng.choice(TOPIC_WORDS)} say about w{rng.randrange(VOCAB_SIZE)}?"
+            asked.append(question)
+        mode = rng.choices(list(mix), weights=list(mix.values()))[0]
+        requests.append((mode, question, rng.random() < args.stream))
+
+    recorder = Recorder()
+
+    def chat(client, mode, question, stream):
+        body = {"role": "Expert", "mood": "Friendly", "mode": mode, "question": question,
+                "knowledge_bases": kbs, "stream": stream}
+        if not stream:
+            timed(recorder, f"chat {mode}", lambda: client.post('/api/chat', json=body))
+            return
+        series = f"chat {mode} stream"
+        start = time.perf_counter()
+        first = None
+        try:
+            with client.stream('POST', '/api/chat', json=body) as response:
+                if response.status_code >= 300:
+                    recorder.error(series, f"HTTP {response.status_code}")
+                    return
+                for _ in response.iter_bytes():
+                    if first is None:
+                        first = time.perf_counter() - start
+        except httpx.HTTPError as e:
+            recorder.error(series, f"{type(e).__name__}: {e}")
+            return
+        recorder.add(f"{series} first byte", first)
+        recorder.add(series, time.perf_counter() - start)
+
+    tasks = [lambda client, r=r: chat(client, *r) for r in requests]
+    return recorder, run_clients(base_url, tasks, args.concurrency)
+
+
+def scenario_quiz(base_url, args, rng):
+    kbs = setup_kbs(base_url, 1, args.doc_words, args.seed + 20000)
+    run_id = hashlib.sha256(f"{time.time()}".encode()).hexdigest()[:8]
+    recorder = Recorder()
+
+    def quiz(client, i):
+        body = {"kb_filenames": kbs, "quiz_title": f"load test {run_id} {i}"}
+        response, start = timed(recorder, 'quiz submit', lambda: client.post('/api/generate_quiz', json=body))
+        if response is None:
+            return
+        job = wait_for_job(client, response.json()['status_url'])
+        if job['state'] != 'done':
+            recorder.error('quiz job', job.get('error') or job['state'])
+            return
+        recorder.add('quiz job', time.perf_counter() - start)
+
+    tasks = [lambda client, i=i: quiz(client, i) for i in range(args.quiz_jobs)]
+    return recorder, run_clients(base_url, tasks, args.concurrency)
+
+
+def git_commit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, check=True,
+                                capture_output=True, text=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT,
+                               check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f"{commit}-dirty" if dirty else commit
+
+
+def previous_run(path, scenario, settings):
+    previous = None
+    if os.path.exists(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                record = json.loads(line)
+                if record['scenario'] == scenario and record['settings'] == settings:
+                    previous = record
+    return previous
+
+
+def _ms(value):
+    return f"{value:>10.1f}" if value is not None else f"{'-':>10}"
+
+
+def report(scenario, series, wall, previous, max_regression):
+    """Print the scenario's table; return the series that regressed past max_regression."""
+    base = previous['series'] if previous else {}
+    print(f"\n{scenario}: {wall:.1f}s" + (f", compared with {previous['commit']} ({previous['time']})"
+                                          if previous else ""))
+    print(f"{'series':<34}{'n':>6}{'err':>5}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'rps':>8}{'p95 vs prev':>13}")
+    regressions = []
+    for name, s in series.items():
+        change = ""
+        old = base.get(name)
+        if old and old['p95_ms'] and s['p95_ms'] is not None:
+            ratio = s['p95_ms'] / old['p95_ms'] - 1
+            change = f"{ratio:+.0%}"
+            if max_regression is not None and (ratio > max_regression or
+                                               (old['rps'] and s['rps'] < old['rps'] * (1 - max_regression))):
+                regressions.append(name)
+                change += " !"
+        print(f"{name:<34}{s['n']:>6}{s['errors']:>5}{_ms(s['p50_ms'])}{_ms(s['p95_ms'])}{_ms(s['p99_ms'])}"
+              f"{s['rps']:>8.1f}{change:>13}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenario', default='all', choices=('all',) + SCENARIOS)
+    parser.add_argument('--requests', type=int, default=100, help="requests per upload and chat run")
+    parser.add_argument('--quiz-jobs', type=int, default=8)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--llm-latency', type=float, default=0.2, help="fake OpenAI seconds before the first token")
+    parser.add_argument('--tokens-per-sec', type=float, default=200.0, help="fake OpenAI token rate, 0 = instant")
+    parser.add_argument('--server', choices=('werkzeug', 'gunicorn'), default='werkzeug')
+    parser.add_argument('--workers', type=int, default=2, help="gunicorn worker processes")
+    parser.add_argument('--doc-words', type=int, default=20000, help="words per synthetic document")
+    parser.add_argument('--duplicates', type=float, default=0.25, help="share of re-uploads in the upload storm")
+    parser.add_argument('--chat-mix', default='local=1,smart=2,smartplus=1', help="mode=weight,...")
+    parser.add_argument('--stream', type=float, default=0.3, help="share of streamed chat requests")
+    parser.add_argument('--repeat', type=float, default=0.2, help="share of repeated chat questions")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--results', default=RESULTS_PATH)
+    parser.add_argument('--no-save', action='store_true', help="do not append this run to the results")
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help="exit 1 if a p95 grows or a throughput drops by more than this fraction")
+    parser.add_argument('--serve', type=int, metavar='PORT', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args.serve)
+        return
+
+    scenarios = SCENARIOS if args.scenario == 'all' else (args.scenario,)
+    settings = {name: getattr(args, name) for name in SETTINGS}
+    commit = git_commit()
+    regressions = []
+    with Services(args) as services:
+        for scenario in scenarios:
+            rng = random.Random(args.seed)
+            recorder, wall = globals()[f"scenario_{scenario}"](services.base_url, args, rng)
+            series = summarize(recorder, wall)
+            previous = previous_run(args.results, scenario, settings)
+            regressions += [f"{scenario}: {name}" for name in report(scenario, series, wall, previous,
+                                                                      args.max_regression)]
+            for name, messages in recorder.errors.items():
+                print(f"  {name} error: {messages[0]}")
+            if not args.no_save:
+                os.makedirs(os.path.dirname(args.results), exist_ok=True)
+                with open(args.results, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({
+                        "commit": commit,
+                        "time": datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+                        "scenario": scenario,
+                        "settings": settings,
+                        "wall_seconds": round(wall, 3),
+                        "series": series,
+                    }) + "\n")
+    if regressions:
+        print(f"\nRegressed by more than {args.max_regression:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Synthetic knowledge-base documents for the benchmarks."""
+import json
+import random
+
+VOCAB_SIZE = 20000
+TOPIC_WORDS = "king sages dharma river chapter festival lights student temple music cricket".split()
+
+
+def make_words(count, seed=0):
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(VOCAB_SIZE)] + TOPIC_WORDS
+    return [rng.choice(vocab) for _ in range(count)]
+
+
+def make_text(words, seed=0):
+    return " ".join(make_words(words, seed))
+
+
+def make_json(words, seed=0):
+    return json.dumps({"content": make_text(words, seed)}, ensure_ascii=False)
+
+
+def _pdf_escape(text):
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+
+def make_pdf(pages, words_per_page=400, seed=0):
+    """Return bytes of a minimal text PDF with the given number of pages."""
+    words = make_words(pages * words_per_page, seed)
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        None,  # page tree, filled in once the page ids are known
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_ids = []
+    for p in range(pages):
+        chunk = words[p * words_per_page:(p + 1) * words_per_page]
+        lines = [" ".join(chunk[i:i + 12]) for i in range(0, len(chunk), 12)]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 780 Td"]
+        ops += [f"({_pdf_escape(line)}) Tj T*" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode('latin-1')
+        objects.append(b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        content_id = len(objects)
+        objects.append(b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id)
+        page_ids.append(len(objects))
+    kids = b" ".join(b"%d 0 R" % i for i in page_ids)
+    objects[1] = b"<< /Type /Pages /Kids [" + kids + b"] /Count %d >>" % pages
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for num, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % num + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    for offset in offsets:
+        out += b"%010d 00000 n \n" % offset
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
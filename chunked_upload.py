@@ -0,0 +1,194 @@
+"""Resumable uploads sent as separately checksummed chunks.
+
+A file too large for one request, or on a connection that may drop, is
+sent in pieces:
+
+1. ``create()`` opens an upload of a known size and chunk size and
+   returns its id;
+2. ``write_chunk()`` stores chunk ``i`` at offset ``i * chunk_size`` of a
+   preallocated file, in any order and as often as needed, and only marks
+   it received when its length and SHA-256 match what the client sent;
+3. ``status()`` lists the chunks still missing, so an interrupted client
+   resumes by sending just those;
+4. ``finish()`` hashes the assembled file and hands it to the caller.
+
+Every upload is a directory ``<folder>/<upload_id>/`` with ``meta.json``,
+the file being assembled (``data.part``) and a one-byte-per-chunk
+``received`` map updated with positional writes, so any worker process
+can serve any chunk. Chunks are copied in ``BUFFER_SIZE`` blocks; memory
+per request does not depend on the file or chunk size.
+"""
+import hashlib
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+from atomic_file import atomic_write
+
+BUFFER_SIZE = 1024 * 1024
+DEFAULT_CHUNK_SIZE = 4 * 1024 * 1024
+# Unfinished uploads are deleted after this long without a new chunk
+DEFAULT_TTL_SECONDS = 24 * 3600
+
+
+class ChunkedUploads:
+    def __init__(self, folder, max_file_size, max_chunk_size, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.folder = folder
+        self.max_file_size = max_file_size
+        self.max_chunk_size = max_chunk_size
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(folder, exist_ok=True)
+
+    def _dir(self, upload_id):
+        if not re.fullmatch(r'[a-f0-9]{32}', upload_id):
+            return None
+        return os.path.join(self.folder, upload_id)
+
+    def _meta(self, upload_id):
+        upload_dir = self._dir(upload_id)
+        if upload_dir is None:
+            return None
+        try:
+            with open(os.path.join(upload_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def create(self, filename, size, chunk_size=DEFAULT_CHUNK_SIZE, sha256=None, max_size=None):
+        """Start an upload; return its status. Raises ValueError on bad sizes.
+
+        max_size lowers max_file_size for this file.
+        """
+        size = int(size)
+        chunk_size = int(chunk_size)
+        max_size = min(max_size or self.max_file_size, self.max_file_size)
+        if not 0 < size <= max_size:
+            raise ValueError(f"File size must be between 1 and {max_size} bytes")
+        if not 0 < chunk_size <= self.max_chunk_size:
+            raise ValueError(f"Chunk size must be between 1 and {self.max_chunk_size} bytes")
+        if sha256 is not None and not re.fullmatch(r'[a-f0-9]{64}', sha256):
+            raise ValueError("sha256 must be lowercase hex")
+        self.expire()
+
+        upload_id = uuid.uuid4().hex
+        upload_dir = os.path.join(self.folder, upload_id)
+        chunk_count = -(-size // chunk_size)
+        os.makedirs(upload_dir)
+        # Sparse on most filesystems until the chunks arrive
+        with open(os.path.join(upload_dir, 'data.part'), 'wb') as f:
+            f.truncate(size)
+        with open(os.path.join(upload_dir, 'received'), 'wb') as f:
+            f.truncate(chunk_count)
+        meta = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "chunk_size": chunk_size,
+            "chunk_count": chunk_count,
+            "sha256": sha256,
+            "created": time.time(),
+        }
+        with atomic_write(os.path.join(upload_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        """The upload's meta plus its missing chunk indexes, or None if unknown."""
+        meta = self._meta(upload_id)
+        if meta is None:
+            return None
+        with open(os.path.join(self._dir(upload_id), 'received'), 'rb') as f:
+            received = f.read()
+        meta['missing'] = [i for i, flag in enumerate(received) if not flag]
+        return meta
+
+    def write_chunk(self, upload_id, index, stream, sha256):
+        """Copy chunk index from stream; return the upload's status, or None if unknown.
+
+        Raises ValueError when the chunk has the wrong length or checksum;
+        the chunk then counts as missing until it is sent again.
+        """
+        meta = self._meta(upload_id)
+        if meta is None:
+            return None
+        if not 0 <= index < meta['chunk_count']:
+            raise ValueError(f"Chunk index must be between 0 and {meta['chunk_count'] - 1}")
+        if not sha256 or not re.fullmatch(r'[a-f0-9]{64}', sha256.lower()):
+            raise ValueError("A lowercase hex SHA-256 of the chunk is required")
+        offset = index * meta['chunk_size']
+        expected = min(meta['chunk_size'], meta['size'] - offset)
+
+        upload_dir = self._dir(upload_id)
+        received_fd = os.open(os.path.join(upload_dir, 'received'), os.O_WRONLY)
+        data_fd = os.open(os.path.join(upload_dir, 'data.part'), os.O_WRONLY)
+        try:
+            # A resent chunk stops counting until its new copy checks out
+            os.pwrite(received_fd, b'\0', index)
+            hasher = hashlib.sha256()
+            written = 0
+            while written <= expected:
+                block = stream.read(min(BUFFER_SIZE, expected + 1 - written))
+                if not block:
+                    break
+                if written + len(block) > expected:
+                    raise ValueError(f"Chunk {index} is longer than {expected} bytes")
+                hasher.update(block)
+                os.pwrite(data_fd, block, offset + written)
+                written += len(block)
+            if written != expected:
+                raise ValueError(f"Chunk {index} has {written} bytes, expected {expected}")
+            if hasher.hexdigest() != sha256.lower():
+                raise ValueError(f"Checksum mismatch for chunk {index}")
+            os.pwrite(received_fd, b'\1', index)
+        finally:
+            os.close(data_fd)
+            os.close(received_fd)
+        return self.status(upload_id)
+
+    def finish(self, upload_id):
+        """Return (path, sha256, meta) of the assembled file, or None if unknown.
+
+        Raises ValueError while chunks are missing or when the file does
+        not match the SHA-256 given at creation. The caller moves the file
+        away and then calls discard().
+        """
+        meta = self.status(upload_id)
+        if meta is None:
+            return None
+        if meta['missing']:
+            raise ValueError(f"{len(meta['missing'])} of {meta['chunk_count']} chunks are missing")
+        path = os.path.join(self._dir(upload_id), 'data.part')
+        hasher = hashlib.sha256()
+        with open(path, 'rb', buffering=0) as f:
+            buffer = bytearray(BUFFER_SIZE)
+            view = memoryview(buffer)
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                hasher.update(view[:n])
+        file_hash = hasher.hexdigest()
+        if meta['sha256'] and meta['sha256'] != file_hash:
+            raise ValueError("The assembled file does not match the announced SHA-256")
+        return path, file_hash, meta
+
+    def discard(self, upload_id):
+        upload_dir = self._dir(upload_id)
+        if upload_dir is None or not os.path.isdir(upload_dir):
+            return False
+        shutil.rmtree(upload_dir, ignore_errors=True)
+        return True
+
+    def expire(self):
+        """Delete uploads whose last chunk arrived more than ttl_seconds ago."""
+        cutoff = time.time() - self.ttl_seconds
+        for upload_id in os.listdir(self.folder):
+            upload_dir = os.path.join(self.folder, upload_id)
+            try:
+                if os.path.getmtime(os.path.join(upload_dir, 'received')) < cutoff:
+                    shutil.rmtree(upload_dir, ignore_errors=True)
+            except OSError:
+                pass
@@ -0,0 +1,248 @@
+"""Server-side passage embeddings and cosine top-k search per knowledge base.
+
+Passages are embedded once, when a KB is uploaded, and stored next to it as
+``<hash>-vectors.npy``: a float32 matrix with one L2-normalised row per
+retrieval passage of the KB, opened with ``mmap_mode='r'`` so queries
+page in only what they scan. ``<hash>-vectors.json`` records which embedder
+produced the rows; a KB embedded by a different embedder (or an older
+upload with no vectors) is re-embedded on first search.
+
+The embedder is chosen with ``EMBEDDER``:
+
+* ``hashing`` (default) or ``hashing:<dim>``: a signed feature-hashing
+  vectorizer over diacritic-folded words and character trigrams. No model,
+  no network, deterministic across processes;
+* ``st:<model>``: a sentence-transformers model on CPU, e.g.
+  ``st:all-MiniLM-L6-v2``. Falls back to hashing when the package or model
+  is unavailable.
+"""
+import json
+import logging
+import math
+import os
+import threading
+import zlib
+
+import numpy as np
+
+import retrieval
+import sb_corpus
+from atomic_file import atomic_write, discard, temp_path
+from kb_cache import KBCache
+
+logger = logging.getLogger(__name__)
+
+HASHING_DIM = 512
+EMBED_BATCH = 64
+# Rows scored per matrix product; bounds the scratch memory of a search
+SEARCH_BLOCK_ROWS = 8192
+# Function words carry no topic and would dominate a hashed vector
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have he his in is it its of on or she that the their them "
+    "they this to was were which who will with".split())
+
+# Mapped vector files, validated by mtime and size like parsed KBs
+vector_cache = KBCache(int(os.getenv('VECTOR_CACHE_MAX_BYTES', 256 * 1024 * 1024)))
+# numpy parses .npy headers with ast.literal_eval, which is not thread-safe
+# on some CPython versions (SystemError "AST constructor recursion depth
+# mismatch"); opening a mapped file is cheap, so serialize it
+_npy_open_lock = threading.Lock()
+
+
+class HashingEmbedder:
+    """Signed feature hashing of words and character trigrams."""
+
+    def __init__(self, dim=HASHING_DIM):
+        self.dim = dim
+        self.name = f"hashing:{dim}"
+
+    def _features(self, token):
+        padded = f"<{token}>"
+        grams = [padded[i:i + 3] for i in range(len(padded) - 2)]
+        features = [(f"w:{token}", 1.0)] + [(f"c:{gram}", 0.5 / len(grams)) for gram in grams]
+        hashed = []
+        for feature, weight in features:
+            h = zlib.crc32(feature.encode('utf-8'))
+            # The top bit picks the sign so collisions cancel out on average
+            hashed.append((h % self.dim, -weight if h & 0x80000000 else weight))
+        return hashed
+
+    def embed(self, texts):
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        features = {}
+        for row, text in enumerate(texts):
+            counts = {}
+            for token in sb_corpus.tokenize(text):
+                if token not in STOPWORDS:
+                    counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                if token not in features:
+                    features[token] = self._features(token)
+                scale = 1.0 + math.log(tf)
+                for column, weight in features[token]:
+                    vectors[row, column] += scale * weight
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        np.divide(vectors, norms, out=vectors, where=norms > 0)
+        return vectors
+
+
+class SentenceTransformerEmbedder:
+    """A sentence-transformers model running on CPU."""
+
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name, device='cpu')
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.name = f"st:{model_name}"
+
+    def embed(self, texts):
+        vectors = self.model.encode(list(texts), batch_size=EMBED_BATCH, normalize_embeddings=True,
+                                    convert_to_numpy=True, show_progress_bar=False)
+        return vectors.astype(np.float32, copy=False)
+
+
+_embedders = {}
+_embedders_lock = threading.Lock()
+
+
+def get_embedder(spec=None):
+    """The (shared) embedder for spec, defaulting to the EMBEDDER setting."""
+    spec = spec or os.getenv('EMBEDDER', 'hashing')
+    with _embedders_lock:
+        if spec not in _embedders:
+            kind, _, arg = spec.partition(':')
+            embedder = None
+            if kind == 'st' and arg:
+                try:
+                    embedder = SentenceTransformerEmbedder(arg)
+                except Exception as e:  # missing package, model download failure, ...
+                    logger.warning(f"Embedder {spec} unavailable ({e}); using hashing")
+            elif kind != 'hashing':
+                logger.warning(f"Unknown embedder {spec}; using hashing")
+            if embedder is None:
+                embedder = HashingEmbedder(int(arg) if kind == 'hashing' and arg.isdigit() else HASHING_DIM)
+            _embedders[spec] = embedder
+        return _embedders[spec]
+
+
+def vectors_path(upload_folder, kb_hash):
+    return os.path.join(upload_folder, f"{kb_hash}-vectors.npy")
+
+
+def _meta_path(upload_folder, kb_hash):
+    return os.path.join(upload_folder, f"{kb_hash}-vectors.json")
+
+
+def write_vectors(upload_folder, kb_hash, passages, embedder=None):
+    """Embed passages in batches straight into the KB's vector file."""
+    embedder = embedder or get_embedder()
+    path = vectors_path(upload_folder, kb_hash)
+    # Concurrent searches may re-embed the same KB; each writes its own temp file
+    tmp_path = temp_path(path, '.tmp.npy')
+    try:
+        matrix = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float32,
+                                           shape=(len(passages), embedder.dim))
+        for start in range(0, len(passages), EMBED_BATCH):
+            batch = [passages[i] for i in range(start, min(start + EMBED_BATCH, len(passages)))]
+            matrix[start:start + len(batch)] = embedder.embed(batch)
+        matrix.flush()
+        del matrix
+        os.replace(tmp_path, path)
+    except BaseException:
+        discard(tmp_path)
+        raise
+
+    meta = {"embedder": embedder.name, "dim": embedder.dim, "count": len(passages)}
+    with atomic_write(_meta_path(upload_folder, kb_hash), 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    vector_cache.invalidate(kb_hash)
+    return meta
+
+
+def write_kb_vectors(upload_folder, kb_hash, embedder=None):
+    """Embed the retrieval passages of a KB (run after conversion)."""
+    kb = retrieval.load_passages(upload_folder, kb_hash)
+    if kb is None:
+        return None
+    return write_vectors(upload_folder, kb_hash, kb[0], embedder)
+
+
+def load_vectors(upload_folder, kb_hash, passages, embedder):
+    """The KB's mapped vector matrix, (re-)embedding it if missing or stale."""
+    try:
+        with open(_meta_path(upload_folder, kb_hash), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        meta = {}
+    if meta.get('embedder') != embedder.name or meta.get('count') != len(passages):
+        write_vectors(upload_folder, kb_hash, passages, embedder)
+    return vector_cache.get((kb_hash, 'vectors'), vectors_path(upload_folder, kb_hash), loader=_open_vectors)
+
+
+def _open_vectors(path):
+    with _npy_open_lock:
+        return np.load(path, mmap_mode='r')
+
+
+def delete_vectors(upload_folder, kb_hash):
+    for path in (vectors_path(upload_folder, kb_hash), _meta_path(upload_folder, kb_hash)):
+        if os.path.exists(path):
+            os.remove(path)
+    vector_cache.invalidate(kb_hash)
+
+
+def cosine_top_k(matrix, queries, k, block_rows=SEARCH_BLOCK_ROWS):
+    """Best k rows of matrix for each query row by dot product.
+
+    Returns (rows, scores), each of shape (len(queries), <=k), best first.
+    The matrix is scanned in blocks so a large mapped file is never copied
+    into memory whole.
+    """
+    n_queries = len(queries)
+    best_rows = np.empty((n_queries, 0), dtype=np.int64)
+    best_scores = np.empty((n_queries, 0), dtype=np.float32)
+    for start in range(0, len(matrix), block_rows):
+        block = np.asarray(matrix[start:start + block_rows])
+        scores = np.hstack([best_scores, queries @ block.T])
+        rows = np.hstack([best_rows, np.broadcast_to(np.arange(start, start + len(block)), (n_queries, len(block)))])
+        if scores.shape[1] > k:
+            keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            scores = np.take_along_axis(scores, keep, axis=1)
+            rows = np.take_along_axis(rows, keep, axis=1)
+        best_rows, best_scores = rows, scores
+    order = np.argsort(-best_scores, axis=1)
+    return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+
+def search(upload_folder, kb_hashes, queries, top_k=5, embedder=None):
+    """Cosine top-k passages across KBs for a batch of queries.
+
+    Returns one best-first result list per query, in the shape of
+    retrieval.search results.
+    """
+    embedder = embedder or get_embedder()
+    query_vectors = embedder.embed(queries)
+    results = [[] for _ in queries]
+    for kb_hash in kb_hashes:
+        # The BM25 index is not needed here, only the passages
+        kb = retrieval.load_passages(upload_folder, kb_hash)
+        if not kb or not len(kb[0]):
+            continue
+        passages, citations = kb
+        matrix = load_vectors(upload_folder, kb_hash, passages, embedder)
+        rows, scores = cosine_top_k(matrix, query_vectors, top_k)
+        for q, (query_rows, query_scores) in enumerate(zip(rows, scores)):
+            for pid, score in zip(query_rows.tolist(), query_scores.tolist()):
+                result = {
+                    "kb": kb_hash,
+                    "passage": pid,
+                    "score": score,
+                    "text": passages[pid],
+                }
+                if citations:
+                    result["citation"] = citations[pid]
+                results[q].append(result)
+    for query_results in results:
+        query_results.sort(key=lambda r: r['score'], reverse=True)
+        del query_results[top_k:]
+    return results
@@ -0,0 +1,63 @@
+"""gunicorn settings: ``gunicorn -c gunicorn.conf.py app:app``.
+
+Workers share their Prometheus metrics through files in
+PROMETHEUS_MULTIPROC_DIR (see metrics.py). The directory is set here,
+before any worker imports the app, and emptied when gunicorn starts so
+samples of a previous run are not added in.
+
+Upload and quiz job state lives in UPLOAD_FOLDER/jobs.db (see jobs.py),
+so a status poll may land on any worker. The quiz bundles and the SB
+index and store are built once here, in the master, before the workers
+fork; the workers are started with STARTUP_BUILDS=0 and only open them.
+"""
+import os
+import shutil
+import tempfile
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.getenv('WEB_THREADS', 8))
+# Chat and quiz requests wait on the LLM gateway deadline
+timeout = int(os.getenv('LLM_DEADLINE', 120)) + 30
+
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'companion-metrics'))
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def startup_builds(logger):
+    """Rebuild stale quiz bundles and the SB index and store (same paths as app.py)."""
+    import sb_search
+    import sb_store
+    from quiz_corpus import QuizCorpus
+
+    quiz_dir = os.getenv('QUIZ_DIR', os.path.join(ROOT, 'static', 'quizzes'))
+    bundle_dir = os.getenv('QUIZ_BUNDLE_DIR', os.path.join(ROOT, 'build', 'quizzes'))
+    QuizCorpus(quiz_dir, bundle_dir).build(logger=logger)
+
+    corpus_dir = os.path.join(ROOT, 'static', 'quizzes', 'sb_advanced')
+    index_dir = os.getenv('SB_INDEX_DIR', os.path.join(ROOT, 'build', 'sb_index'))
+    store_dir = os.getenv('SB_STORE_DIR', os.path.join(ROOT, 'build', 'sb_store'))
+    if sb_search.is_stale(corpus_dir, index_dir):
+        logger.info(f"Indexed {sb_search.build_index(corpus_dir, index_dir)} SB verses")
+    if sb_store.is_stale(corpus_dir, store_dir):
+        logger.info(f"Stored {sb_store.build_store(corpus_dir, store_dir)} SB verses")
+
+
+def on_starting(server):
+    path = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path)
+    try:
+        startup_builds(server.log)
+    except Exception:
+        # Leave the builds to the workers rather than not starting at all
+        server.log.exception("Startup builds failed")
+    else:
+        os.environ['STARTUP_BUILDS'] = '0'
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+    multiprocess.mark_process_dead(worker.pid)
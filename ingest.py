@@ -0,0 +1,160 @@
+import codecs
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import PyPDF2
+
+import retrieval
+
+PDF_WORKERS = int(os.getenv('PDF_WORKERS', os.cpu_count() or 1))
+# Pages handed to a worker per task; small PDFs are extracted in-process.
+PDF_PAGES_PER_TASK = 16
+PDF_PARALLEL_MIN_PAGES = 32
+# Text files are decoded and split this many bytes at a time
+TEXT_BLOCK_SIZE = 1024 * 1024
+
+_pool = None
+_pool_lock = threading.Lock()
+
+_progress = {}
+_progress_lock = threading.Lock()
+
+
+def get_progress(kb_hash):
+    with _progress_lock:
+        state = _progress.get(kb_hash)
+        return dict(state) if state else None
+
+
+def clear_progress(kb_hash):
+    with _progress_lock:
+        _progress.pop(kb_hash, None)
+
+
+def _set_progress(kb_hash, **fields):
+    with _progress_lock:
+        _progress.setdefault(kb_hash, {}).update(fields)
+
+
+def _get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS)
+        return _pool
+
+
+# Each pool worker keeps the last reader it opened so consecutive page
+# ranges of the same document do not re-parse the cross-reference table.
+_worker_reader = (None, None)
+
+
+def _open_reader(path):
+    global _worker_reader
+    key = (path, os.stat(path).st_mtime_ns)
+    if _worker_reader[0] != key:
+        _worker_reader = (key, PyPDF2.PdfReader(path))
+    return _worker_reader[1]
+
+
+def extract_page_range(path, start, end):
+    """Extract text of pages [start, end) from the PDF at path."""
+    reader = _open_reader(path)
+    return [(reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def iter_pdf_pages(path):
+    """Yield (page_count, page_text) for each page of the PDF, in order.
+
+    Large documents are split into page ranges and extracted in a process
+    pool; results are yielded as soon as the next range is ready.
+    """
+    reader = PyPDF2.PdfReader(path)
+    page_count = len(reader.pages)
+    if page_count < PDF_PARALLEL_MIN_PAGES or PDF_WORKERS <= 1:
+        for page in reader.pages:
+            yield page_count, page.extract_text() or ""
+        return
+    del reader
+
+    ranges = [(start, min(start + PDF_PAGES_PER_TASK, page_count))
+              for start in range(0, page_count, PDF_PAGES_PER_TASK)]
+    pool = _get_pool()
+    futures = [pool.submit(extract_page_range, path, start, end) for start, end in ranges]
+    try:
+        for future in futures:
+            for text in future.result():
+                yield page_count, text
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def ingest_pdf(path, kb_hash, upload_folder, name=None):
+    """Extract a PDF page by page into the KB's passage pack and index.
+
+    Pages are fed to the passage builder as they arrive, so the document is
+    never held as one string. Progress is published under kb_hash for the
+    upload progress endpoint.
+    """
+    _set_progress(kb_hash, state='running', pages_done=0, pages_total=None)
+    builder = retrieval.PassageBuilder()
+    try:
+        pages_done = 0
+        for page_count, text in iter_pdf_pages(path):
+            builder.feed(text + "\n")
+            pages_done += 1
+            _set_progress(kb_hash, pages_done=pages_done, pages_total=page_count)
+        retrieval.write_passage_index(upload_folder, kb_hash, builder.finish(),
+                                      overlap=retrieval.PASSAGE_OVERLAP, name=name)
+    except Exception as e:
+        _set_progress(kb_hash, state='failed', error=str(e))
+        raise
+    _set_progress(kb_hash, state='done')
+
+
+def iter_text_blocks(path, block_size=TEXT_BLOCK_SIZE):
+    """Yield (bytes_read, text) for a UTF-8 file, block by block.
+
+    Blocks end on whitespace, so no word is cut in two; a multi-byte
+    character split across reads is completed by the next one.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    carry = ""
+    bytes_read = 0
+    with open(path, 'rb') as f:
+        while True:
+            data = f.read(block_size)
+            bytes_read += len(data)
+            text = carry + decoder.decode(data, final=not data)
+            if not data:
+                if text:
+                    yield bytes_read, text
+                return
+            cut = max(text.rfind(' '), text.rfind('\n'), text.rfind('\t'), text.rfind('\r'))
+            carry = text[cut + 1:]
+            if cut >= 0:
+                yield bytes_read, text[:cut + 1]
+
+
+def ingest_text(path, kb_hash, upload_folder, name=None):
+    """Split a large text file into the KB's passage pack and index.
+
+    The file is read in blocks fed to the passage builder, like PDF pages
+    in ingest_pdf, so it is never held as one string. Progress is published
+    in bytes.
+    """
+    bytes_total = os.path.getsize(path)
+    _set_progress(kb_hash, state='running', bytes_done=0, bytes_total=bytes_total)
+    builder = retrieval.PassageBuilder()
+    try:
+        for bytes_done, text in iter_text_blocks(path):
+            builder.feed(text)
+            _set_progress(kb_hash, bytes_done=bytes_done)
+        retrieval.write_passage_index(upload_folder, kb_hash, builder.finish(),
+                                      overlap=retrieval.PASSAGE_OVERLAP, name=name)
+    except Exception as e:
+        _set_progress(kb_hash, state='failed', error=str(e))
+        raise
+    _set_progress(kb_hash, state='done')
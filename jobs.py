@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from kb_store import connect
+
+# Finished jobs are kept for status polling, oldest dropped past this many
+MAX_FINISHED_JOBS = 1000
+
+
+def _now():
+    return datetime.utcnow().isoformat() + 'Z'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobStore:
+    """Job states in SQLite (WAL mode), shared by every worker process.
+
+    A job runs in the process that queued it; the others read its state
+    here, so a status poll can land on any worker. Jobs left queued or
+    running by a process that has exited read as failed.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS jobs ("
+                " queue TEXT NOT NULL,"
+                " id TEXT NOT NULL,"
+                " pid INTEGER NOT NULL,"
+                " job TEXT NOT NULL,"
+                " PRIMARY KEY (queue, id))"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.db_path)
+        return conn
+
+    @staticmethod
+    def _load(row):
+        job = json.loads(row['job'])
+        if job['state'] in ('queued', 'running') and not _alive(row['pid']):
+            job.update(state='failed', error="The worker running this job exited")
+        return job
+
+    def get(self, queue, job_id):
+        row = self._connect().execute(
+            "SELECT pid, job FROM jobs WHERE queue = ? AND id = ?", (queue, job_id)).fetchone()
+        return self._load(row) if row else None
+
+    def claim(self, queue, job):
+        """Store a new job unless one that is not failed exists; return that one, or None."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT pid, job FROM jobs WHERE queue = ? AND id = ?", (queue, job['id'])).fetchone()
+            if row is not None:
+                existing = self._load(row)
+                if existing['state'] != 'failed':
+                    return existing
+            conn.execute("INSERT OR REPLACE INTO jobs (queue, id, pid, job) VALUES (?, ?, ?, ?)",
+                         (queue, job['id'], os.getpid(), json.dumps(job)))
+        return None
+
+    def put(self, queue, job):
+        with self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO jobs (queue, id, pid, job) VALUES (?, ?, ?, ?)",
+                         (queue, job['id'], os.getpid(), json.dumps(job)))
+
+    def delete(self, queue, job_id, finished_only=True):
+        """Remove a job; by default only a done or failed one. True if removed."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT pid, job FROM jobs WHERE queue = ? AND id = ?", (queue, job_id)).fetchone()
+            if row is None or (finished_only and self._load(row)['state'] not in ('done', 'failed')):
+                return False
+            conn.execute("DELETE FROM jobs WHERE queue = ? AND id = ?", (queue, job_id))
+            return True
+
+
+class JobQueue:
+    """Background worker pool with pollable job state.
+
+    Jobs are identified by a caller-chosen id, so submitting the same id
+    again while a job is queued, running or done returns the existing job
+    instead of starting a new one. Failed jobs may be resubmitted. With a
+    JobStore, job states are also written there under the queue's name, so
+    other processes see (and do not duplicate) the jobs of this one.
+    """
+
+    def __init__(self, max_workers, name, logger=None, store=None):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self.name = name
+        self._jobs = {}
+        self._finished = []
+        self._lock = threading.Lock()
+        self._logger = logger
+        self._store = store
+
+    def submit(self, job_id, fn, *args, **kwargs):
+        """Queue fn(*args, **kwargs) under job_id; return (job, created)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and job['state'] != 'failed':
+                return dict(job), False
+            job = {
+                "id": job_id,
+                "state": "queued",
+                "submitted": _now(),
+                "started": None,
+                "finished": None,
+                "progress": None,
+                "error": None,
+                "result": None,
+            }
+            if self._store is not None:
+                existing = self._store.claim(self.name, job)
+                if existing is not None:
+                    return existing, False
+            self._jobs[job_id] = job
+            snapshot = dict(job)
+        self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return snapshot, True
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                return dict(job)
+        return self._store.get(self.name, job_id) if self._store is not None else None
+
+    def forget(self, job_id):
+        """Drop a finished job so its id can be submitted again; True if dropped."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                if job['state'] not in ('done', 'failed'):
+                    return False
+                del self._jobs[job_id]
+            if self._store is not None:
+                return self._store.delete(self.name, job_id) or job is not None
+            return job is not None
+
+    def update(self, job_id, **fields):
+        """Record progress (or other fields) for a running job."""
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+                if self._store is not None:
+                    self._store.put(self.name, self._jobs[job_id])
+
+    def _run(self, job_id, fn, args, kwargs):
+        self.update(job_id, state='running', started=_now())
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if self._logger:
+                self._logger.error(f"Job {job_id} failed: {str(e)}\n{traceback.format_exc()}")
+            self.update(job_id, state='failed', error=str(e), finished=_now())
+        else:
+            self.update(job_id, state='done', result=result, finished=_now())
+        self._retire(job_id)
+
+    def _retire(self, job_id):
+        with self._lock:
+            self._finished.append(job_id)
+            while len(self._finished) > MAX_FINISHED_JOBS:
+                old_id = self._finished.pop(0)
+                old = self._jobs.get(old_id)
+                if old is not None and old['state'] in ('done', 'failed'):
+                    del self._jobs[old_id]
+                    if self._store is not None:
+                        self._store.delete(self.name, old_id)
@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+def read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class KBCache:
+    """Size-bounded LRU of parsed knowledge-base files.
+
+    Entries are keyed by ``(kb_hash, kind)`` and validated against the file's
+    mtime and size, so a rewritten file is never served stale. The budget is
+    measured in on-disk bytes of the cached files. Cached objects are shared
+    between requests and must be treated as read-only.
+
+    Every lookup is reported to ``observers`` as
+    ``observer(key, hit, load_seconds, size)``; hits load nothing.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.observers = []
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, path, loader=read_json):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        stamp = (st.st_mtime_ns, st.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            hit = entry is not None and entry[0] == stamp
+            if hit:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if hit:
+            self._notify(key, True, 0.0, 0)
+            return entry[1]
+
+        start = time.perf_counter()
+        value = loader(path)
+        self._notify(key, False, time.perf_counter() - start, st.st_size)
+
+        with self._lock:
+            self._discard(key)
+            if st.st_size <= self.max_bytes:
+                self._entries[key] = (stamp, value, st.st_size)
+                self.current_bytes += st.st_size
+                while self.current_bytes > self.max_bytes:
+                    _, (_, _, size) = self._entries.popitem(last=False)
+                    self.current_bytes -= size
+                    self.evictions += 1
+        return value
+
+    def _notify(self, key, hit, load_seconds, size):
+        for observer in self.observers:
+            observer(key, hit, load_seconds, size)
+
+    def invalidate(self, kb_hash):
+        """Drop every cached entry that belongs to kb_hash."""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == kb_hash]:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
+
+    def _discard(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[2]
+
+
+cache = KBCache(int(os.getenv('KB_CACHE_MAX_BYTES', 256 * 1024 * 1024)))
@@ -0,0 +1,208 @@
+"""Segmented, compressed on-disk format for knowledge-base passages.
+
+A KB used to be a pretty-printed ``<hash>-knowledge.json`` holding the
+whole document as one string, plus a copy of every passage in
+``<hash>-index.json``; any reader had to parse both in full. Uploads are now
+stored once, as the retrieval passages in ``<hash>-kb.bin``:
+
+* header: magic, version, flags, passage count, segment count and the
+  length of a small JSON meta block (citations, source name, overlap);
+* passage table: little-endian uint32 ``(segment, start, end, text_start)``
+  per passage, offsets into the decompressed segment; ``text_start`` skips
+  the words a passage repeats from the previous one;
+* segment table: little-endian uint64 file offsets of each compressed
+  segment, plus the end of the last one;
+* body: zlib-compressed segments of about ``SEGMENT_BYTES`` of passage text.
+
+Readers memory-map the file, read the header and tables, and decompress
+only the segments holding passages they touch. The document text is
+rebuilt from the passages without their repeated words.
+
+Convert existing uploads with ``python kb_pack.py [upload_folder]``; the
+JSON files are kept unless ``--delete-json`` is given, and then only
+removed once their pack reads back the same passages.
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from collections import OrderedDict
+
+from atomic_file import atomic_write
+
+MAGIC = b'KBPACK\r\n'
+PACK_VERSION = 1
+HEADER = struct.Struct('<8sHHIII')
+FLAG_FOLD = 1
+SEGMENT_BYTES = 64 * 1024
+# Decompressed segments kept per open pack
+SEGMENT_CACHE = 4
+TABLE_FIELDS = 4
+
+
+def pack_path(upload_folder, kb_hash):
+    return os.path.join(upload_folder, f"{kb_hash}-kb.bin")
+
+
+def _le(values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def write_pack(path, passages, citations=None, fold=False, overlap=0, name=None, segment_bytes=SEGMENT_BYTES):
+    """Write passages (and their citations) to path atomically."""
+    table = array('I')
+    segments = []
+    current = bytearray()
+    repeated = re.compile(r'\s*(?:\S+\s+){%d}' % overlap) if overlap else None
+    for i, passage in enumerate(passages):
+        data = passage.encode('utf-8')
+        if current and len(current) + len(data) > segment_bytes:
+            segments.append(zlib.compress(bytes(current), 6))
+            current = bytearray()
+        skip = 0
+        if i and repeated:
+            match = repeated.match(passage)
+            skip = len(match.group(0).encode('utf-8')) if match else len(data)
+        table.extend((len(segments), len(current), len(current) + len(data), len(current) + skip))
+        current += data
+    if current:
+        segments.append(zlib.compress(bytes(current), 6))
+
+    meta = json.dumps({"citations": citations, "overlap": overlap, "name": name},
+                      ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    header = HEADER.pack(MAGIC, PACK_VERSION, FLAG_FOLD if fold else 0, len(passages), len(segments), len(meta))
+    body_start = HEADER.size + len(meta) + len(table) * 4 + (len(segments) + 1) * 8
+    offsets = array('Q', [body_start])
+    for segment in segments:
+        offsets.append(offsets[-1] + len(segment))
+
+    with atomic_write(path) as f:
+        f.write(header)
+        f.write(meta)
+        f.write(_le(table))
+        f.write(_le(offsets))
+        for segment in segments:
+            f.write(segment)
+
+
+class KBPack:
+    """Read-only, lazily decoded view of a packed KB; a sequence of passages."""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, flags, count, segment_count, meta_len = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != PACK_VERSION:
+            raise ValueError(f"{path} is not a version {PACK_VERSION} KB pack")
+        meta = json.loads(self._mmap[HEADER.size:HEADER.size + meta_len])
+        self.citations = meta['citations']
+        self.overlap = meta['overlap']
+        self.name = meta['name']
+        self.fold = bool(flags & FLAG_FOLD)
+
+        start = HEADER.size + meta_len
+        table_bytes = count * TABLE_FIELDS * 4
+        self._table = memoryview(self._mmap)[start:start + table_bytes].cast('I')
+        start += table_bytes
+        self._offsets = memoryview(self._mmap)[start:start + (segment_count + 1) * 8].cast('Q')
+        if sys.byteorder != 'little':
+            self._table = array('I', self._table)
+            self._table.byteswap()
+            self._offsets = array('Q', self._offsets)
+            self._offsets.byteswap()
+        self._count = count
+        self._segments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._count
+
+    def _decompress(self, i):
+        return zlib.decompress(self._mmap[self._offsets[i]:self._offsets[i + 1]])
+
+    def _segment(self, i):
+        with self._lock:
+            data = self._segments.get(i)
+            if data is not None:
+                self._segments.move_to_end(i)
+                return data
+        data = self._decompress(i)
+        with self._lock:
+            self._segments[i] = data
+            while len(self._segments) > SEGMENT_CACHE:
+                self._segments.popitem(last=False)
+        return data
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError(i)
+        segment, start, end, _ = self._table[i * TABLE_FIELDS:(i + 1) * TABLE_FIELDS]
+        return self._segment(segment)[start:end].decode('utf-8')
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def text(self):
+        # Segments are read in order, once each, bypassing the segment cache
+        table = self._table.tolist()
+        pieces = []
+        i = 0
+        while i < self._count:
+            segment = table[i * TABLE_FIELDS]
+            data = self._decompress(segment)
+            parts = []
+            while i < self._count and table[i * TABLE_FIELDS] == segment:
+                _, _, end, text_start = table[i * TABLE_FIELDS:(i + 1) * TABLE_FIELDS]
+                if end > text_start:
+                    parts.append(data[text_start:end])
+                i += 1
+            pieces.append(b"\n".join(parts).decode('utf-8'))
+        return "\n".join(pieces)
+
+
+def main():
+    """Convert the ``*-knowledge.json`` KBs in an upload folder to packs."""
+    import retrieval
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('upload_folder', nargs='?',
+                        default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads'))
+    parser.add_argument('--delete-json', action='store_true',
+                        help="remove each converted JSON file once its pack reads back correctly")
+    args = parser.parse_args()
+
+    for filename in sorted(os.listdir(args.upload_folder)):
+        if not filename.endswith('-knowledge.json'):
+            continue
+        kb_hash = filename[:-len('-knowledge.json')]
+        json_path = os.path.join(args.upload_folder, filename)
+        json_bytes = os.path.getsize(json_path)
+        start = time.perf_counter()
+        with open(json_path, 'r', encoding='utf-8') as f:
+            knowledge = json.load(f)
+        index = retrieval.write_index(args.upload_folder, kb_hash, knowledge)
+        print(f"{kb_hash[:12]}: {len(index['passages'])} passages, {json_bytes} -> "
+              f"{os.path.getsize(pack_path(args.upload_folder, kb_hash))} bytes in {time.perf_counter() - start:.2f}s")
+        if args.delete_json:
+            pack = KBPack(pack_path(args.upload_folder, kb_hash))
+            if list(pack) == index['passages'] and pack.citations == index.get('citations'):
+                os.remove(json_path)
+            else:
+                print(f"{kb_hash[:12]}: pack does not read back its passages, keeping {filename}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import json
+import os
+import sqlite3
+import threading
+
+SORT_COLUMNS = {'upload_date', 'original_name', 'hash_name'}
+
+
+def connect(db_path):
+    """Open a WAL-mode SQLite connection; ``with conn:`` is a write transaction."""
+    conn = sqlite3.connect(db_path, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return _Transaction(conn)
+
+
+class KBStore:
+    """Registry of uploaded knowledge bases backed by SQLite in WAL mode.
+
+    Replaces the rewrite-the-whole-file ``kb_index.json``. Every process and
+    thread gets its own connection; writes are single atomic statements, so
+    concurrent uploads from several workers cannot lose entries.
+    """
+
+    def __init__(self, db_path, legacy_json_path=None):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS uploads ("
+                " hash_name TEXT PRIMARY KEY,"
+                " original_name TEXT NOT NULL,"
+                " upload_date TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS uploads_by_date ON uploads (upload_date)")
+        if legacy_json_path and os.path.exists(legacy_json_path):
+            self.migrate_json(legacy_json_path)
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.db_path)
+        return conn
+
+    def migrate_json(self, json_path):
+        """One-time import of a legacy kb_index.json, renamed afterwards."""
+        with open(json_path, 'r', encoding='utf-8') as f:
+            items = json.load(f)
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR IGNORE INTO uploads (hash_name, original_name, upload_date) VALUES (?, ?, ?)",
+                [(item['hash_name'], item.get('original_name', item['hash_name']), item.get('upload_date', ''))
+                 for item in items if item.get('hash_name')]
+            )
+        try:
+            os.replace(json_path, json_path + '.migrated')
+        except FileNotFoundError:
+            pass  # another worker migrated it first
+        return len(items)
+
+    def add(self, hash_name, original_name, upload_date):
+        """Insert an entry; returns False if hash_name was already present."""
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT OR IGNORE INTO uploads (hash_name, original_name, upload_date) VALUES (?, ?, ?)",
+                (hash_name, original_name, upload_date)
+            )
+            return cur.rowcount == 1
+
+    def get(self, hash_name):
+        row = self._connect().execute(
+            "SELECT hash_name, original_name, upload_date FROM uploads WHERE hash_name = ?", (hash_name,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def delete(self, hash_name):
+        with self._connect() as conn:
+            return conn.execute("DELETE FROM uploads WHERE hash_name = ?", (hash_name,)).rowcount == 1
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM uploads").fetchone()[0]
+
+    def list(self, sort='upload_date', descending=True, limit=None, offset=0):
+        if sort not in SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by {sort}")
+        query = (f"SELECT hash_name, original_name, upload_date FROM uploads"
+                 f" ORDER BY {sort} {'DESC' if descending else 'ASC'}, hash_name")
+        # LIMIT -1 is no limit in SQLite; OFFSET needs a LIMIT clause
+        query += " LIMIT ? OFFSET ?"
+        params = (-1 if limit is None else limit, offset)
+        return [dict(row) for row in self._connect().execute(query, params)]
+
+
+class _Transaction:
+    """Connection wrapper whose ``with`` block is a BEGIN IMMEDIATE transaction."""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+        return self._conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
@@ -0,0 +1,179 @@
+import random
+import threading
+import time
+
+import httpx
+import openai
+from openai import OpenAI
+
+
+class LLMDeadlineExceeded(Exception):
+    """The call could not complete (or start) before its deadline."""
+
+
+def parse_model_limits(spec):
+    """Parse ``"gpt-4=2,gpt-3.5-turbo=8"`` into {model: limit}."""
+    limits = {}
+    for item in (spec or '').split(','):
+        if '=' in item:
+            model, limit = item.split('=', 1)
+            limits[model.strip()] = int(limit)
+    return limits
+
+
+def is_retryable(error):
+    if isinstance(error, openai.APIConnectionError):
+        return True  # includes APITimeoutError
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+class LLMGateway:
+    """Shared entry point for all chat completion calls.
+
+    One pooled httpx client is reused for every request. Each model has its
+    own concurrency semaphore, so a burst of gpt-4 calls cannot starve
+    gpt-3.5-turbo. 429s, 5xx and connection errors are retried with
+    exponential backoff and full jitter (honouring Retry-After). Every call
+    has an overall deadline covering queueing, retries and the request
+    itself. Per-model latency and token counters are kept for stats.
+    """
+
+    def __init__(self, api_key, base_url=None, max_connections=20, deadline=120.0,
+                 max_retries=4, backoff_base=0.5, backoff_max=8.0,
+                 default_concurrency=8, model_concurrency=None):
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(max_connections=max_connections,
+                                max_keepalive_connections=max_connections,
+                                keepalive_expiry=30),
+            timeout=httpx.Timeout(deadline, connect=5.0),
+        )
+        # Retries are done here, with jitter and deadlines, not by the SDK
+        self.client = OpenAI(api_key=api_key, base_url=base_url, http_client=self.http_client, max_retries=0)
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.default_concurrency = default_concurrency
+        self.model_concurrency = model_concurrency or {}
+        self.observers = []
+        self._semaphores = {}
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _semaphore(self, model):
+        with self._lock:
+            if model not in self._semaphores:
+                limit = self.model_concurrency.get(model, self.default_concurrency)
+                self._semaphores[model] = threading.BoundedSemaphore(limit)
+            return self._semaphores[model]
+
+    def _record(self, model, latency, outcome, retries, prompt_tokens=0, completion_tokens=0):
+        with self._lock:
+            m = self._metrics.setdefault(model, {
+                "calls": 0, "errors": 0, "retries": 0, "latency_sum": 0.0, "latency_max": 0.0,
+                "prompt_tokens": 0, "completion_tokens": 0,
+            })
+            m["calls"] += 1
+            m["errors"] += outcome != 'ok'
+            m["retries"] += retries
+            m["latency_sum"] += latency
+            m["latency_max"] = max(m["latency_max"], latency)
+            m["prompt_tokens"] += prompt_tokens
+            m["completion_tokens"] += completion_tokens
+        for observer in self.observers:
+            observer(model, latency, outcome, prompt_tokens, completion_tokens)
+
+    def stats(self):
+        with self._lock:
+            stats = {}
+            for model, m in self._metrics.items():
+                stats[model] = dict(m, latency_avg=(m["latency_sum"] / m["calls"]) if m["calls"] else 0.0)
+            return stats
+
+    def _backoff(self, attempt, error):
+        retry_after = None
+        response = getattr(error, 'response', None)
+        if response is not None:
+            try:
+                retry_after = float(response.headers.get('retry-after'))
+            except (TypeError, ValueError):
+                pass
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+    def _acquire(self, model, end):
+        semaphore = self._semaphore(model)
+        if not semaphore.acquire(timeout=max(0.0, end - time.monotonic())):
+            raise LLMDeadlineExceeded(f"Timed out waiting for a {model} slot")
+        return semaphore
+
+    def _with_retries(self, model, end, request):
+        """Run request(timeout) until it succeeds; return (result, retries)."""
+        attempt = 0
+        while True:
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                raise LLMDeadlineExceeded(f"{model} call exceeded its deadline")
+            try:
+                return request(remaining), attempt
+            except Exception as e:
+                if isinstance(e, openai.APITimeoutError) and time.monotonic() >= end:
+                    raise LLMDeadlineExceeded(f"{model} call exceeded its deadline") from e
+                if attempt >= self.max_retries or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                if time.monotonic() + delay >= end:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+
+    def complete(self, model, messages, deadline=None, **params):
+        """Return the ChatCompletion for messages."""
+        start = time.monotonic()
+        end = start + (deadline or self.deadline)
+        try:
+            semaphore = self._acquire(model, end)
+            try:
+                response, retries = self._with_retries(model, end, lambda timeout: self.client.chat.completions.create(
+                    model=model, messages=messages, timeout=timeout, **params))
+            finally:
+                semaphore.release()
+        except Exception:
+            self._record(model, time.monotonic() - start, 'error', 0)
+            raise
+        usage = response.usage
+        self._record(model, time.monotonic() - start, 'ok', retries,
+                     usage.prompt_tokens if usage else 0, usage.completion_tokens if usage else 0)
+        return response
+
+    def stream(self, model, messages, deadline=None, **params):
+        """Yield completion text deltas; retries only happen before the first delta."""
+        start = time.monotonic()
+        end = start + (deadline or self.deadline)
+        deltas = 0
+        retries = 0
+        outcome = 'error'
+        try:
+            semaphore = self._acquire(model, end)
+            stream = None
+            try:
+                stream, retries = self._with_retries(model, end, lambda timeout: self.client.chat.completions.create(
+                    model=model, messages=messages, stream=True, timeout=timeout, **params))
+                for chunk in stream:
+                    if time.monotonic() > end:
+                        raise LLMDeadlineExceeded(f"{model} stream exceeded its deadline")
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        deltas += 1
+                        yield chunk.choices[0].delta.content
+                outcome = 'ok'
+            finally:
+                # Also on a deadline, an error or the consumer closing us early
+                # (a client disconnect): drop the upstream HTTP response
+                if stream is not None:
+                    stream.close()
+                semaphore.release()
+        finally:
+            # Streaming responses carry no usage block; deltas approximate tokens
+            self._record(model, time.monotonic() - start, outcome, retries, 0, deltas)
@@ -0,0 +1,80 @@
+"""Prometheus metrics, aggregated across worker processes.
+
+Recorded here:
+
+* ``http_request_duration_seconds{route, method, status}``: request latency
+  per URL rule; every static file counts as route ``static``. Streamed
+  responses are timed until their last chunk;
+* ``llm_request_duration_seconds{model, outcome}`` and
+  ``llm_tokens_total{model, kind}``: per model, from LLMGateway.observers;
+* ``kb_load_duration_seconds{cache, kind}`` and ``kb_load_bytes_total``:
+  files parsed or mapped on KB cache misses;
+* ``cache_requests_total{cache, result}``: hits and misses of the KB, vector
+  and response caches; the hit ratio is ``hit / (hit + miss)``.
+
+Under gunicorn each worker has its own counters. With
+``PROMETHEUS_MULTIPROC_DIR`` set before the app is imported (gunicorn.conf.py
+does this), workers write their samples to files in that directory and
+``render()`` sums them, so any worker answers /metrics for all of them.
+Without it the metrics are those of the current process.
+"""
+import os
+
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'HTTP request latency by route',
+    ['route', 'method', 'status'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+)
+LLM_LATENCY = Histogram(
+    'llm_request_duration_seconds', 'LLM call latency including retries, by model',
+    ['model', 'outcome'],
+    buckets=(0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+)
+LLM_TOKENS = Counter('llm_tokens', 'LLM tokens by model', ['model', 'kind'])
+KB_LOAD_LATENCY = Histogram(
+    'kb_load_duration_seconds', 'Time to load a KB file on a cache miss',
+    ['cache', 'kind'],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+KB_LOAD_BYTES = Counter('kb_load_bytes', 'On-disk bytes of KB files loaded on cache misses', ['cache', 'kind'])
+CACHE_REQUESTS = Counter('cache_requests', 'Cache lookups by result', ['cache', 'result'])
+
+
+def observe_request(route, method, status, seconds):
+    REQUEST_LATENCY.labels(route, method, str(status)).observe(seconds)
+
+
+def observe_llm(model, latency, outcome, prompt_tokens=0, completion_tokens=0):
+    """LLMGateway observer."""
+    LLM_LATENCY.labels(model, outcome).observe(latency)
+    if prompt_tokens:
+        LLM_TOKENS.labels(model, 'prompt').inc(prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.labels(model, 'completion').inc(completion_tokens)
+
+
+def kb_cache_observer(cache):
+    """KBCache observer that labels its samples with cache."""
+    def observe(key, hit, load_seconds, size):
+        CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+        if not hit:
+            KB_LOAD_LATENCY.labels(cache, key[1]).observe(load_seconds)
+            KB_LOAD_BYTES.labels(cache, key[1]).inc(size)
+    return observe
+
+
+def response_cache_observer(hit):
+    CACHE_REQUESTS.labels('response', 'hit' if hit else 'miss').inc()
+
+
+def render():
+    """(body, content type) of the metrics exposition."""
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,206 @@
+"""Build step that normalizes every quiz into a precompressed bundle.
+
+Run ``python quiz_corpus.py`` to (re)build, or let the app do it at startup.
+Each quiz listed in quiz_index.json becomes ``<bundle_dir>/<name>.json``
+(a flat array of normalized questions) plus a gzip copy (and a brotli copy
+when the ``brotli`` package is installed), and
+``manifest.json`` records question counts, categories, difficulties and
+the content hash used as the ETag.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+
+from atomic_file import atomic_write
+
+try:
+    import brotli
+except ImportError:  # optional; gzip bundles are always built
+    brotli = None
+
+MANIFEST_VERSION = 1
+
+
+def convert_to_flat_array(quiz_data):
+    """Convert quiz data to flat array format with default values."""
+    if isinstance(quiz_data, list):
+        return quiz_data
+    if isinstance(quiz_data, dict):
+        possible_keys = ['questions', 'quiz', 'items', 'data']
+        for key in possible_keys:
+            if key in quiz_data and isinstance(quiz_data[key], list):
+                return quiz_data[key]
+    return []
+
+
+def infer_type_and_answer(q):
+    """Infer question type and correct answer for compatibility with the app."""
+    options = q.get('options', [])
+    correct_answer = q.get('correct_answer', '')
+    qtype = q.get('type', '')
+    # Infer type
+    if not qtype:
+        if isinstance(options, list) and len(options) >= 3:
+            qtype = 'mcq'
+        elif isinstance(options, list) and len(options) == 2 and all(str(opt).lower() in ['true', 'false'] for opt in options):
+            qtype = 'tf'
+        else:
+            qtype = 'mcq'  # fallback
+    # Fix correct_answer
+    if not correct_answer:
+        # Try to infer from 'answer' or 'correct' fields
+        if 'answer' in q:
+            correct_answer = q['answer']
+        elif 'correct' in q:
+            correct_answer = q['correct']
+            # 'correct' is an option index in some quiz files
+            if isinstance(correct_answer, int) and isinstance(options, list) and 0 <= correct_answer < len(options):
+                correct_answer = options[correct_answer]
+        else:
+            # fallback: first option
+            if isinstance(options, list) and options:
+                correct_answer = options[0]
+            else:
+                correct_answer = ''
+    # For tf, ensure options are ["True", "False"]
+    if qtype == 'tf':
+        options = ["True", "False"]
+        if str(correct_answer).lower() in ['true', 'false']:
+            correct_answer = str(correct_answer).capitalize()
+        else:
+            correct_answer = "True"  # fallback
+    return qtype, options, correct_answer
+
+
+def normalize_question(q):
+    """Return the canonical question shape used by the quiz UI."""
+    qtype, options, correct_answer = infer_type_and_answer(q)
+    if not isinstance(options, list):
+        options = []
+    options = list(options)
+    # Multiple choice questions always show four options
+    if qtype == 'mcq':
+        while len(options) < 4:
+            options.append('')
+    return {
+        'question': q.get('question', ''),
+        'options': options,
+        'correct_answer': correct_answer,
+        'explanation': q.get('explanation', ''),
+        'category': q.get('category', 'General'),
+        'difficulty': q.get('difficulty', 'medium'),
+        'type': qtype
+    }
+
+
+def normalize_quiz(quiz_data):
+    return [normalize_question(q) for q in convert_to_flat_array(quiz_data)
+            if isinstance(q, dict) and q.get('question')]
+
+
+class QuizCorpus:
+    """Normalized, gzip-precompressed quiz bundles plus their manifest."""
+
+    def __init__(self, quizzes_dir, bundle_dir):
+        self.quizzes_dir = quizzes_dir
+        self.bundle_dir = bundle_dir
+        self.manifest_path = os.path.join(bundle_dir, 'manifest.json')
+        self._lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            if manifest.get('version') == MANIFEST_VERSION:
+                return manifest
+        except (FileNotFoundError, ValueError):
+            pass
+        return {"version": MANIFEST_VERSION, "quizzes": {}}
+
+    def _save_manifest(self):
+        with atomic_write(self.manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+
+    def listed_quizzes(self):
+        try:
+            with open(os.path.join(self.quizzes_dir, 'quiz_index.json'), 'r', encoding='utf-8') as f:
+                return [item['file'] for item in json.load(f).get('quizzes', []) if item.get('file')]
+        except FileNotFoundError:
+            return []
+
+    def _build_one(self, filename):
+        source_path = os.path.join(self.quizzes_dir, filename)
+        st = os.stat(source_path)
+        entry = self.manifest['quizzes'].get(filename)
+        if entry and entry['source_mtime_ns'] == st.st_mtime_ns and entry['source_size'] == st.st_size \
+                and os.path.exists(os.path.join(self.bundle_dir, entry['bundle'])):
+            return entry, False
+
+        with open(source_path, 'r', encoding='utf-8') as f:
+            questions = normalize_quiz(json.load(f))
+        body = json.dumps(questions, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        bundle = os.path.splitext(filename)[0] + '.json'
+        bundle_path = os.path.join(self.bundle_dir, bundle)
+        with atomic_write(bundle_path) as f:
+            f.write(body)
+        # mtime=0 keeps the gzip bytes reproducible for the same content
+        with atomic_write(bundle_path + '.gz') as f:
+            f.write(gzip.compress(body, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with atomic_write(bundle_path + '.br') as f:
+                f.write(brotli.compress(body, quality=11))
+
+        entry = {
+            "bundle": bundle,
+            "etag": hashlib.sha256(body).hexdigest(),
+            "bytes": len(body),
+            "gzip_bytes": os.path.getsize(bundle_path + '.gz'),
+            "questions": len(questions),
+            "categories": dict(Counter(q['category'] for q in questions)),
+            "difficulties": dict(Counter(q['difficulty'] for q in questions)),
+            "types": dict(Counter(q['type'] for q in questions)),
+            "source_mtime_ns": st.st_mtime_ns,
+            "source_size": st.st_size,
+        }
+        self.manifest['quizzes'][filename] = entry
+        return entry, True
+
+    def build(self, filenames=None, logger=None):
+        """Bundle the given quizzes (default: all listed); return count rebuilt."""
+        os.makedirs(self.bundle_dir, exist_ok=True)
+        rebuilt = 0
+        with self._lock:
+            for filename in (filenames if filenames is not None else self.listed_quizzes()):
+                try:
+                    _, changed = self._build_one(filename)
+                    rebuilt += changed
+                except (OSError, ValueError) as e:
+                    if logger:
+                        logger.warning(f"Skipping quiz {filename}: {e}")
+            if rebuilt:
+                self._save_manifest()
+        return rebuilt
+
+    def current(self, filename):
+        """Manifest entry for a bundled quiz, rebuilt first if its source changed."""
+        if filename not in self.manifest['quizzes']:
+            return None
+        self.build([filename])
+        return self.manifest['quizzes'].get(filename)
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    corpus = QuizCorpus(os.path.join(root, 'static', 'quizzes'), os.path.join(root, 'build', 'quizzes'))
+    rebuilt = corpus.build()
+    print(f"Rebuilt {rebuilt} of {len(corpus.manifest['quizzes'])} quiz bundles in {corpus.bundle_dir}")
+    for filename, entry in sorted(corpus.manifest['quizzes'].items()):
+        print(f"  {filename}: {entry['questions']} questions, {entry['bytes']} -> {entry['gzip_bytes']} bytes gzipped")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+import json
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+# A section is what one map call sees; it comfortably fits the model context
+SECTION_WORDS = 2500
+# Upper bound on map calls per quiz; larger texts are sampled evenly
+MAX_SECTIONS = 10
+# Each section is asked for this many times its share, so dedupe and
+# validation still leave enough candidates for the final quiz
+OVERSAMPLE = 1.5
+
+SYSTEM_PROMPT = """
+You are an expert quiz creator. Your task is to generate a JSON object containing a quiz with exactly {num_questions} questions based on the provided text.
+
+RULES:
+1. The output MUST be a single, valid JSON object.
+2. The JSON object must have one top-level key: "questions".
+3. "questions" must be an array of question objects.
+4. Each question object must have the following keys: "question" (string), "options" (an array of 4 strings), and "answer" (a string that exactly matches one of the options).
+5. DO NOT include any text, explanations, or markdown formatting outside of the main JSON object.
+
+EXAMPLE JSON FORMAT:
+{{
+  "questions": [
+    {{
+      "question": "What is the capital of France?",
+      "options": ["London", "Berlin", "Paris", "Madrid"],
+      "answer": "Paris"
+    }},
+    {{
+      "question": "What is 2 + 2?",
+      "options": ["3", "4", "5", "6"],
+      "answer": "4"
+    }}
+  ]
+}}
+
+Now, create the quiz based on the following text:
+"""
+
+
+def default_question_count(text):
+    return max(5, min(25, len(text.split()) // 200))
+
+
+def split_sections(text, words_per_section=SECTION_WORDS, max_sections=MAX_SECTIONS):
+    """Split text into word sections, keeping at most max_sections evenly spaced."""
+    words = text.split()
+    sections = [" ".join(words[i:i + words_per_section]) for i in range(0, len(words), words_per_section)]
+    if len(sections) > max_sections:
+        step = len(sections) / max_sections
+        sections = [sections[int(i * step)] for i in range(max_sections)]
+    return sections
+
+
+def parse_quiz_json(response_text):
+    """Extract the outermost JSON object from a model reply."""
+    start_index = response_text.find('{')
+    end_index = response_text.rfind('}')
+    if start_index == -1 or end_index == -1:
+        raise ValueError("AI response did not contain a valid JSON object.")
+    return json.loads(response_text[start_index:end_index + 1])
+
+
+def validate_question(q):
+    """Return a clean question dict, or None if it breaks the schema."""
+    if not isinstance(q, dict):
+        return None
+    question = q.get('question')
+    options = q.get('options')
+    answer = q.get('answer')
+    if not isinstance(question, str) or not question.strip():
+        return None
+    if not isinstance(options, list) or len(options) != 4 or not all(isinstance(o, str) and o.strip() for o in options):
+        return None
+    if len({o.strip().lower() for o in options}) != 4:
+        return None
+    if not isinstance(answer, str) or answer not in options:
+        return None
+    return {"question": question.strip(), "options": options, "answer": answer}
+
+
+def _question_key(question):
+    return " ".join(re.findall(r'\w+', question.lower()))
+
+
+def _similar(a, b, threshold=0.8):
+    ta, tb = set(a.split()), set(b.split())
+    if not ta or not tb:
+        return a == b
+    return len(ta & tb) / len(ta | tb) >= threshold
+
+
+def merge_questions(candidate_lists, num_questions):
+    """Dedupe candidates and pick num_questions round-robin across sections."""
+    seen = []
+    unique_lists = []
+    for candidates in candidate_lists:
+        unique = []
+        for q in candidates:
+            key = _question_key(q['question'])
+            if any(_similar(key, other) for other in seen):
+                continue
+            seen.append(key)
+            unique.append(q)
+        unique_lists.append(unique)
+
+    merged = []
+    depth = 0
+    while len(merged) < num_questions and any(depth < len(u) for u in unique_lists):
+        for unique in unique_lists:
+            if depth < len(unique) and len(merged) < num_questions:
+                merged.append(unique[depth])
+        depth += 1
+    return merged
+
+
+def generate_section_questions(llm, section, count, model):
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT.format(num_questions=count)},
+        {"role": "user", "content": section},
+    ]
+    response = llm.complete(model, messages, temperature=0.5)
+    quiz_data = parse_quiz_json(response.choices[0].message.content)
+    questions = quiz_data.get('questions', []) if isinstance(quiz_data, dict) else []
+    return [q for q in (validate_question(q) for q in questions) if q]
+
+
+def generate_quiz(llm, text, num_questions=None, model="gpt-3.5-turbo", workers=4, logger=None,
+                  on_progress=None):
+    """Map sections to candidate questions concurrently, then reduce to a quiz.
+
+    Sections whose call fails or returns nothing valid are skipped; the
+    quiz fails only if no section produced a usable question.
+    on_progress(done, total) is called as sections finish.
+    """
+    num_questions = num_questions or default_question_count(text)
+    sections = split_sections(text)
+    if not sections:
+        raise ValueError("No text to generate a quiz from.")
+    per_section = max(1, math.ceil(num_questions * OVERSAMPLE / len(sections)))
+
+    def map_section(index):
+        try:
+            return generate_section_questions(llm, sections[index], per_section, model)
+        except Exception as e:
+            if logger:
+                logger.warning(f"Quiz section {index + 1}/{len(sections)} failed: {e}")
+            return []
+
+    candidate_lists = []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(sections)))) as pool:
+        for done, candidates in enumerate(pool.map(map_section, range(len(sections))), start=1):
+            candidate_lists.append(candidates)
+            if on_progress:
+                on_progress(done, len(sections))
+
+    questions = merge_questions(candidate_lists, num_questions)
+    if not questions:
+        raise ValueError("The AI did not return any valid questions. Please try again.")
+    return {"questions": questions}
@@ -0,0 +1,88 @@
+import json
+import os
+import random
+import threading
+
+FILTER_FIELDS = ('category', 'difficulty', 'type')
+MAX_PAGE_SIZE = 100
+
+
+def _answer_matches(given, expected):
+    return str(given).strip().lower() == str(expected).strip().lower()
+
+
+class QuizIndex:
+    """One bundled quiz held in memory with per-field question-id indexes."""
+
+    def __init__(self, etag, questions):
+        self.etag = etag
+        self.version = etag[:16]
+        self.questions = questions
+        self.by_field = {field: {} for field in FILTER_FIELDS}
+        for qid, q in enumerate(questions):
+            for field in FILTER_FIELDS:
+                self.by_field[field].setdefault(str(q.get(field, '')).lower(), []).append(qid)
+
+    def select(self, filters):
+        """Question ids matching every field filter (any value within a field)."""
+        ids = None
+        for field, values in filters.items():
+            matched = set()
+            for value in values:
+                matched.update(self.by_field[field].get(value.lower(), ()))
+            ids = matched if ids is None else ids & matched
+        return sorted(ids) if ids is not None else list(range(len(self.questions)))
+
+    def page(self, filters, seed, size, page):
+        """A stable shuffled page of matching questions, answers stripped."""
+        ids = self.select(filters)
+        random.Random(seed).shuffle(ids)
+        chunk = ids[page * size:(page + 1) * size]
+        questions = []
+        for qid in chunk:
+            q = self.questions[qid]
+            questions.append({
+                "id": qid,
+                "question": q['question'],
+                "options": q['options'],
+                "category": q['category'],
+                "difficulty": q['difficulty'],
+                "type": q['type'],
+            })
+        return questions, len(ids)
+
+    def check(self, qid, answer):
+        q = self.questions[qid]
+        return {
+            "id": qid,
+            "correct": _answer_matches(answer, q['correct_answer']),
+            "correct_answer": q['correct_answer'],
+            "explanation": q.get('explanation', ''),
+        }
+
+
+class QuizSessions:
+    """Per-quiz indexes over the precompiled bundles of a QuizCorpus.
+
+    Indexes are built on first use and rebuilt whenever the bundle's
+    content hash changes.
+    """
+
+    def __init__(self, corpus):
+        self.corpus = corpus
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def get(self, filename):
+        entry = self.corpus.current(filename)
+        if entry is None:
+            return None
+        with self._lock:
+            index = self._indexes.get(filename)
+            if index is not None and index.etag == entry['etag']:
+                return index
+        with open(os.path.join(self.corpus.bundle_dir, entry['bundle']), 'r', encoding='utf-8') as f:
+            index = QuizIndex(entry['etag'], json.load(f))
+        with self._lock:
+            self._indexes[filename] = index
+        return index
@@ -0,0 +1,102 @@
+"""Hybrid lexical + vector ranking of KB passages for the chat prompt.
+
+``rank()`` is the selection stage of the smart and smartplus chat modes:
+
+1. candidates are the best BM25 passages and the best cosine passages of
+   every selected KB (``CANDIDATES`` of each per KB);
+2. both scores are scaled by their maximum over the candidates and blended,
+   ``alpha * vector + (1 - alpha) * bm25``;
+3. maximal marginal relevance picks passages one at a time, trading
+   relevance against similarity to the passages already picked
+   (``mmr_lambda`` = 1 is pure relevance), so near-duplicate windows of the
+   same text do not crowd out other evidence;
+4. picking stops when the model's context token budget is spent;
+5. the picked passages are returned best first.
+"""
+import heapq
+
+import numpy as np
+
+import embeddings
+import retrieval
+
+CANDIDATES = 20
+HYBRID_ALPHA = 0.5
+MMR_LAMBDA = 0.7
+# Context tokens per model when none is configured
+DEFAULT_TOKEN_BUDGET = 1500
+
+
+def estimate_tokens(text):
+    """Rough GPT token count: about four characters per token."""
+    return len(text) // 4 + 1
+
+
+def _candidates(upload_folder, kb_hashes, question, query_vector, embedder, candidates):
+    pool = []
+    for kb_hash in kb_hashes:
+        kb = retrieval.load_kb(upload_folder, kb_hash)
+        if not kb or not len(kb[1]):
+            continue
+        index, passages, citations = kb
+        matrix = embeddings.load_vectors(upload_folder, kb_hash, passages, embedder)
+        bm25 = retrieval.score_index(index, retrieval.query_terms(index, question))
+        pids = {pid for pid, _ in heapq.nlargest(candidates, bm25.items(), key=lambda item: item[1])}
+        rows, _ = embeddings.cosine_top_k(matrix, query_vector[None, :], candidates)
+        pids.update(rows[0].tolist())
+        pids = sorted(pids)
+        vectors = np.asarray(matrix[pids])
+        for pid, vector, cosine in zip(pids, vectors, (vectors @ query_vector).tolist()):
+            result = {
+                "kb": kb_hash,
+                "passage": pid,
+                "text": passages[pid],
+                "bm25": bm25.get(pid, 0.0),
+                "vector": max(cosine, 0.0),
+            }
+            if citations:
+                result["citation"] = citations[pid]
+            pool.append((result, vector))
+    return pool
+
+
+def rank(upload_folder, kb_hashes, question, token_budget=DEFAULT_TOKEN_BUDGET, alpha=HYBRID_ALPHA,
+         mmr_lambda=MMR_LAMBDA, candidates=CANDIDATES, max_passages=None, embedder=None):
+    """Relevance-ordered passages for question that fit in token_budget.
+
+    Results have the shape of retrieval.search results; ``score`` is the
+    blended relevance, and ``bm25`` and ``vector`` are the raw scores.
+    """
+    embedder = embedder or embeddings.get_embedder()
+    query_vector = embedder.embed([question])[0]
+    pool = _candidates(upload_folder, kb_hashes, question, query_vector, embedder, candidates)
+    if not pool:
+        return []
+
+    max_bm25 = max(r['bm25'] for r, _ in pool) or 1.0
+    max_vector = max(r['vector'] for r, _ in pool) or 1.0
+    for result, _ in pool:
+        result['score'] = alpha * result['vector'] / max_vector + (1 - alpha) * result['bm25'] / max_bm25
+    pool = [(r, v) for r, v in pool if r['score'] > 0]
+
+    selected = []
+    selected_vectors = []
+    remaining = token_budget
+    while pool and (max_passages is None or len(selected) < max_passages):
+        if selected_vectors:
+            redundancy = (np.stack([v for _, v in pool]) @ np.stack(selected_vectors).T).max(axis=1)
+        else:
+            redundancy = np.zeros(len(pool))
+        mmr = [mmr_lambda * r['score'] - (1 - mmr_lambda) * red
+               for (r, _), red in zip(pool, redundancy.tolist())]
+        best = max(range(len(pool)), key=mmr.__getitem__)
+        result, vector = pool.pop(best)
+        tokens = estimate_tokens(result['text'])
+        if tokens > remaining:
+            # A shorter passage further down may still fit
+            continue
+        remaining -= tokens
+        selected.append(result)
+        selected_vectors.append(vector)
+    selected.sort(key=lambda r: r['score'], reverse=True)
+    return selected
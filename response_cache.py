@@ -0,0 +1,139 @@
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+
+from kb_store import connect
+
+
+def normalize_question(question):
+    """Case-, whitespace- and trailing-punctuation-insensitive question text."""
+    text = unicodedata.normalize('NFKC', question).lower()
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text.rstrip(' ?!.')
+
+
+def cache_key(mode, role, mood, kb_hashes, question, model):
+    parts = [mode, role, mood, ",".join(sorted(kb_hashes)), normalize_question(question), model]
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Persistent cache of chat completions with TTL and size eviction.
+
+    Entries remember which KB hashes produced them so deleting a knowledge
+    base can purge every answer that was grounded in it. Hit/miss counters
+    are per process; ``observers`` are called with ``hit`` on every lookup.
+    """
+
+    def __init__(self, db_path, ttl_seconds, max_bytes):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.observers = []
+        self._counter_lock = threading.Lock()
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " response TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " created REAL NOT NULL,"
+                " last_used REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS responses_by_use ON responses (last_used)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS response_kbs ("
+                " key TEXT NOT NULL,"
+                " kb_hash TEXT NOT NULL,"
+                " PRIMARY KEY (kb_hash, key))"
+            )
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = connect(self.db_path)
+        return conn
+
+    def _count(self, hit):
+        with self._counter_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        for observer in self.observers:
+            observer(hit)
+
+    def get(self, key):
+        now = time.time()
+        row = self._connect().execute(
+            "SELECT response, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or now - row['created'] > self.ttl_seconds:
+            self._count(False)
+            return None
+        with self._connect() as conn:
+            conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+        self._count(True)
+        return row['response']
+
+    def put(self, key, response, kb_hashes):
+        now = time.time()
+        size = len(response.encode('utf-8'))
+        if size > self.max_bytes:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, response, size, now, now)
+            )
+            conn.executemany("INSERT OR IGNORE INTO response_kbs (key, kb_hash) VALUES (?, ?)",
+                             [(key, kb_hash) for kb_hash in set(kb_hashes)])
+            self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        expired = [row[0] for row in conn.execute(
+            "SELECT key FROM responses WHERE created < ?", (now - self.ttl_seconds,))]
+        self._delete(conn, expired)
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Least recently used first until the budget is met
+        victims = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall():
+            if total <= self.max_bytes:
+                break
+            victims.append(key)
+            total -= size
+        self._delete(conn, victims)
+
+    def _delete(self, conn, keys):
+        conn.executemany("DELETE FROM responses WHERE key = ?", [(k,) for k in keys])
+        conn.executemany("DELETE FROM response_kbs WHERE key = ?", [(k,) for k in keys])
+
+    def purge_kb(self, kb_hash):
+        """Remove every cached response that used kb_hash as context."""
+        with self._connect() as conn:
+            keys = [row[0] for row in conn.execute("SELECT key FROM response_kbs WHERE kb_hash = ?", (kb_hash,))]
+            self._delete(conn, keys)
+        return len(keys)
+
+    def stats(self):
+        row = self._connect().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        with self._counter_lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": row[0],
+                "bytes": row[1],
+                "max_bytes": self.max_bytes,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": (self.hits / lookups) if lookups else 0.0,
+            }
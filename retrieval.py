@@ -0,0 +1,245 @@
+import json
+import math
+import os
+import re
+from collections import Counter
+
+import kb_pack
+import sb_corpus
+from atomic_file import atomic_write
+from kb_cache import cache
+
+# Passage windows are measured in words; consecutive passages share
+# PASSAGE_OVERLAP words so an answer straddling a boundary is not lost.
+PASSAGE_WORDS = 120
+PASSAGE_OVERLAP = 30
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """Lower-case word tokens used both for indexing and for queries."""
+    return TOKEN_RE.findall(text.lower())
+
+
+def knowledge_text(knowledge):
+    """Return the searchable text of a parsed knowledge base."""
+    if isinstance(knowledge, dict) and isinstance(knowledge.get('content'), str):
+        return knowledge['content']
+    return json.dumps(knowledge, ensure_ascii=False)
+
+
+class PassageBuilder:
+    """Incrementally split streamed text into overlapping word windows.
+
+    Text can be fed in arbitrary pieces (e.g. one PDF page at a time);
+    windows span piece boundaries exactly as if the whole text were split
+    at once.
+    """
+
+    def __init__(self, size=PASSAGE_WORDS, overlap=PASSAGE_OVERLAP):
+        self.size = size
+        self.step = max(1, size - overlap)
+        self.passages = []
+        self._words = []
+        self._emitted_any = False
+
+    def feed(self, text):
+        self._words.extend(text.split())
+        while len(self._words) > self.size:
+            self.passages.append(" ".join(self._words[:self.size]))
+            self._emitted_any = True
+            del self._words[:self.step]
+
+    def finish(self):
+        # The trailing window is emitted unless it is already covered by the
+        # previous one (i.e. nothing new arrived after the last step).
+        if self._words and (not self._emitted_any or len(self._words) > self.size - self.step):
+            self.passages.append(" ".join(self._words))
+        self._words = []
+        return self.passages
+
+
+def split_passages(text, size=PASSAGE_WORDS, overlap=PASSAGE_OVERLAP):
+    """Split text into overlapping word windows."""
+    builder = PassageBuilder(size, overlap)
+    builder.feed(text)
+    return builder.finish()
+
+
+def query_terms(index, question):
+    """Tokenize a question the way the index was built."""
+    # Indexes over transliterated Sanskrit fold diacritics (kṛṣṇa -> krsna)
+    return (sb_corpus.tokenize if index.get('fold') else tokenize)(question)
+
+
+def build_index(passages, citations=None, fold=False):
+    """Build a BM25 inverted index over a list of passages.
+
+    Postings are stored flat as ``[pid, tf, pid, tf, ...]`` which keeps the
+    on-disk JSON small and quick to parse. ``citations``, when given, is a
+    parallel list of references returned with each matching passage.
+    """
+    tokenizer = sb_corpus.tokenize if fold else tokenize
+    postings = {}
+    doc_len = []
+    for pid, passage in enumerate(passages):
+        counts = Counter(tokenizer(passage))
+        doc_len.append(sum(counts.values()))
+        for term, tf in counts.items():
+            postings.setdefault(term, []).extend((pid, tf))
+    index = {
+        "passages": passages,
+        "doc_len": doc_len,
+        "avgdl": (sum(doc_len) / len(doc_len)) if doc_len else 0.0,
+        "postings": postings,
+    }
+    if citations is not None:
+        index["citations"] = citations
+    if fold:
+        index["fold"] = True
+    return index
+
+
+def index_path(upload_folder, kb_hash):
+    return os.path.join(upload_folder, f"{kb_hash}-index.json")
+
+
+def legacy_knowledge_path(upload_folder, kb_hash):
+    # Uploads made before kb_pack stored the whole document here
+    return os.path.join(upload_folder, f"{kb_hash}-knowledge.json")
+
+
+def write_index(upload_folder, kb_hash, knowledge, name=None):
+    """Chunk a knowledge base and persist its inverted index next to it.
+
+    Srimad-Bhagavatam chapter texts are chunked by verse and purport
+    paragraph with verse citations; everything else by word windows.
+    """
+    text = knowledge_text(knowledge)
+    chunks = sb_corpus.chapter_chunks(text, name, max_words=PASSAGE_WORDS)
+    if chunks:
+        return write_passage_index(upload_folder, kb_hash, [c[1] for c in chunks],
+                                   citations=[c[0] for c in chunks], fold=True, name=name)
+    return write_passage_index(upload_folder, kb_hash, split_passages(text), overlap=PASSAGE_OVERLAP, name=name)
+
+
+def write_passage_index(upload_folder, kb_hash, passages, citations=None, fold=False, overlap=0, name=None):
+    """Store passages as the KB's pack and write its index; return the index.
+
+    The returned index holds the passages in memory; the index file on
+    disk does not, as they are read back from the pack.
+    """
+    index = build_index(passages, citations, fold)
+    kb_pack.write_pack(kb_pack.pack_path(upload_folder, kb_hash), passages, citations,
+                       fold=fold, overlap=overlap, name=name)
+    on_disk = {key: value for key, value in index.items() if key not in ('passages', 'citations')}
+    on_disk["count"] = len(passages)
+    # Concurrent requests may rebuild the same legacy KB; each writes its own temp file
+    with atomic_write(index_path(upload_folder, kb_hash), 'w', encoding='utf-8') as f:
+        json.dump(on_disk, f, ensure_ascii=False, separators=(',', ':'))
+    return index
+
+
+def load_index(upload_folder, kb_hash):
+    """Load the index for a KB, building it on demand for older uploads."""
+    index = cache.get((kb_hash, 'index'), index_path(upload_folder, kb_hash))
+    if index is not None and ('passages' in index or os.path.exists(kb_pack.pack_path(upload_folder, kb_hash))):
+        return index
+    knowledge = cache.get((kb_hash, 'knowledge'), legacy_knowledge_path(upload_folder, kb_hash))
+    if knowledge is None:
+        return None
+    return write_index(upload_folder, kb_hash, knowledge)
+
+
+def load_kb(upload_folder, kb_hash):
+    """Return (index, passages, citations) for a KB, or None.
+
+    ``passages`` is a sequence; for packed KBs only the passages that are
+    accessed are decompressed. Indexes from before kb_pack carry their
+    passages inline.
+    """
+    index = load_index(upload_folder, kb_hash)
+    if index is None:
+        return None
+    if 'passages' in index:
+        return index, index['passages'], index.get('citations')
+    passages = load_passages(upload_folder, kb_hash)
+    return (index,) + passages if passages else None
+
+
+def load_passages(upload_folder, kb_hash):
+    """Return (passages, citations) for a KB without loading its index, or None."""
+    pack = cache.get((kb_hash, 'pack'), kb_pack.pack_path(upload_folder, kb_hash), loader=kb_pack.KBPack)
+    if pack is not None:
+        return pack, pack.citations
+    kb = load_kb(upload_folder, kb_hash)
+    return kb[1:] if kb else None
+
+
+def kb_text(upload_folder, kb_hash):
+    """The whole document text of a KB, or None if it does not exist."""
+    pack = cache.get((kb_hash, 'pack'), kb_pack.pack_path(upload_folder, kb_hash), loader=kb_pack.KBPack)
+    if pack is not None:
+        return pack.text()
+    knowledge = cache.get((kb_hash, 'knowledge'), legacy_knowledge_path(upload_folder, kb_hash))
+    return knowledge_text(knowledge) if knowledge is not None else None
+
+
+def kb_exists(upload_folder, kb_hash):
+    return os.path.exists(kb_pack.pack_path(upload_folder, kb_hash)) or \
+        os.path.exists(legacy_knowledge_path(upload_folder, kb_hash))
+
+
+def delete_kb(upload_folder, kb_hash):
+    """Remove the pack, index and any legacy JSON of a KB."""
+    for path in (kb_pack.pack_path(upload_folder, kb_hash), index_path(upload_folder, kb_hash),
+                 legacy_knowledge_path(upload_folder, kb_hash)):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def score_index(index, query_terms):
+    """Return {passage_id: bm25_score} for the query terms."""
+    n = len(index['doc_len'])
+    avgdl = index['avgdl'] or 1.0
+    doc_len = index['doc_len']
+    scores = {}
+    for term in set(query_terms):
+        posting = index['postings'].get(term)
+        if not posting:
+            continue
+        df = len(posting) // 2
+        idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+        for pid, tf in zip(posting[::2], posting[1::2]):
+            norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * doc_len[pid] / avgdl)
+            scores[pid] = scores.get(pid, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+    return scores
+
+
+def search(upload_folder, kb_hashes, question, top_k=5):
+    """Return the top_k passages across the given KBs, best first."""
+    scored = []
+    for kb_hash in kb_hashes:
+        kb = load_kb(upload_folder, kb_hash)
+        if not kb:
+            continue
+        for pid, score in score_index(kb[0], query_terms(kb[0], question)).items():
+            scored.append((score, kb_hash, pid, kb))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    # Only the passages that make the cut are read from the packs
+    results = []
+    for score, kb_hash, pid, (_, passages, citations) in scored[:top_k]:
+        result = {
+            "kb": kb_hash,
+            "passage": pid,
+            "score": score,
+            "text": passages[pid],
+        }
+        if citations:
+            result["citation"] = citations[pid]
+        results.append(result)
+    return results
@@ -0,0 +1,194 @@
+"""Parser for the Srimad-Bhagavatam chapter dumps in static/quizzes/sb_advanced.
+
+Each ``canto<N>/SB_Canto<N>_Chapter<M>.txt`` is a flat text dump of one
+chapter page: a few lines of viewer UI noise, the chapter heading and title,
+an optional summary, then verses. A verse starts with a ``Text N`` (or
+``Texts N-M``) line followed by Devanagari lines, transliteration lines and
+the ``Synonyms``, ``Translation`` and ``Purport`` sections, any of which may
+be missing. Chapters end with a "Thus end the ..." line and more UI noise.
+Some files hold only "No main content found." and parse to no verses.
+"""
+import os
+import re
+import unicodedata
+
+CHAPTER_FILE_RE = re.compile(r'SB_Canto(\d+)_Chapter(\d+)\.txt$')
+VERSE_LABEL_RE = re.compile(r'\d+(?:\.\d+)?[a-z]?(?:-\d+(?:\.\d+)?[a-z]?)?')
+VERSE_HEADER_RE = re.compile(r'Texts? (' + VERSE_LABEL_RE.pattern + ')')
+CHAPTER_HEADING_RE = re.compile(r'CHAPTER [A-Z -]+')
+DEVANAGARI_RE = re.compile(r'[ऀ-ॿ]')
+SECTION_HEADERS = {'Synonyms': 'synonyms', 'Translation': 'translation', 'Purport': 'purport'}
+END_MARKER = 'Thus end the'
+VERSE_FIELDS = ('devanagari', 'transliteration', 'synonyms', 'translation', 'purport')
+
+FOLDED_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+
+def fold(text):
+    """Lower-case text with diacritics removed, e.g. ``Kṛṣṇa`` -> ``krsna``."""
+    decomposed = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch)).lower()
+
+
+def tokenize(text):
+    """Diacritic-folded Latin word tokens; Devanagari is not indexed."""
+    return FOLDED_TOKEN_RE.findall(fold(text))
+
+
+def verse_range(label):
+    """First and last whole verse numbers covered by a label.
+
+    ``5`` -> (5, 5), ``5-7`` -> (5, 7). A few chapters append extra verses
+    labelled with the chapter number, e.g. ``29.1a-2a`` and ``29.1b`` in
+    chapter 29, which cover verses (1, 2) and (1, 1).
+    """
+    numbers = [int(re.match(r'\d+', part.split('.')[-1]).group()) for part in label.split('-')]
+    return numbers[0], numbers[-1]
+
+
+def chapter_files(root):
+    """(canto, chapter, path) for every chapter file under root, in reading order."""
+    found = []
+    for dirpath, _, files in os.walk(root):
+        for name in files:
+            match = CHAPTER_FILE_RE.search(name)
+            if match:
+                found.append((int(match.group(1)), int(match.group(2)), os.path.join(dirpath, name)))
+    return sorted(found)
+
+
+def source_stats(corpus_dir):
+    """{relative path: [mtime_ns, size]} of every chapter file, to detect changes."""
+    stats = {}
+    for _, _, path in chapter_files(corpus_dir):
+        st = os.stat(path)
+        stats[os.path.relpath(path, corpus_dir)] = [st.st_mtime_ns, st.st_size]
+    return stats
+
+
+def ref(canto, chapter, verse):
+    return f"SB {canto}.{chapter}.{verse}"
+
+
+def _new_verse(label, start):
+    first, last = verse_range(label)
+    verse = {"verse": label, "first": first, "last": last, "start": start, "end": start}
+    for field in VERSE_FIELDS:
+        verse[field] = []
+    return verse
+
+
+def _finish_verse(verse):
+    for field in VERSE_FIELDS:
+        separator = ' ' if field in ('synonyms', 'translation') else '\n'
+        verse[field] = separator.join(verse[field])
+    return verse
+
+
+def parse_chapter_lines(lines, canto, chapter, offset=0):
+    """Parse an iterable of raw (bytes) lines into a chapter record.
+
+    Every verse records ``start``/``end`` byte offsets (relative to the
+    file when ``offset`` is where ``lines`` begins), so a single verse can
+    later be re-read without loading the whole chapter.
+    """
+    record = {"canto": canto, "chapter": chapter, "title": "", "summary": "", "verses": []}
+    summary = []
+    state = 'preamble'
+    verse = None
+    field = None
+    for raw in lines:
+        line_start = offset
+        offset += len(raw)
+        line = raw.decode('utf-8', errors='replace').strip()
+        if not line:
+            continue
+        header = VERSE_HEADER_RE.fullmatch(line)
+        if header:
+            if verse:
+                record['verses'].append(_finish_verse(verse))
+            verse = _new_verse(header.group(1), line_start)
+            verse['end'] = offset
+            field = None
+            state = 'verse'
+            continue
+        if line.startswith(END_MARKER):
+            state = 'done'
+        if state == 'done':
+            continue
+        if state == 'preamble':
+            if CHAPTER_HEADING_RE.fullmatch(line):
+                state = 'title'
+            continue
+        if state == 'title':
+            record['title'] = line
+            state = 'summary'
+            continue
+        if state == 'summary':
+            summary.append(line)
+            continue
+
+        verse['end'] = offset
+        if line in SECTION_HEADERS:
+            field = SECTION_HEADERS[line]
+        elif field:
+            verse[field].append(line)
+        elif DEVANAGARI_RE.search(line):
+            verse['devanagari'].append(line)
+        else:
+            verse['transliteration'].append(line)
+    if verse:
+        record['verses'].append(_finish_verse(verse))
+    record['summary'] = '\n'.join(summary)
+    return record
+
+
+def parse_chapter(path, canto, chapter):
+    with open(path, 'rb') as f:
+        return parse_chapter_lines(f, canto, chapter)
+
+
+def read_verse(path, start, end):
+    """Re-parse one verse from its byte range in a chapter file."""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        block = f.read(end - start)
+    # The block starts at the verse header, so the parser sees it immediately
+    record = parse_chapter_lines(block.splitlines(keepends=True), 0, 0, start)
+    return record['verses'][0] if record['verses'] else None
+
+
+def iter_chapters(root):
+    for canto, chapter, path in chapter_files(root):
+        yield path, parse_chapter(path, canto, chapter)
+
+
+def chapter_chunks(text, name=None, max_words=120):
+    """Split an uploaded chapter into cited retrieval chunks, or None.
+
+    Returns ``[(citation, text), ...]`` with one chunk for each verse's
+    translation and synonyms and one per purport paragraph (long paragraphs
+    are windowed to max_words). Text without at least two verses carrying
+    a translation is not treated as a chapter. Citations use the canto and
+    chapter from an ``SB_CantoX_ChapterY`` name when available.
+    """
+    match = CHAPTER_FILE_RE.search(name or '')
+    canto, chapter = (int(match.group(1)), int(match.group(2))) if match else (0, 0)
+    record = parse_chapter_lines(text.encode('utf-8').splitlines(keepends=True), canto, chapter)
+    if sum(1 for verse in record['verses'] if verse['translation']) < 2:
+        return None
+
+    chunks = []
+    if record['summary']:
+        chunks.append((f"{record['title']} (summary)" if record['title'] else "Chapter summary", record['summary']))
+    for verse in record['verses']:
+        citation = ref(canto, chapter, verse['verse']) if match else f"Text {verse['verse']}"
+        if verse['translation']:
+            chunks.append((citation, f"Translation: {verse['translation']}"))
+        if verse['synonyms']:
+            chunks.append((citation, f"Synonyms: {verse['synonyms']}"))
+        for paragraph in verse['purport'].split('\n'):
+            words = paragraph.split()
+            for start in range(0, len(words), max_words):
+                chunks.append((citation, "Purport: " + " ".join(words[start:start + max_words])))
+    return chunks
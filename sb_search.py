@@ -0,0 +1,200 @@
+"""Offline full-text index over the Srimad-Bhagavatam chapter texts.
+
+Run ``python sb_search.py`` to (re)build, or let the app build it in the
+background at startup. Each verse is one document: its transliteration,
+synonyms, translation and purport are tokenized with diacritics folded
+(``kṛṣṇa`` -> ``krsna``) and ranked with BM25.
+
+The index directory holds two files:
+
+* ``postings-<build id>.bin``: little-endian uint32 ``[doc, tf, doc, tf,
+  ...]`` runs, one per term, memory-mapped at query time;
+* ``meta.json``: the term dictionary (term -> [first pair, doc freq]),
+  verse references with byte ranges into the source files, document
+  lengths, the source mtimes used to detect a stale index and the name of
+  its postings file.
+
+A rebuild writes new postings under a fresh name and then replaces
+meta.json, so a reader always gets postings that match its term
+dictionary; the old postings are removed afterwards.
+
+Snippets are cut from the matching verse, re-read from its byte range in
+the chapter file, so the text itself is never held in memory.
+"""
+import heapq
+import json
+import math
+import mmap
+import os
+import sys
+import time
+import uuid
+from array import array
+from collections import Counter
+
+import sb_corpus
+from atomic_file import atomic_write, discard
+from retrieval import BM25_K1, BM25_B
+
+INDEX_VERSION = 2
+INDEXED_FIELDS = ('transliteration', 'synonyms', 'translation', 'purport')
+# Fields a snippet is taken from, best first
+SNIPPET_FIELDS = ('translation', 'purport', 'synonyms', 'transliteration')
+SNIPPET_WORDS = 30
+
+
+def is_stale(corpus_dir, index_dir):
+    try:
+        with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return True
+    return meta.get('version') != INDEX_VERSION or meta.get('sources') != sb_corpus.source_stats(corpus_dir)
+
+
+def build_index(corpus_dir, index_dir):
+    """Parse every chapter and write the index; return the number of verses."""
+    files = []
+    docs = []
+    doc_len = []
+    postings = {}
+    for path, chapter in sb_corpus.iter_chapters(corpus_dir):
+        file_id = len(files)
+        files.append(os.path.relpath(path, corpus_dir))
+        for verse in chapter['verses']:
+            doc_id = len(docs)
+            docs.append([file_id, verse['start'], verse['end'], chapter['canto'], chapter['chapter'], verse['verse']])
+            counts = Counter(sb_corpus.tokenize(" ".join(verse[field] for field in INDEXED_FIELDS)))
+            doc_len.append(sum(counts.values()))
+            for term, tf in counts.items():
+                postings.setdefault(term, array('I')).extend((doc_id, tf))
+
+    terms = {}
+    flat = array('I')
+    for term in sorted(postings):
+        terms[term] = [len(flat) // 2, len(postings[term]) // 2]
+        flat.extend(postings[term])
+    if sys.byteorder != 'little':
+        flat.byteswap()
+
+    os.makedirs(index_dir, exist_ok=True)
+    postings_name = f"postings-{uuid.uuid4().hex[:12]}.bin"
+    with atomic_write(os.path.join(index_dir, postings_name)) as f:
+        flat.tofile(f)
+
+    meta = {
+        "version": INDEX_VERSION,
+        "sources": sb_corpus.source_stats(corpus_dir),
+        "files": files,
+        "docs": docs,
+        "doc_len": doc_len,
+        "avgdl": (sum(doc_len) / len(doc_len)) if doc_len else 0.0,
+        "terms": terms,
+        "postings": postings_name,
+    }
+    meta_path = os.path.join(index_dir, 'meta.json')
+    with atomic_write(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, ensure_ascii=False, separators=(',', ':'))
+
+    # Readers that already mapped older postings keep them until they close
+    for name in os.listdir(index_dir):
+        if name.startswith('postings') and name.endswith('.bin') and name != postings_name:
+            discard(os.path.join(index_dir, name))
+    return len(docs)
+
+
+def make_snippet(verse, terms, size=SNIPPET_WORDS):
+    """Window of size words around the first query term, from the best field."""
+    for field in SNIPPET_FIELDS:
+        words = verse.get(field, '').split()
+        for i, word in enumerate(words):
+            if terms.intersection(sb_corpus.tokenize(word)):
+                start = max(0, i - size // 3)
+                end = min(len(words), start + size)
+                text = " ".join(words[start:end])
+                return field, ("… " if start else "") + text + (" …" if end < len(words) else "")
+    words = verse.get('translation', '').split()
+    return 'translation', " ".join(words[:size]) + (" …" if len(words) > size else "")
+
+
+class SBIndex:
+    """Read side of the index: term dictionary in memory, postings mmapped."""
+
+    def __init__(self, index_dir, corpus_dir, attempts=3):
+        self.corpus_dir = corpus_dir
+        for attempt in range(attempts):
+            with open(os.path.join(index_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            try:
+                f = open(os.path.join(index_dir, meta['postings']), 'rb')
+                break
+            except FileNotFoundError:
+                # A rebuild replaced meta.json and removed these postings
+                if attempt == attempts - 1:
+                    raise
+        self.files = meta['files']
+        self.docs = meta['docs']
+        self.doc_len = meta['doc_len']
+        self.avgdl = meta['avgdl'] or 1.0
+        self.terms = meta['terms']
+        self.postings_name = meta['postings']
+        with f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.fstat(f.fileno()).st_size else None
+        self._postings = memoryview(self._mmap).cast('I') if self._mmap else memoryview(array('I'))
+        if sys.byteorder != 'little':
+            self._postings = array('I', self._postings)
+            self._postings.byteswap()
+
+    def score(self, terms, canto=None):
+        n_docs = len(self.docs)
+        scores = {}
+        for term in terms:
+            entry = self.terms.get(term)
+            if entry is None:
+                continue
+            first, df = entry
+            idf = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+            run = self._postings[first * 2:(first + df) * 2]
+            for i in range(0, len(run), 2):
+                doc_id, tf = run[i], run[i + 1]
+                if canto is not None and self.docs[doc_id][3] != canto:
+                    continue
+                norm = tf + BM25_K1 * (1 - BM25_B + BM25_B * self.doc_len[doc_id] / self.avgdl)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (BM25_K1 + 1) / norm
+        return scores
+
+    def search(self, query, top_k=10, canto=None):
+        """Return (total matches, ranked results with references and snippets)."""
+        terms = set(sb_corpus.tokenize(query))
+        scores = self.score(terms, canto)
+        results = []
+        for doc_id, score in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1]):
+            file_id, start, end, canto_no, chapter_no, label = self.docs[doc_id]
+            verse = sb_corpus.read_verse(os.path.join(self.corpus_dir, self.files[file_id]), start, end) or {}
+            field, snippet = make_snippet(verse, terms)
+            results.append({
+                "ref": sb_corpus.ref(canto_no, chapter_no, label),
+                "canto": canto_no,
+                "chapter": chapter_no,
+                "verse": label,
+                "score": round(score, 4),
+                "field": field,
+                "snippet": snippet,
+            })
+        return len(scores), results
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    corpus_dir = os.path.join(root, 'static', 'quizzes', 'sb_advanced')
+    index_dir = os.path.join(root, 'build', 'sb_index')
+    start = time.perf_counter()
+    verses = build_index(corpus_dir, index_dir)
+    index = SBIndex(index_dir, corpus_dir)
+    print(f"Indexed {verses} verses, {len(index.terms)} terms in {time.perf_counter() - start:.1f}s")
+    print(f"  {index.postings_name}: {os.path.getsize(os.path.join(index_dir, index.postings_name))} bytes, "
+          f"meta.json: {os.path.getsize(os.path.join(index_dir, 'meta.json'))} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""Memory-mapped, offset-indexed store of every Srimad-Bhagavatam verse.
+
+Run ``python sb_store.py`` to convert the whole sb_advanced tree in one
+pass, or let the app do it in the background at startup. The store
+directory holds:
+
+* ``verses.bin``: one compact UTF-8 JSON record per verse, back to back;
+* ``offsets.bin``: little-endian uint64 start offsets, plus the end of the
+  last record, so record ``i`` is ``verses.bin[offsets[i]:offsets[i + 1]]``;
+* ``keys.bin``: little-endian uint16 ``(canto, chapter, first, last)`` per
+  record, sorted, for binary-search lookups by verse number;
+* ``meta.json``: format version, record count and source mtimes.
+
+Opening the store reads only the two small tables; verse text is paged in
+from the mmap when a record is requested.
+"""
+import bisect
+import json
+import mmap
+import os
+import sys
+import time
+from array import array
+
+import sb_corpus
+from atomic_file import atomic_write
+
+STORE_VERSION = 1
+
+
+def is_stale(corpus_dir, store_dir):
+    try:
+        with open(os.path.join(store_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return True
+    return meta.get('version') != STORE_VERSION or meta.get('sources') != sb_corpus.source_stats(corpus_dir)
+
+
+def _write_array(path, values):
+    if sys.byteorder != 'little':
+        values = array(values.typecode, values)
+        values.byteswap()
+    with atomic_write(path) as f:
+        values.tofile(f)
+
+
+def _read_array(path, typecode):
+    values = array(typecode)
+    with open(path, 'rb') as f:
+        values.frombytes(f.read())
+    if sys.byteorder != 'little':
+        values.byteswap()
+    return values
+
+
+def build_store(corpus_dir, store_dir):
+    """Convert every chapter into the store; return the number of verses."""
+    os.makedirs(store_dir, exist_ok=True)
+    offsets = array('Q', [0])
+    keys = array('H')
+    verses_path = os.path.join(store_dir, 'verses.bin')
+    with atomic_write(verses_path) as out:
+        for _, chapter in sb_corpus.iter_chapters(corpus_dir):
+            # A few pages list split verses out of place; keys must be sorted
+            for verse in sorted(chapter['verses'], key=lambda v: v['first']):
+                record = {
+                    "ref": sb_corpus.ref(chapter['canto'], chapter['chapter'], verse['verse']),
+                    "canto": chapter['canto'],
+                    "chapter": chapter['chapter'],
+                    "chapter_title": chapter['title'],
+                    "verse": verse['verse'],
+                }
+                for field in sb_corpus.VERSE_FIELDS:
+                    record[field] = verse[field]
+                out.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+                offsets.append(out.tell())
+                keys.extend((chapter['canto'], chapter['chapter'], verse['first'], verse['last']))
+    _write_array(os.path.join(store_dir, 'offsets.bin'), offsets)
+    _write_array(os.path.join(store_dir, 'keys.bin'), keys)
+
+    meta = {"version": STORE_VERSION, "count": len(offsets) - 1, "sources": sb_corpus.source_stats(corpus_dir)}
+    meta_path = os.path.join(store_dir, 'meta.json')
+    with atomic_write(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    return len(offsets) - 1
+
+
+class VerseStore:
+    """Random access to verse records by (canto, chapter, verse)."""
+
+    def __init__(self, store_dir):
+        self.offsets = _read_array(os.path.join(store_dir, 'offsets.bin'), 'Q')
+        keys = _read_array(os.path.join(store_dir, 'keys.bin'), 'H')
+        # (canto, chapter, first) per record, sorted by build_store
+        self._keys = [tuple(keys[i:i + 3]) for i in range(0, len(keys), 4)]
+        self._last = keys[3::4]
+        with open(os.path.join(store_dir, 'verses.bin'), 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    def __len__(self):
+        return len(self._keys)
+
+    def record(self, i):
+        return json.loads(self._mmap[self.offsets[i]:self.offsets[i + 1]])
+
+    def find(self, canto, chapter, verse):
+        """Index of the record covering verse, or None.
+
+        ``verse`` is a number (``"5"`` also finds ``Texts 4-6``) or an exact
+        label such as ``"29.1b"``.
+        """
+        if str(verse).isdigit():
+            number = int(verse)
+            i = bisect.bisect_right(self._keys, (canto, chapter, number)) - 1
+            if i >= 0 and self._keys[i][:2] == (canto, chapter) and self._keys[i][2] <= number <= self._last[i]:
+                # Split verses share a number; the first part comes first
+                while i > 0 and self._keys[i - 1] == self._keys[i]:
+                    i -= 1
+                return i
+            return None
+        if not sb_corpus.VERSE_LABEL_RE.fullmatch(str(verse)):
+            return None
+        number = sb_corpus.verse_range(str(verse))[0]
+        i = bisect.bisect_left(self._keys, (canto, chapter, number))
+        while i < len(self._keys) and self._keys[i] == (canto, chapter, number):
+            if self.record(i)['verse'] == verse:
+                return i
+            i += 1
+        return None
+
+    def get(self, canto, chapter, verse):
+        i = self.find(canto, chapter, verse)
+        return self.record(i) if i is not None else None
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    corpus_dir = os.path.join(root, 'static', 'quizzes', 'sb_advanced')
+    store_dir = os.path.join(root, 'build', 'sb_store')
+    start = time.perf_counter()
+    count = build_store(corpus_dir, store_dir)
+    print(f"Stored {count} verses in {time.perf_counter() - start:.1f}s")
+    for name in ('verses.bin', 'offsets.bin', 'keys.bin'):
+        print(f"  {name}: {os.path.getsize(os.path.join(store_dir, name))} bytes")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,74 +1,172 @@
-from playwright.sync_api import sync_playwright
+"""Map the Srimad-Bhagavatam structure: canto -> chapter -> verse count.
+
+Counts are found with an exponential-then-binary search instead of
+loading verse 1, 2, 3, ... until "Not Found!": probe 1, 2, 4, 8, ... until
+a page is missing, then bisect between the last page that exists and the
+first that does not. A chapter of n verses costs about 2 * log2(n) page
+loads instead of n + 1; chapters per canto and the number of cantos are
+counted the same way. This assumes pages 1..N exist and none after N.
+
+Joined verses ("Texts 4-6") share one page. Whether the numbers inside the
+range redirect to it or are not found, the first one shows it, so each
+verse page's heading is read: a chapter ends at the last verse the last
+page covers, and the search resumes after a joined page that turns out to
+end later than the search assumed.
+
+Every probe is cached in sb_structure_probes.json, so an interrupted run
+resumes without repeating page loads, and chapters already present in
+sb_structure.json are skipped unless --refresh is given. Pages are fetched
+through sb_crawler, with its rate limit, retries and browser/HTTP fetchers.
+
+    python map_sb_structure.py
+    python map_sb_structure.py --base-url http://127.0.0.1:8766 --fetcher http   # tools/fake_vedabase.py
+"""
+import argparse
+import asyncio
 import json
+import os
+import re
 import time
 
-def get_sb_structure():
-    """Map out the structure of Srimad Bhagavatam"""
-    structure = {}
-    
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
-        
-        # Start with Canto 1
-        canto = 1
+from sb_crawler import (DEFAULT_BASE_URL, Checkpoint, Crawler, PageNotFound, make_fetcher,
+                        verse_url)
+# sb_crawler puts the repository root on sys.path
+import sb_corpus  # noqa: E402
+from atomic_file import atomic_write  # noqa: E402
+
+VERSE_HEADING_RE = re.compile(r'^' + sb_corpus.VERSE_HEADER_RE.pattern + r'$', re.MULTILINE)
+
+
+def page_verses(text, verse):
+    """(first, last) verses shown on a verse page, from its Text/Texts heading."""
+    match = VERSE_HEADING_RE.search(text)
+    return list(sb_corpus.verse_range(match.group(1))) if match else [verse, verse]
+
+
+async def last_existing(exists):
+    """Largest n with exists(n) true, given exists(1..N) true and false after; 0 if none."""
+    if not await exists(1):
+        return 0
+    low, high = 1, 2
+    while await exists(high):
+        low, high = high, high * 2
+    # exists(low) and not exists(high)
+    while high - low > 1:
+        mid = (low + high) // 2
+        if await exists(mid):
+            low = mid
+        else:
+            high = mid
+    return low
+
+
+class StructureMapper:
+    """Counts cantos, chapters and verses by probing verse pages."""
+
+    def __init__(self, crawler, base_url, probes, output_path, log=print):
+        self.crawler = crawler
+        self.base_url = base_url
+        self.probes = probes
+        self.output_path = output_path
+        self.log = log
+        self.page_loads = 0
+        self.structure = self._load_structure()
+
+    def _load_structure(self):
+        try:
+            with open(self.output_path, 'r', encoding='utf-8') as f:
+                structure = json.load(f)
+            if isinstance(structure.get('cantos'), dict):
+                return structure
+        except (FileNotFoundError, ValueError):
+            pass
+        return {"source": self.base_url, "cantos": {}}
+
+    def _save_structure(self):
+        with atomic_write(self.output_path, 'w', encoding='utf-8') as f:
+            json.dump(self.structure, f, indent=2)
+
+    async def probe(self, canto, chapter, verse):
+        """[first, last] verses on the page for verse, or None if not found."""
+        url = verse_url(self.base_url, canto, chapter, verse)
+        if url in self.probes:
+            result = self.probes.results[url]
+            # Probes cached before headings were read hold true/false
+            return [verse, verse] if result is True else result or None
+        try:
+            result = page_verses(await self.crawler.fetch(url), verse)
+            if not result[0] <= verse <= result[1]:
+                self.log(f"Warning: page for {canto}.{chapter}.{verse} shows verses {result[0]}-{result[1]}")
+        except PageNotFound:
+            result = None
+        self.page_loads += 1
+        self.probes.record(url, result or False)
+        return result
+
+    async def exists(self, canto, chapter, verse):
+        return await self.probe(canto, chapter, verse) is not None
+
+    async def count_verses(self, canto, chapter):
+        count = 0
         while True:
-            print(f"\nChecking Canto {canto}")
-            structure[canto] = {}
-            
-            # Check chapters in this canto
-            chapter = 1
-            while True:
-                url = f"https://vedabase.io/en/library/sb/{canto}/{chapter}/1/"
-                print(f"Checking {url}")
-                
-                page.goto(url)
-                page.wait_for_timeout(2000)
-                
-                # Check if page shows "Not Found"
-                not_found = page.query_selector("text=Not Found!")
-                if not_found:
-                    print(f"Chapter {chapter} not found - end of canto")
-                    break
-                
-                # Count verses in this chapter
-                verse = 1
-                while True:
-                    verse_url = f"https://vedabase.io/en/library/sb/{canto}/{chapter}/{verse}/"
-                    page.goto(verse_url)
-                    page.wait_for_timeout(1000)
-                    
-                    not_found = page.query_selector("text=Not Found!")
-                    if not_found:
-                        break
-                    verse += 1
-                
-                structure[canto][chapter] = verse - 1
-                print(f"Canto {canto}, Chapter {chapter}: {verse-1} verses")
-                chapter += 1
-                time.sleep(1)  # Small delay between chapters
-            
-            if chapter == 1:  # No chapters found in this canto
+            found = await last_existing(lambda n: self.exists(canto, chapter, count + n))
+            if not found:
                 break
-                
-            canto += 1
-            time.sleep(2)  # Small delay between cantos
-        
-        browser.close()
-    
-    # Save structure to file
-    with open("sb_structure.json", "w", encoding="utf-8") as f:
-        json.dump(structure, f, ensure_ascii=False, indent=2)
-    
-    return structure
-
-# Run the structure mapping
-print("Mapping Srimad Bhagavatam structure...")
-structure = get_sb_structure()
-print("\nStructure saved to sb_structure.json")
-
-# Print summary
-print("\nSummary of Srimad Bhagavatam structure:")
-for canto, chapters in structure.items():
-    total_verses = sum(chapters.values())
-    print(f"Canto {canto}: {len(chapters)} chapters, {total_verses} verses")
\ No newline at end of file
+            # Cached; a joined last page ("Texts 43-44") covers more verses,
+            # and verses after it are searched for again
+            last = (await self.probe(canto, chapter, count + found))[1]
+            count = max(count + found, last)
+        self.structure['cantos'].setdefault(str(canto), {})[str(chapter)] = count
+        self._save_structure()
+        self.log(f"Canto {canto}, Chapter {chapter}: {count} verses")
+        return count
+
+    async def map(self, cantos=None, refresh=False):
+        """Fill in and save the structure; return it."""
+        if cantos is None:
+            cantos = range(1, await last_existing(lambda canto: self.exists(canto, 1, 1)) + 1)
+        for canto in cantos:
+            chapters = await last_existing(lambda chapter: self.exists(canto, chapter, 1))
+            known = self.structure['cantos'].get(str(canto), {})
+            todo = [chapter for chapter in range(1, chapters + 1) if refresh or str(chapter) not in known]
+            # Chapters are probed concurrently; the crawler enforces the rate limit
+            await asyncio.gather(*(self.count_verses(canto, chapter) for chapter in todo))
+        return self.structure
+
+
+async def get_sb_structure(args):
+    probes = Checkpoint(args.probes)
+    async with make_fetcher(args.fetcher, args.concurrency) as fetcher:
+        crawler = Crawler(fetcher, probes, rate=args.rate, burst=args.burst,
+                          concurrency=args.concurrency, retries=args.retries)
+        mapper = StructureMapper(crawler, args.base_url.rstrip('/'), probes, args.output)
+        structure = await mapper.map(refresh=args.refresh)
+    return structure, mapper.page_loads
+
+
+def main():
+    here = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--base-url', default=DEFAULT_BASE_URL)
+    parser.add_argument('--output', default=os.path.join(here, 'sb_structure.json'))
+    parser.add_argument('--probes', default=os.path.join(here, 'sb_structure_probes.json'))
+    parser.add_argument('--fetcher', choices=('browser', 'http'), default='browser')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--rate', type=float, default=2.0, help="requests per second per host")
+    parser.add_argument('--burst', type=int, default=2)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--refresh', action='store_true', help="recount chapters already in the output")
+    args = parser.parse_args()
+
+    print("Mapping Srimad Bhagavatam structure...")
+    start = time.perf_counter()
+    structure, page_loads = asyncio.run(get_sb_structure(args))
+    print(f"\nStructure saved to {args.output} ({page_loads} page loads, {time.perf_counter() - start:.1f}s)")
+
+    print("\nSummary of Srimad Bhagavatam structure:")
+    for canto, chapters in sorted(structure['cantos'].items(), key=lambda item: int(item[0])):
+        print(f"Canto {canto}: {len(chapters)} chapters, {sum(chapters.values())} verses")
+
+
+if __name__ == '__main__':
+    main()
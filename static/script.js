@@ -4,6 +4,8 @@ const App = {
     kbList: [],
     isProcessing: false,
     promptQueue: [],
+    // Larger files are sent as resumable chunked uploads
+    CHUNKED_UPLOAD_THRESHOLD: 8 * 1024 * 1024,
     DEFAULTS: {
         role: "Expert",
         mood: "Friendly",
@@ -127,14 +129,13 @@ const App = {
                     const files = Array.from(input.files);
                     if (!files.length) return;
                     // Use the same upload logic as KB Manager
-                    const formData = new FormData();
-                    for (const file of files) {
-                        formData.append('file', file);
-                    }
                     this.showStatus('Uploading...');
                     try {
-                        const res = await fetch('/api/upload', { method: 'POST', body: formData });
-                        if (!res.ok) throw new Error('Upload failed.');
+                        for (const file of files) {
+                            const upload = await this.uploadFile(file);
+                            this.showStatus('Processing upload...');
+                            await this.waitForUpload(upload);
+                        }
                         this.showStatus('Upload successful!');
                         this.renderKBManagerList();
                     } catch (error) {
@@ -222,17 +223,14 @@ const App = {
             const fileInput = e.target;
             const statusDiv = document.getElementById('upload-status');
             if (fileInput.files.length === 0) return;
-            const formData = new FormData();
-            for (const file of fileInput.files) {
-                formData.append('file', file);
-            }
             statusDiv.textContent = '';
             try {
-                const res = await fetch('/api/upload', { method: 'POST', body: formData });
-                const data = await res.json();
-                if (!res.ok || !data.success) {
-                    throw new Error(data.error || 'Upload failed.');
+                for (const file of fileInput.files) {
+                    const upload = await this.uploadFile(file);
+                    statusDiv.textContent = 'Processing upload...';
+                    await this.waitForUpload(upload);
                 }
+                statusDiv.textContent = '';
                 fileInput.value = '';
                 await this.renderKBManagerList(); // Refresh list
                 // Auto-select the newly uploaded file(s)
@@ -426,13 +424,25 @@ const App = {
                 body: JSON.stringify({ kb_filenames: this.currentKnowledgeBases, quiz_title: title })
             });
             const data = await res.json();
-            if (res.ok && data.success) {
+            if (!res.ok || !data.success) throw new Error(data.error || 'Unknown server error');
+            // Generation runs as a background job; poll until it finishes
+            let job = { state: data.status };
+            while (job.state === 'queued' || job.state === 'running') {
+                await new Promise(resolve => setTimeout(resolve, 2000));
+                const statusRes = await fetch(data.status_url);
+                job = await statusRes.json();
+                if (!statusRes.ok) throw new Error(job.error || 'Quiz status unavailable.');
+                if (job.progress) {
+                    this.showStatus(`Generating quiz "${title}"... ${job.progress.sections_done}/${job.progress.sections_total} sections`);
+                }
+            }
+            if (job.state === 'done') {
                 this.showStatus(`Quiz "${title}" created successfully!`);
                 if (confirm(`Quiz "${title}" created successfully!\nIt's saved in 'static/quizzes/'.\n\nOpen the quiz page now?`)) {
                     window.open('/static/welcome.html', '_blank');
                 }
             } else {
-                throw new Error(data.error || 'Unknown server error');
+                throw new Error(job.error || 'Unknown server error');
             }
         } catch (err) {
             this.showStatus(`Error: Quiz generation failed.`);
@@ -473,6 +483,93 @@ const App = {
         statusDiv.innerHTML = statusText;
     },
     
+    // SHA-256 of an ArrayBuffer as lowercase hex, or null where WebCrypto is unavailable
+    async sha256Hex(buffer) {
+        if (!window.crypto || !window.crypto.subtle) return null;
+        const digest = await window.crypto.subtle.digest('SHA-256', buffer);
+        return Array.from(new Uint8Array(digest), b => b.toString(16).padStart(2, '0')).join('');
+    },
+
+    // Upload one file unless the server already has it; resolves to the
+    // upload state that waitForUpload polls
+    async uploadFile(file) {
+        if (file.size > this.CHUNKED_UPLOAD_THRESHOLD) return this.uploadFileChunked(file);
+        const hash = await this.sha256Hex(await file.arrayBuffer());
+        if (hash) {
+            const check = await fetch(`/api/upload/${hash}`);
+            if (check.ok) return await check.json();
+        }
+        const formData = new FormData();
+        formData.append('file', file);
+        const res = await fetch('/api/upload', { method: 'POST', body: formData });
+        const data = await res.json();
+        if (!res.ok || !data.success) {
+            throw new Error(data.error || 'Upload failed.');
+        }
+        return data;
+    },
+
+    // Send a large file in checksummed chunks. The upload id is kept in
+    // localStorage, so picking the same file again after a dropped
+    // connection or a reload only sends the chunks the server is missing.
+    async uploadFileChunked(file) {
+        const resumeKey = `chunkedUpload:${file.name}:${file.size}:${file.lastModified}`;
+        let upload = null;
+        const savedId = localStorage.getItem(resumeKey);
+        if (savedId) {
+            const res = await fetch(`/api/upload/chunked/${savedId}`);
+            if (res.ok) upload = await res.json();
+        }
+        if (!upload) {
+            const res = await fetch('/api/upload/chunked', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ filename: file.name, size: file.size })
+            });
+            upload = await res.json();
+            if (!res.ok) throw new Error(upload.error || 'Upload failed.');
+            localStorage.setItem(resumeKey, upload.upload_id);
+        }
+        const uploadUrl = `/api/upload/chunked/${upload.upload_id}`;
+        for (const index of upload.missing) {
+            const chunk = await file.slice(index * upload.chunk_size, (index + 1) * upload.chunk_size).arrayBuffer();
+            const checksum = await this.sha256Hex(chunk);
+            if (!checksum) throw new Error('Large uploads need a secure (https) connection.');
+            for (let attempt = 1; ; attempt++) {
+                try {
+                    const res = await fetch(`${uploadUrl}/${index}`, {
+                        method: 'PUT',
+                        headers: { 'Content-Type': 'application/octet-stream', 'X-Chunk-SHA256': checksum },
+                        body: chunk
+                    });
+                    if (res.ok) break;
+                    if (attempt >= 3) throw new Error((await res.json()).error || 'Chunk upload failed.');
+                } catch (error) {
+                    if (attempt >= 3) throw error;
+                }
+                await new Promise(resolve => setTimeout(resolve, 1000 * attempt));
+            }
+        }
+        const res = await fetch(`${uploadUrl}/complete`, { method: 'POST' });
+        const data = await res.json();
+        if (!res.ok) throw new Error(data.error || 'Upload failed.');
+        localStorage.removeItem(resumeKey);
+        return data;
+    },
+
+    // Uploads are converted in the background; poll until the KB is ready
+    async waitForUpload(upload) {
+        let state = upload.status;
+        while (state === 'queued' || state === 'running') {
+            await new Promise(resolve => setTimeout(resolve, 1000));
+            const res = await fetch(upload.status_url);
+            const job = await res.json();
+            if (!res.ok) throw new Error(job.error || 'Upload status unavailable.');
+            state = job.state;
+            if (state === 'failed') throw new Error(job.error || 'Upload processing failed.');
+        }
+    },
+
     showStatus(msg) {
       let statusDiv = document.getElementById('kb-status');
       if (!statusDiv) {
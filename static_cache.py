@@ -0,0 +1,177 @@
+"""Conditional, precompressed responses for static files and quiz bundles.
+
+Every file is served with a strong ETag derived from its content hash and a
+Last-Modified date, so revalidation costs a 304. Text assets are sent from
+precompressed ``.br``/``.gz`` variants when the client accepts them.
+Variants sitting next to the file are used as-is; others mirror ``root``
+under ``variant_dir`` and are created on first request (gzip) or by
+``python static_cache.py`` (gzip, plus brotli when the ``brotli`` package
+is installed).
+
+Assets whose URL pins their content (``?v=<hash prefix>``, a hash in the
+file name, or a name listed in ``immutable_names``) get a one-year
+immutable max-age; everything else must be revalidated on each use.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import request, send_file
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+from atomic_file import atomic_write
+
+try:
+    import brotli
+except ImportError:  # optional; gzip variants are always available
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.csv', '.html', '.js', '.json', '.md', '.svg', '.txt', '.xml'}
+# Below this size compression saves less than the extra header costs
+MIN_COMPRESS_BYTES = 1024
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+HASHED_NAME_RE = re.compile(r'[.-][0-9a-f]{8,}\.[A-Za-z0-9]+$')
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+def compress_file(path, variant_path, encoding):
+    """Write a compressed copy of path to variant_path atomically."""
+    with open(path, 'rb') as f:
+        body = f.read()
+    if encoding == 'br':
+        data = brotli.compress(body, quality=11)
+    else:
+        # mtime=0 keeps the gzip bytes reproducible for the same content
+        data = gzip.compress(body, compresslevel=9, mtime=0)
+    os.makedirs(os.path.dirname(variant_path), exist_ok=True)
+    with atomic_write(variant_path) as f:
+        f.write(data)
+
+
+class StaticFiles:
+    """Serve files with content ETags and precompressed variants."""
+
+    def __init__(self, root, variant_dir, immutable_names=()):
+        self.root = os.path.abspath(root)
+        self.variant_dir = variant_dir
+        self.immutable_names = set(immutable_names)
+        self._etags = {}
+        self._lock = threading.Lock()
+
+    def etag(self, path, st):
+        """Content hash of path, recomputed only when its mtime or size changes."""
+        key = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._etags.get(path)
+        if cached and cached[0] == key:
+            return cached[1]
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 16), b''):
+                digest.update(block)
+        etag = digest.hexdigest()
+        with self._lock:
+            self._etags[path] = (key, etag)
+        return etag
+
+    def is_compressible(self, path, st):
+        return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS and st.st_size >= MIN_COMPRESS_BYTES
+
+    def variant_path(self, path, suffix):
+        """Where the build step keeps path's variant; None outside root."""
+        rel_path = os.path.relpath(os.path.abspath(path), self.root)
+        if rel_path.startswith(os.pardir):
+            return None
+        return os.path.join(self.variant_dir, rel_path + suffix)
+
+    def variant(self, path, st, encoding, suffix, create=False):
+        """Path of a fresh compressed variant of path, or None."""
+        built = self.variant_path(path, suffix)
+        for candidate in (path + suffix, built):
+            if candidate is None:
+                continue
+            try:
+                if os.stat(candidate).st_mtime_ns >= st.st_mtime_ns:
+                    return candidate
+            except FileNotFoundError:
+                pass
+        if create and built and self.is_compressible(path, st) and (encoding == 'gzip' or brotli is not None):
+            compress_file(path, built, encoding)
+            return built
+        return None
+
+    def is_immutable(self, filename, etag):
+        version = request.args.get('v')
+        if version and len(version) >= 8 and etag.startswith(version):
+            return True
+        name = os.path.basename(filename)
+        return name in self.immutable_names or bool(HASHED_NAME_RE.search(name))
+
+    def send(self, directory, filename, mimetype=None):
+        """Conditional response for directory/filename in the best accepted encoding."""
+        path = safe_join(directory, filename)
+        if path is None or not os.path.isfile(path):
+            raise NotFound()
+        st = os.stat(path)
+        etag = self.etag(path, st)
+        mimetype = mimetype or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+
+        serve_path, content_encoding = path, None
+        if self.is_compressible(path, st):
+            for encoding, suffix in ENCODINGS:
+                if request.accept_encodings[encoding] > 0:
+                    # Brotli variants are only made by the build step; gzip on demand
+                    candidate = self.variant(path, st, encoding, suffix, create=encoding == 'gzip')
+                    if candidate:
+                        serve_path, content_encoding = candidate, encoding
+                        break
+
+        # Each encoding is its own representation, so it gets its own strong ETag
+        response = send_file(serve_path, mimetype=mimetype, conditional=True,
+                             etag=etag + (f"-{content_encoding}" if content_encoding else ''),
+                             last_modified=st.st_mtime)
+        if content_encoding:
+            response.headers['Content-Encoding'] = content_encoding
+        response.vary.add('Accept-Encoding')
+        if self.is_immutable(filename, etag):
+            response.cache_control.public = True
+            response.cache_control.max_age = IMMUTABLE_MAX_AGE
+            response.cache_control.immutable = True
+            response.cache_control.no_cache = None
+        else:
+            response.cache_control.no_cache = True
+            response.cache_control.max_age = None
+        return response
+
+    def precompress(self):
+        """Build every missing or stale variant under root; return count written."""
+        written = 0
+        for root, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(root, name)
+                st = os.stat(path)
+                if not self.is_compressible(path, st):
+                    continue
+                for encoding, suffix in ENCODINGS:
+                    if encoding == 'br' and brotli is None:
+                        continue
+                    if self.variant(path, st, encoding, suffix) is None:
+                        compress_file(path, self.variant_path(path, suffix), encoding)
+                        written += 1
+        return written
+
+
+def main():
+    root = os.path.dirname(os.path.abspath(__file__))
+    static_files = StaticFiles(os.path.join(root, 'static'), os.path.join(root, 'build', 'static'))
+    written = static_files.precompress()
+    print(f"Wrote {written} precompressed variants to {static_files.variant_dir}"
+          + ("" if brotli else " (gzip only; install brotli for .br variants)"))
+
+
+if __name__ == '__main__':
+    main()
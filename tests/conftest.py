@@ -0,0 +1,21 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+# app.py builds its OpenAI client at import time
+os.environ.setdefault('OPENAI_API_KEY', 'test')
+# ...and creates its registries under UPLOAD_FOLDER; keep test runs out of the tree
+_scratch = tempfile.mkdtemp(prefix='companion-tests-')
+os.environ['UPLOAD_FOLDER'] = os.path.join(_scratch, 'uploads')
+os.environ['QUIZ_BUNDLE_DIR'] = os.path.join(_scratch, 'quiz_bundles')
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+
+
+@pytest.fixture
+def client():
+    from app import app
+    return app.test_client()
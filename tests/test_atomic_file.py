@@ -0,0 +1,52 @@
+import os
+import threading
+
+import pytest
+
+import kb_pack
+from atomic_file import atomic_write
+
+
+def run_threads(target, count=8):
+    errors = []
+
+    def run():
+        try:
+            target()
+        except Exception as e:  # collected for the assertion below
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def test_atomic_write_replaces_and_leaves_no_temp_files(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text('old')
+    with atomic_write(str(path), 'w', encoding='utf-8') as f:
+        f.write('new')
+    assert path.read_text() == 'new'
+    assert os.listdir(tmp_path) == ['data.json']
+
+
+def test_failed_write_keeps_old_file(tmp_path):
+    path = tmp_path / 'data.json'
+    path.write_text('old')
+    with pytest.raises(RuntimeError):
+        with atomic_write(str(path), 'w', encoding='utf-8') as f:
+            f.write('partial')
+            raise RuntimeError('interrupted')
+    assert path.read_text() == 'old'
+    assert os.listdir(tmp_path) == ['data.json']
+
+
+def test_concurrent_pack_writers_do_not_clobber_each_other(tmp_path):
+    path = str(tmp_path / f"{'a' * 64}-kb.bin")
+    passages = [f"passage {i} " * 40 for i in range(3000)]
+    assert run_threads(lambda: kb_pack.write_pack(path, passages)) == []
+    assert list(kb_pack.KBPack(path)) == passages
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
@@ -0,0 +1,103 @@
+import json
+import threading
+import uuid
+
+import pytest
+
+import app
+from llm import LLMGateway
+from tools import fake_openai
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Point the app at a fake OpenAI server; gpt-4 calls are limited to one at a time."""
+    server, base_url = fake_openai.start_server(latency=0.05, tokens_per_sec=200)
+    gateway = LLMGateway('test', base_url, deadline=10, model_concurrency={'gpt-4': 1})
+    monkeypatch.setattr(app, 'llm', gateway)
+    yield gateway, server.RequestHandlerClass.stats
+    server.shutdown()
+    server.server_close()
+
+
+def ask(client, mode='smartplus'):
+    # A fresh question each time, so the response cache never answers
+    return client.post('/api/chat', json={"role": "teacher", "mood": "calm", "mode": mode, "stream": True,
+                                          "question": f"What is dharma? {uuid.uuid4().hex}"})
+
+
+def parse_events(body):
+    events = []
+    for block in body.decode().split('\n\n'):
+        if not block:
+            continue
+        fields = dict(line.split(': ', 1) for line in block.split('\n'))
+        events.append((fields.get('event', 'message'), json.loads(fields['data'])))
+    return events
+
+
+def test_stream_sends_deltas_then_done(client, fake_llm):
+    response = ask(client)
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events(response.get_data())
+    deltas = [data['delta'] for event, data in events if event == 'message']
+    assert len(deltas) > 1
+    assert "".join(deltas) == fake_openai.DEFAULT_REPLY
+    assert events[-1] == ('done', {})
+
+
+def test_client_disconnect_releases_model_slot(client, fake_llm):
+    gateway, _ = fake_llm
+    response = ask(client)
+    chunks = iter(response.response)
+    assert b'"delta"' in next(chunks)
+    response.close()
+
+    # The only gpt-4 slot is free again and no partial answer was cached
+    assert gateway.stats()['gpt-4']['errors'] == 1
+    response = ask(client)
+    assert parse_events(response.get_data())[-1] == ('done', {})
+    assert gateway.stats()['gpt-4']['calls'] == 2
+
+
+def test_per_model_concurrency_limit(client, fake_llm):
+    gateway, stats = fake_llm
+    bodies = []
+    replies = []
+
+    def chat():
+        bodies.append(ask(app.app.test_client()).get_data())
+
+    def direct():
+        replies.append("".join(gateway.stream('gpt-3.5-turbo', [{"role": "user", "content": "Hello"}])))
+
+    threads = [threading.Thread(target=target) for target in [chat] * 4 + [direct] * 4]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(parse_events(body)[-1] == ('done', {}) for body in bodies)
+    assert replies == [fake_openai.DEFAULT_REPLY] * 4
+    # gpt-4 calls queue for their single slot; other models are not held up
+    assert stats['max_in_flight']['gpt-4'] == 1
+    assert stats['max_in_flight']['gpt-3.5-turbo'] > 1
+
+
+@pytest.mark.parametrize('mode', ['smart', 'smartplus'])
+def test_prompt_asks_for_citations_of_cited_passages(client, monkeypatch, mode):
+    prompts = []
+    monkeypatch.setattr(app, 'cached_ai_response',
+                        lambda key, prompt, model, kb_hashes, stream=False: prompts.append(prompt) or ('', 200))
+    passages = [{"text": "Dharma is duty.", "citation": "SB 1.2.6"}]
+    monkeypatch.setattr(app.ranking, 'rank', lambda *args, **kwargs: passages)
+    question = {"role": "teacher", "mood": "calm", "mode": mode, "question": "What is dharma?",
+                "knowledge_bases": ['a' * 64 + '-knowledge.json']}
+
+    client.post('/api/chat', json=question)
+    assert "[SB 1.2.6] Dharma is duty." in prompts[-1]
+    assert "Cite the bracketed reference" in prompts[-1]
+
+    passages[0].pop('citation')
+    client.post('/api/chat', json=question)
+    assert "Cite the bracketed reference" not in prompts[-1]
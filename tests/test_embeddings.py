@@ -0,0 +1,30 @@
+import os
+import threading
+
+import embeddings
+
+
+def test_concurrent_load_vectors_embed_once_each(tmp_path):
+    folder = str(tmp_path)
+    embedder = embeddings.HashingEmbedder()
+    kbs = {f"{i:064x}": [f"passage {i} {j} about kings and sages" for j in range(300)] for i in range(20)}
+    errors = []
+
+    def load():
+        for kb_hash, passages in kbs.items():
+            try:
+                matrix = embeddings.load_vectors(folder, kb_hash, passages, embedder)
+                assert matrix.shape == (len(passages), embedder.dim)
+            except Exception as e:  # collected for the assertion below
+                errors.append(e)
+
+    threads = [threading.Thread(target=load) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert not [name for name in os.listdir(folder) if '.tmp' in name]
+    for kb_hash in kbs:
+        embeddings.delete_vectors(folder, kb_hash)
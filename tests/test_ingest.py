@@ -0,0 +1,28 @@
+import ingest
+import kb_pack
+import retrieval
+
+# Multi-byte characters and every kind of whitespace, cut at odd offsets
+TEXT = "kṛṣṇa\tarjuna  dharma\r\nkurukṣetra — the field\n\n" * 400
+
+
+def test_text_blocks_never_cut_words(tmp_path):
+    path = tmp_path / 'doc.txt'
+    path.write_bytes(TEXT.encode('utf-8'))
+    builder = retrieval.PassageBuilder()
+    blocks = list(ingest.iter_text_blocks(str(path), block_size=7))
+    for _, text in blocks:
+        builder.feed(text)
+    assert "".join(text for _, text in blocks) == TEXT
+    assert blocks[-1][0] == path.stat().st_size
+    assert builder.finish() == retrieval.split_passages(TEXT)
+
+
+def test_ingest_text_matches_whole_text_split(tmp_path):
+    path = tmp_path / 'doc.txt'
+    path.write_bytes(TEXT.encode('utf-8'))
+    kb_hash = 'f' * 64
+    ingest.ingest_text(str(path), kb_hash, str(tmp_path), name='doc.txt')
+    assert list(kb_pack.KBPack(kb_pack.pack_path(str(tmp_path), kb_hash))) == retrieval.split_passages(TEXT)
+    assert ingest.get_progress(kb_hash)['bytes_done'] == path.stat().st_size
+    ingest.clear_progress(kb_hash)
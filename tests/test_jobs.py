@@ -0,0 +1,56 @@
+import subprocess
+import sys
+import threading
+
+from jobs import JobQueue, JobStore
+
+
+def wait_finished(queue, job_id):
+    while queue.get(job_id)['state'] not in ('done', 'failed'):
+        threading.Event().wait(0.01)
+    return queue.get(job_id)
+
+
+def test_other_workers_see_and_share_a_job(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.db'))
+    # Two queues with one store stand in for two worker processes
+    owner = JobQueue(1, 'upload', store=store)
+    other = JobQueue(1, 'upload', store=store)
+    release = threading.Event()
+    calls = []
+
+    def convert():
+        calls.append(1)
+        release.wait(5)
+        return {"knowledge_base": "kb"}
+
+    job, created = owner.submit('abc', convert)
+    assert created
+    assert other.get('abc')['state'] in ('queued', 'running')
+    job, created = other.submit('abc', convert)
+    assert not created
+
+    owner.update('abc', progress={"pages_done": 3})
+    assert other.get('abc')['progress'] == {"pages_done": 3}
+    release.set()
+    assert wait_finished(other, 'abc')['result'] == {"knowledge_base": "kb"}
+    assert calls == [1]
+
+    assert other.forget('abc')
+    assert owner.get('abc') is None or owner.get('abc')['state'] == 'done'
+
+
+def test_jobs_of_exited_workers_read_as_failed(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.db'))
+    worker = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'],
+                            capture_output=True, text=True, check=True)
+    with store._connect() as conn:
+        conn.execute("INSERT INTO jobs (queue, id, pid, job) VALUES ('quiz', 'q1', ?, ?)",
+                     (int(worker.stdout), '{"id": "q1", "state": "running"}'))
+    assert store.get('quiz', 'q1')['state'] == 'failed'
+
+    # ... and may be submitted again
+    queue = JobQueue(1, 'quiz', store=store)
+    job, created = queue.submit('q1', lambda: {"file": "quiz.json"})
+    assert created
+    assert wait_finished(queue, 'q1')['state'] == 'done'
@@ -0,0 +1,26 @@
+from kb_store import KBStore
+
+
+def make_store(tmp_path, count=3):
+    store = KBStore(str(tmp_path / 'kb_index.db'))
+    for i in range(count):
+        store.add(f"{i:064x}-knowledge.json", f"doc{i}.txt", f"2024-01-0{i + 1}T00:00:00Z")
+    return store
+
+
+def test_list_pages_with_and_without_limit(tmp_path):
+    store = make_store(tmp_path)
+    names = [item['original_name'] for item in store.list()]
+    assert names == ['doc2.txt', 'doc1.txt', 'doc0.txt']
+    assert [item['original_name'] for item in store.list(offset=2)] == ['doc0.txt']
+    assert [item['original_name'] for item in store.list(limit=1, offset=1)] == ['doc1.txt']
+    assert [item['original_name'] for item in store.list(sort='original_name', descending=False, offset=1)] == \
+        ['doc1.txt', 'doc2.txt']
+
+
+def test_list_uploads_offset_without_limit(client):
+    import app
+    items = client.get('/api/list-uploads').get_json()
+    response = client.get('/api/list-uploads?offset=1')
+    assert response.get_json() == items[1:]
+    assert response.headers['X-Total-Count'] == str(app.kb_store.count())
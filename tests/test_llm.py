@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from llm import LLMDeadlineExceeded, LLMGateway
+from tools import fake_openai
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+@pytest.fixture
+def fake_server():
+    servers = []
+
+    def start(**config):
+        server, base_url = fake_openai.start_server(**config)
+        servers.append(server)
+        return base_url, server.RequestHandlerClass.stats
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def gateway(base_url, **kwargs):
+    kwargs.setdefault('backoff_base', 0.01)
+    return LLMGateway('test', base_url, **kwargs)
+
+
+@pytest.mark.parametrize('status', [429, 500, 503])
+def test_retries_rate_limits_and_server_errors(fake_server, status):
+    # Every second call fails, so each complete() after the first retries once
+    base_url, stats = fake_server(fail_every=2, fail_status=status)
+    llm = gateway(base_url)
+    for _ in range(3):
+        assert llm.complete('gpt-4', MESSAGES).choices[0].message.content == fake_openai.DEFAULT_REPLY
+    assert stats['calls'] == 5
+    assert llm.stats()['gpt-4']['retries'] == 2
+    assert llm.stats()['gpt-4']['errors'] == 0
+
+
+def test_gives_up_after_max_retries(fake_server):
+    base_url, stats = fake_server(fail_every=1, fail_status=503)
+    llm = gateway(base_url, max_retries=2)
+    with pytest.raises(Exception) as excinfo:
+        llm.complete('gpt-4', MESSAGES)
+    assert getattr(excinfo.value, 'status_code', None) == 503
+    assert stats['calls'] == 3
+    assert llm.stats()['gpt-4']['errors'] == 1
+
+
+def test_slow_call_exceeds_deadline(fake_server):
+    base_url, _ = fake_server(latency=2.0)
+    llm = gateway(base_url)
+    start = time.monotonic()
+    with pytest.raises(LLMDeadlineExceeded):
+        llm.complete('gpt-4', MESSAGES, deadline=0.3)
+    assert time.monotonic() - start < 1.5
+
+
+def test_queueing_for_a_slot_counts_against_the_deadline(fake_server):
+    base_url, _ = fake_server(latency=1.0)
+    llm = gateway(base_url, model_concurrency={'gpt-4': 1})
+    holder = threading.Thread(target=llm.complete, args=('gpt-4', MESSAGES))
+    holder.start()
+    time.sleep(0.2)
+    with pytest.raises(LLMDeadlineExceeded, match='slot'):
+        llm.complete('gpt-4', MESSAGES, deadline=0.2)
+    holder.join()
+
+
+def test_failed_calls_release_their_slot(fake_server):
+    base_url, _ = fake_server(fail_every=1, fail_status=500)
+    llm = gateway(base_url, max_retries=0, model_concurrency={'gpt-4': 1})
+    for _ in range(3):
+        with pytest.raises(Exception):
+            llm.complete('gpt-4', MESSAGES, deadline=1)
+        with pytest.raises(Exception):
+            list(llm.stream('gpt-4', MESSAGES, deadline=1))
+    # The single slot is free, so this does not wait for the deadline
+    assert llm._semaphore('gpt-4').acquire(timeout=0)
+
+
+def test_closing_a_stream_early_closes_the_upstream_response(fake_server):
+    base_url, stats = fake_server(tokens_per_sec=5)
+    llm = gateway(base_url, model_concurrency={'gpt-4': 1})
+    deltas = llm.stream('gpt-4', MESSAGES)
+    assert next(deltas)
+    deltas.close()
+
+    # The fake server notices the closed connection at its next token
+    deadline = time.monotonic() + 1.0
+    while stats['in_flight']['gpt-4'] and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert stats['in_flight']['gpt-4'] == 0
+    assert llm.stats()['gpt-4']['errors'] == 1
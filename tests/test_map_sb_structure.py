@@ -0,0 +1,54 @@
+import asyncio
+import math
+import os
+import sys
+
+import pytest
+
+from tools import fake_vedabase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static', 'quizzes'))
+
+import map_sb_structure  # noqa: E402
+import sb_crawler  # noqa: E402
+
+STRUCTURE = {1: {1: 7, 2: 11, 3: 14, 4: 44, 5: 1}, 2: {1: 2, 2: 23}}
+# Joined verses at the start, middle and end of chapters
+JOINED = {(1, 1): [(4, 6)], (1, 2): [(10, 11)], (1, 3): [(11, 13)], (1, 4): [(43, 44)], (2, 1): [(1, 2)],
+          (2, 2): [(3, 5), (8, 9), (20, 23)]}
+
+
+async def map_structure(base_url, tmp_path):
+    probes = sb_crawler.Checkpoint(str(tmp_path / 'probes.json'))
+    async with sb_crawler.HttpFetcher() as fetcher:
+        crawler = sb_crawler.Crawler(fetcher, probes, rate=1000, burst=10, log=lambda message: None)
+        mapper = map_sb_structure.StructureMapper(crawler, base_url, probes, str(tmp_path / 'structure.json'),
+                                                  log=lambda message: None)
+        structure = await mapper.map(refresh=True)
+    return structure, mapper.page_loads
+
+
+@pytest.mark.parametrize('joined_pages', ['redirect', 'first'])
+def test_maps_chapters_with_joined_verses(tmp_path, joined_pages):
+    server, base_url = fake_vedabase.start_server(structure=STRUCTURE, joined=JOINED, joined_pages=joined_pages)
+    try:
+        structure, page_loads = asyncio.run(map_structure(base_url, tmp_path))
+        expected = {str(canto): {str(chapter): verses for chapter, verses in chapters.items()}
+                    for canto, chapters in STRUCTURE.items()}
+        assert structure['cantos'] == expected
+        # O(log n) per chapter, not one load per verse
+        budget = sum(2 * math.ceil(math.log2(verses + 1)) + 4 for chapters in STRUCTURE.values()
+                     for verses in chapters.values())
+        assert page_loads <= budget
+
+        # Every probe is cached, so mapping again loads no pages
+        assert asyncio.run(map_structure(base_url, tmp_path)) == (structure, 0)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_page_verses_reads_joined_headings():
+    assert map_sb_structure.page_verses("Default View\nTexts 4-6\nśloka", 4) == [4, 6]
+    assert map_sb_structure.page_verses("Text 12\nTranslation", 12) == [12, 12]
+    assert map_sb_structure.page_verses("No heading", 3) == [3, 3]
@@ -0,0 +1,41 @@
+import gzip
+import json
+import os
+
+from quiz_corpus import QuizCorpus
+
+
+def write(path, data):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+def test_bundles_are_normalized_and_rebuilt_only_on_change(tmp_path):
+    quizzes, bundles = tmp_path / 'quizzes', tmp_path / 'bundles'
+    quizzes.mkdir()
+    write(quizzes / 'quiz_index.json', {"quizzes": [{"file": "a.json"}, {"file": "missing.json"}]})
+    write(quizzes / 'a.json', {"items": [
+        {"question": "Sky is blue?", "options": ["True", "False"], "answer": "true"},
+        {"question": "Pick one", "options": ["x", "y", "z"], "correct": 2, "category": "Misc"},
+        {"options": ["no question text"]},
+    ]})
+
+    corpus = QuizCorpus(str(quizzes), str(bundles))
+    assert corpus.build() == 1
+    entry = corpus.manifest['quizzes']['a.json']
+    with open(bundles / entry['bundle'], 'rb') as f:
+        body = f.read()
+    with open(bundles / (entry['bundle'] + '.gz'), 'rb') as f:
+        assert gzip.decompress(f.read()) == body
+    questions = json.loads(body)
+    assert [(q['type'], q['correct_answer']) for q in questions] == [('tf', 'True'), ('mcq', 'z')]
+    assert questions[1]['options'] == ['x', 'y', 'z', '']
+    assert entry['questions'] == 2 and entry['types'] == {'tf': 1, 'mcq': 1}
+
+    # The manifest survives a restart; unchanged sources are not rebuilt
+    assert QuizCorpus(str(quizzes), str(bundles)).build() == 0
+
+    write(quizzes / 'a.json', [{"question": "Only one", "options": ["p", "q", "r"], "answer": "q"}])
+    os.utime(quizzes / 'a.json', ns=(0, entry['source_mtime_ns'] + 10 ** 9))
+    assert corpus.current('a.json')['questions'] == 1
+    assert corpus.current('a.json')['etag'] != entry['etag']
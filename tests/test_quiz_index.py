@@ -0,0 +1,53 @@
+import json
+import os
+import threading
+
+import app
+
+
+def test_append_quiz_index_keeps_lock_out_of_quiz_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'QUIZ_DIR', str(tmp_path))
+    with open(tmp_path / 'quiz_index.json', 'w', encoding='utf-8') as f:
+        json.dump({"quizzes": [], "default_music": "theme.mp3"}, f)
+
+    threads = [threading.Thread(target=app.append_quiz_index, args=(f"quiz_{i}.json", f"Quiz {i}"))
+               for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    with open(tmp_path / 'quiz_index.json', 'r', encoding='utf-8') as f:
+        quizzes = json.load(f)['quizzes']
+    assert sorted(q['file'] for q in quizzes) == [f"quiz_{i}.json" for i in range(8)]
+    assert all(q['music'] == 'theme.mp3' for q in quizzes)
+    assert os.listdir(tmp_path) == ['quiz_index.json']
+
+
+def test_run_quiz_job_names_file_by_job_and_lists_it_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, 'QUIZ_DIR', str(tmp_path))
+    monkeypatch.setattr(app.retrieval, 'kb_text', lambda folder, kb_hash: "Some verses.")
+    monkeypatch.setattr(app.quiz_gen, 'generate_quiz',
+                        lambda *args, **kwargs: {"questions": [{"question": "Q?"}]})
+    monkeypatch.setattr(app.quiz_corpus, 'build', lambda files, logger=None: None)
+
+    for _ in range(2):
+        result = app.run_quiz_job('job123', ['a' * 64], 'My Quiz!')
+    assert result == {"file": "quiz_My_Quiz__job123.json", "questions": 1}
+
+    with open(tmp_path / 'quiz_index.json', 'r', encoding='utf-8') as f:
+        quizzes = json.load(f)['quizzes']
+    assert quizzes == [{"file": "quiz_My_Quiz__job123.json", "title": "My Quiz!"}]
+    assert sorted(os.listdir(tmp_path)) == ['quiz_My_Quiz__job123.json', 'quiz_index.json']
+
+
+def test_quiz_status_of_a_job_run_by_another_worker(client):
+    job = {"id": "f" * 32, "state": "done", "progress": None, "error": None,
+           "result": {"file": "quiz_Other_ffff.json", "questions": 5}}
+    app.job_store.put('quiz', job)
+    try:
+        response = client.get(f"/api/generate_quiz/status/{'f' * 32}")
+        assert response.status_code == 200
+        assert response.get_json()['result'] == job['result']
+    finally:
+        app.job_store.delete('quiz', 'f' * 32, finished_only=False)
@@ -0,0 +1,79 @@
+import json
+import os
+
+import pytest
+
+import app
+from quiz_corpus import QuizCorpus
+from quiz_sessions import QuizSessions
+
+QUESTIONS = [
+    {"question": "Capital of India?", "options": ["Mumbai", "New Delhi", "Kolkata", "Chennai"],
+     "answer": "New Delhi", "category": "Geography", "difficulty": "easy"},
+    {"question": "The Ganga flows into the Bay of Bengal.", "options": ["True", "False"],
+     "answer": "true", "category": "Geography", "difficulty": "medium"},
+    {"question": "Who wrote the Mahabharata?", "options": ["Valmiki", "Vyasa", "Kalidasa", "Tulsidas"],
+     "correct": 1, "category": "Literature", "difficulty": "hard"},
+] + [{"question": f"Filler {i}?", "options": ["a", "b", "c", "d"], "answer": "a",
+      "category": "Misc", "difficulty": "easy"} for i in range(7)]
+
+
+def write_quiz(quizzes_dir, questions):
+    with open(os.path.join(quizzes_dir, 'quiz_index.json'), 'w', encoding='utf-8') as f:
+        json.dump({"quizzes": [{"file": "india.json", "title": "India"}]}, f)
+    with open(os.path.join(quizzes_dir, 'india.json'), 'w', encoding='utf-8') as f:
+        json.dump({"questions": questions}, f)
+
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    write_quiz(str(tmp_path), QUESTIONS)
+    corpus = QuizCorpus(str(tmp_path), str(tmp_path / 'bundles'))
+    corpus.build()
+    sessions = QuizSessions(corpus)
+    monkeypatch.setattr(app, 'quiz_sessions', sessions)
+    return sessions
+
+
+def test_check_normalizes_answers(sessions):
+    index = sessions.get('india.json')
+    assert index.check(0, "  new delhi ")['correct']
+    assert not index.check(0, "Mumbai")['correct']
+    # True/false answers are capitalized; option indexes become the option text
+    assert index.check(1, "TRUE") == {"id": 1, "correct": True, "correct_answer": "True", "explanation": ""}
+    assert index.check(2, "Vyasa")['correct']
+
+
+def test_pages_are_stable_filtered_and_hide_answers(sessions):
+    index = sessions.get('india.json')
+    first, total = index.page({}, seed=5, size=4, page=0)
+    rest = index.page({}, seed=5, size=4, page=1)[0] + index.page({}, seed=5, size=4, page=2)[0]
+    assert total == len(QUESTIONS)
+    assert sorted(q['id'] for q in first + rest) == list(range(len(QUESTIONS)))
+    assert first == index.page({}, seed=5, size=4, page=0)[0]
+    assert all('correct_answer' not in q for q in first)
+
+    geography, total = index.page({"category": ["geography"], "difficulty": ["easy", "medium"]}, 1, 10, 0)
+    assert total == 2 and {q['id'] for q in geography} == {0, 1}
+
+
+def test_check_route_scores_answers_and_rejects_stale_sessions(client, sessions, tmp_path):
+    session = client.get('/api/quiz/india/session?n=3&seed=1').get_json()
+    version = session['version']
+    response = client.post('/api/quiz/india/check', json={"version": version, "answers": [
+        {"id": 0, "answer": "New Delhi"}, {"id": 2, "answer": "Valmiki"}]})
+    body = response.get_json()
+    assert body['score'] == 1
+    assert [r['correct'] for r in body['results']] == [True, False]
+    assert body['results'][1]['correct_answer'] == "Vyasa"
+
+    assert client.post('/api/quiz/india/check', json={"id": 99, "answer": "x"}).status_code == 400
+    assert client.post('/api/quiz/india/check', json={}).status_code == 400
+    assert client.post('/api/quiz/nope/check', json={"id": 0}).status_code == 404
+
+    # Editing the quiz changes its version; answers from the old session are refused
+    write_quiz(str(tmp_path), QUESTIONS[:5])
+    os.utime(tmp_path / 'india.json', ns=(0, os.stat(tmp_path / 'india.json').st_mtime_ns + 10 ** 9))
+    response = client.post('/api/quiz/india/check', json={"version": version, "id": 0, "answer": "New Delhi"})
+    assert response.status_code == 409
+    assert response.get_json()['version'] != version
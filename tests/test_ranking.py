@@ -0,0 +1,50 @@
+import embeddings
+import ranking
+import retrieval
+
+DUPLICATE = "The king asked the sages about dharma by the river at dawn."
+PASSAGES = [
+    DUPLICATE,
+    DUPLICATE + " Again.",
+    DUPLICATE + " Once more.",
+    "Dharma, the sages told the king, is the duty each person owes.",
+    "Festival lights and temple music filled the city at night.",
+]
+
+
+def make_kb(tmp_path, passages=PASSAGES):
+    kb_hash = f"{7:064x}"
+    retrieval.write_passage_index(str(tmp_path), kb_hash, passages)
+    return str(tmp_path), kb_hash
+
+
+def rank(tmp_path, **kwargs):
+    folder, kb_hash = make_kb(tmp_path)
+    return ranking.rank(folder, [kb_hash], "What did the king ask the sages about dharma?",
+                        embedder=embeddings.HashingEmbedder(), **kwargs)
+
+
+def test_mmr_prefers_new_evidence_over_near_duplicates(tmp_path):
+    relevance_only = [r['passage'] for r in rank(tmp_path, mmr_lambda=1.0, max_passages=2)]
+    assert set(relevance_only) <= {0, 1, 2}
+
+    diverse = [r['passage'] for r in rank(tmp_path, mmr_lambda=0.5, max_passages=2)]
+    assert 3 in diverse
+    assert len(set(diverse) & {0, 1, 2}) == 1
+
+
+def test_selection_stays_within_the_token_budget(tmp_path):
+    budget = ranking.estimate_tokens(PASSAGES[0]) + ranking.estimate_tokens(PASSAGES[3])
+    results = rank(tmp_path, token_budget=budget)
+    assert sum(ranking.estimate_tokens(r['text']) for r in results) <= budget
+    assert results and [r['score'] for r in results] == sorted((r['score'] for r in results), reverse=True)
+
+    # A budget smaller than every passage selects nothing
+    assert rank(tmp_path, token_budget=1) == []
+
+
+def test_shorter_passage_fills_budget_left_by_a_long_one(tmp_path):
+    folder, kb_hash = make_kb(tmp_path, ["dharma " * 400, "The king spoke of dharma."])
+    results = ranking.rank(folder, [kb_hash], "dharma king", token_budget=50,
+                           embedder=embeddings.HashingEmbedder())
+    assert [r['passage'] for r in results] == [1]
@@ -0,0 +1,73 @@
+import io
+import time
+import uuid
+
+import pytest
+
+import app
+from llm import LLMGateway
+from response_cache import ResponseCache, cache_key
+from tools import fake_openai
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    server, base_url = fake_openai.start_server(latency=0.0, tokens_per_sec=0)
+    monkeypatch.setattr(app, 'llm', LLMGateway('test', base_url, deadline=10))
+    yield server.RequestHandlerClass.stats
+    server.shutdown()
+    server.server_close()
+
+
+def test_key_ignores_question_formatting_but_not_the_kb_set():
+    key = cache_key('smart', 'teacher', 'calm', ['b', 'a'], "What is dharma?", 'gpt-4')
+    assert key == cache_key('smart', 'teacher', 'calm', ['a', 'b'], "  what is   DHARMA ", 'gpt-4')
+    assert key != cache_key('smart', 'teacher', 'calm', ['a', 'c'], "What is dharma?", 'gpt-4')
+
+
+def test_purging_a_kb_drops_only_answers_grounded_in_it(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'responses.db'), ttl_seconds=60, max_bytes=1 << 20)
+    cache.put('both', "answer 1", ['a', 'b'])
+    cache.put('other', "answer 2", ['c'])
+    assert cache.get('both') == "answer 1"
+
+    assert cache.purge_kb('b') == 1
+    assert cache.get('both') is None
+    assert cache.get('other') == "answer 2"
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+
+
+def upload_kb(client, text):
+    response = client.post('/api/upload', data={'file': (io.BytesIO(text.encode()), 'notes.txt')},
+                           content_type='multipart/form-data')
+    job_id = response.get_json()['job_id']
+    deadline = time.monotonic() + 10
+    while client.get(f'/api/upload/status/{job_id}').get_json()['state'] != 'done':
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    return f"{job_id}-knowledge.json"
+
+
+def test_changing_a_kb_invalidates_its_cached_answers(client, fake_llm):
+    text = f"The king asked the sages about dharma {uuid.uuid4().hex}. " * 50
+    question = {"role": "teacher", "mood": "calm", "mode": "smart", "question": "What did the king ask?"}
+
+    def ask(kb_filename):
+        return client.post('/api/chat', json=dict(question, knowledge_bases=[kb_filename])).get_json()
+
+    kb_filename = upload_kb(client, text)
+    assert 'cached' not in ask(kb_filename)
+    assert ask(kb_filename)['cached'] is True
+    assert fake_llm['calls'] == 1
+
+    # Deleting the KB purges its answers, so the same upload is asked afresh
+    assert client.delete(f'/api/delete-upload/{kb_filename}').get_json()['success']
+    assert upload_kb(client, text) == kb_filename
+    assert 'cached' not in ask(kb_filename)
+    assert fake_llm['calls'] == 2
+
+    # Edited content is a different KB hash, hence a different cache key
+    edited = upload_kb(client, text + "The sages answered.")
+    assert edited != kb_filename
+    assert 'cached' not in ask(edited)
+    assert fake_llm['calls'] == 3
@@ -0,0 +1,70 @@
+import json
+import os
+import random
+import threading
+
+import retrieval
+from kb_cache import cache
+
+WORDS = "king sages dharma river chapter festival lights student temple music".split()
+
+
+def make_text(words, seed):
+    rng = random.Random(seed)
+    return " ".join(f"{rng.choice(WORDS)} w{rng.randrange(5000)}" for _ in range(words))
+
+
+def write_legacy_kb(folder, kb_hash, text):
+    # Uploads from before kb_pack: only the JSON blob, indexed on first use
+    with open(retrieval.legacy_knowledge_path(folder, kb_hash), 'w', encoding='utf-8') as f:
+        json.dump({"content": text}, f)
+
+
+def test_concurrent_searches_migrate_legacy_kbs(tmp_path):
+    folder = str(tmp_path)
+    hashes = [f"{i:064x}" for i in range(20)]
+    for i, kb_hash in enumerate(hashes):
+        write_legacy_kb(folder, kb_hash, make_text(3000, seed=i))
+    cache.clear()
+
+    errors = []
+    results = []
+
+    def search():
+        for kb_hash in hashes:
+            try:
+                results.append(retrieval.search(folder, [kb_hash], "king sages dharma", top_k=3))
+            except Exception as e:  # collected for the assertion below
+                errors.append(e)
+
+    threads = [threading.Thread(target=search) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert len(results) == 80 and all(results)
+    assert not [name for name in os.listdir(folder) if name.endswith('.tmp')]
+    for kb_hash in hashes:
+        assert retrieval.kb_text(folder, kb_hash) is not None
+
+
+def test_converter_keeps_json_unless_asked_to_delete_it(tmp_path, monkeypatch):
+    import kb_pack
+
+    folder = str(tmp_path)
+    kb_hash = f"{1:064x}"
+    text = make_text(500, seed=1)
+    write_legacy_kb(folder, kb_hash, text)
+    legacy = retrieval.legacy_knowledge_path(folder, kb_hash)
+
+    monkeypatch.setattr('sys.argv', ['kb_pack.py', folder])
+    kb_pack.main()
+    assert os.path.exists(legacy)
+    assert list(kb_pack.KBPack(kb_pack.pack_path(folder, kb_hash))) == retrieval.split_passages(text)
+
+    monkeypatch.setattr('sys.argv', ['kb_pack.py', folder, '--delete-json'])
+    kb_pack.main()
+    assert not os.path.exists(legacy)
+    assert retrieval.kb_exists(folder, kb_hash)
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+from tools import fake_vedabase
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'static', 'quizzes'))
+
+import sb_crawler  # noqa: E402
+
+CHAPTERS = {canto: len(chapters) for canto, chapters in fake_vedabase.DEFAULT_STRUCTURE.items()}
+CHAPTER_COUNT = sum(CHAPTERS.values())
+
+
+@pytest.fixture
+def site():
+    server, base_url = fake_vedabase.start_server()
+    yield server, base_url
+    server.shutdown()
+    server.server_close()
+
+
+class InterruptingFetcher:
+    """Fetches through fetcher, interrupting the crawl instead of the (limit + 1)th request."""
+
+    def __init__(self, fetcher, limit):
+        self.fetcher = fetcher
+        self.limit = limit
+        self.run = None
+
+    async def fetch(self, url):
+        if self.limit == 0:
+            self.run.cancel()
+            await asyncio.Event().wait()
+        self.limit -= 1
+        return await self.fetcher.fetch(url)
+
+
+async def crawl(base_url, out_dir, checkpoint_path, stop_after=None, **options):
+    """Crawl every chapter; with stop_after, interrupt the crawl after that many pages."""
+    checkpoint = sb_crawler.Checkpoint(checkpoint_path)
+    async with sb_crawler.HttpFetcher() as fetcher:
+        if stop_after is not None:
+            fetcher = InterruptingFetcher(fetcher, stop_after)
+        crawler = sb_crawler.Crawler(fetcher, checkpoint, log=lambda message: None, backoff_base=0.01, **options)
+        run = asyncio.ensure_future(crawler.run(sb_crawler.chapter_tasks(base_url, out_dir, CHAPTERS)))
+        if stop_after is not None:
+            fetcher.run = run
+        try:
+            await run
+        except asyncio.CancelledError:
+            pass
+    return crawler.stats, checkpoint
+
+
+def test_resumed_crawl_fetches_only_unfinished_chapters(site, tmp_path):
+    server, base_url = site
+    out_dir = str(tmp_path / 'sb')
+    checkpoint_path = str(tmp_path / 'state.json')
+
+    _, checkpoint = asyncio.run(crawl(base_url, out_dir, checkpoint_path, stop_after=3,
+                                      concurrency=1, rate=1000, burst=10))
+    done = set(checkpoint.results)
+    assert len(done) == 3
+    assert server.stats['chapter_pages'] == 3
+
+    stats, checkpoint = asyncio.run(crawl(base_url, out_dir, checkpoint_path, concurrency=2, rate=1000, burst=10))
+    assert stats['skipped'] == len(done)
+    assert stats['fetched'] == CHAPTER_COUNT - len(done)
+    assert server.stats['chapter_pages'] == CHAPTER_COUNT
+    for canto, chapters in fake_vedabase.DEFAULT_STRUCTURE.items():
+        for chapter, verses in chapters.items():
+            assert checkpoint.results[f"{canto}.{chapter}"]['verses'] == verses
+            assert os.path.exists(os.path.join(out_dir, f"canto{canto}", f"SB_Canto{canto}_Chapter{chapter}.txt"))
+
+
+def test_transient_errors_are_retried(tmp_path):
+    server, base_url = fake_vedabase.start_server(fail_every=3)
+    try:
+        stats, checkpoint = asyncio.run(crawl(base_url, str(tmp_path / 'sb'), str(tmp_path / 'state.json'),
+                                              rate=1000, burst=10))
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert stats['failed'] == 0
+    assert stats['retries'] == server.stats['failed'] > 0
+    assert len(checkpoint.results) == CHAPTER_COUNT
+
+
+def test_requests_keep_to_the_host_rate(site, tmp_path):
+    _, base_url = site
+    start = time.monotonic()
+    stats, _ = asyncio.run(crawl(base_url, str(tmp_path / 'sb'), str(tmp_path / 'state.json'),
+                                 concurrency=4, rate=20, burst=1))
+    # The first request uses the initial token; every later one waits 1/rate
+    assert time.monotonic() - start >= (CHAPTER_COUNT - 1) / 20 * 0.9
+    assert stats['fetched'] == CHAPTER_COUNT
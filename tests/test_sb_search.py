@@ -0,0 +1,34 @@
+import os
+import shutil
+
+import sb_search
+
+CORPUS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static', 'quizzes',
+                      'sb_advanced', 'canto1')
+
+
+def add_chapter(corpus_dir, chapter):
+    name = f"SB_Canto1_Chapter{chapter}.txt"
+    shutil.copy(os.path.join(CORPUS, name), os.path.join(corpus_dir, name))
+
+
+def test_rebuild_swaps_postings_and_meta_together(tmp_path):
+    corpus_dir, index_dir = tmp_path / 'corpus', tmp_path / 'index'
+    corpus_dir.mkdir()
+    add_chapter(corpus_dir, 1)
+    verses = sb_search.build_index(str(corpus_dir), str(index_dir))
+    old = sb_search.SBIndex(str(index_dir), str(corpus_dir))
+    old_total, old_results = old.search('sages naimisaranya')
+    assert old_total and all(r['chapter'] == 1 for r in old_results)
+
+    add_chapter(corpus_dir, 2)
+    assert sb_search.is_stale(str(corpus_dir), str(index_dir))
+    assert sb_search.build_index(str(corpus_dir), str(index_dir)) > verses
+    new = sb_search.SBIndex(str(index_dir), str(corpus_dir))
+
+    # Each build has its own postings; only the current ones are kept
+    assert new.postings_name != old.postings_name
+    assert sorted(os.listdir(index_dir)) == sorted(['meta.json', new.postings_name])
+    assert {r['chapter'] for r in new.search('sages', top_k=100)[1]} == {1, 2}
+    # A reader opened before the rebuild still answers from its own build
+    assert old.search('sages naimisaranya') == (old_total, old_results)
@@ -0,0 +1,73 @@
+import gzip
+import os
+import re
+
+import pytest
+from flask import Flask
+
+from static_cache import IMMUTABLE_MAX_AGE, StaticFiles
+
+BODY = b"body { color: #333; }\n" * 200
+
+
+@pytest.fixture
+def files(tmp_path):
+    root = tmp_path / 'static'
+    root.mkdir()
+    (root / 'style.css').write_bytes(BODY)
+    (root / 'app.3f2a9c1d7e.js').write_bytes(b"console.log('x');\n")
+    static_files = StaticFiles(str(root), str(tmp_path / 'variants'))
+    app = Flask(__name__, static_folder=None)
+    app.add_url_rule('/static/<path:filename>', 'static_file',
+                     lambda filename: static_files.send(str(root), filename))
+    return app.test_client(), tmp_path
+
+
+def test_etag_and_not_modified(files):
+    client, _ = files
+    response = client.get('/static/style.css')
+    assert response.status_code == 200
+    assert response.data == BODY
+    etag = response.headers['ETag']
+    assert response.headers['Cache-Control'] == 'no-cache'
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    assert client.get('/static/style.css', headers={'If-None-Match': etag}).status_code == 304
+    # Another representation of the file does not match a plain ETag
+    assert client.get('/static/style.css', headers={'If-None-Match': etag,
+                                                     'Accept-Encoding': 'gzip'}).status_code == 200
+
+
+def test_gzip_variant_is_built_once_and_revalidated(files):
+    client, tmp_path = files
+    response = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == BODY
+    assert os.path.exists(tmp_path / 'variants' / 'style.css.gz')
+    assert client.get('/static/style.css', headers={'Accept-Encoding': 'gzip',
+                                                    'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    # A changed file gets a new ETag and a fresh variant
+    changed = BODY + b"p { margin: 0; }\n"
+    (tmp_path / 'static' / 'style.css').write_bytes(changed)
+    os.utime(tmp_path / 'static' / 'style.css', ns=(0, os.stat(tmp_path / 'variants' / 'style.css.gz').st_mtime_ns + 1))
+    fresh = client.get('/static/style.css', headers={'Accept-Encoding': 'gzip'})
+    assert fresh.headers['ETag'] != response.headers['ETag']
+    assert gzip.decompress(fresh.data) == changed
+
+
+def test_only_pinned_urls_are_immutable(files):
+    client, _ = files
+    etag = client.get('/static/style.css').headers['ETag'].strip('"')
+    assert client.get(f'/static/style.css?v={etag[:12]}').headers['Cache-Control'] == \
+        f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    # A stale version must be revalidated rather than cached for a year
+    assert client.get('/static/style.css?v=0123456789ab').headers['Cache-Control'] == 'no-cache'
+    assert 'immutable' in client.get('/static/app.3f2a9c1d7e.js').headers['Cache-Control']
+
+
+def test_index_pins_lucide_to_its_content(client):
+    page = client.get('/').get_data(as_text=True)
+    url = re.search(r'src="(/static/lucide\.min\.js[^"]*)"', page).group(1)
+    assert 'immutable' in client.get(url).headers['Cache-Control']
+    assert client.get('/static/lucide.min.js').headers['Cache-Control'] == 'no-cache'
@@ -0,0 +1,84 @@
+import hashlib
+import io
+import time
+
+TEXT = b"The king asked the sages about dharma by the river. " * 200
+
+
+def upload(client, data=TEXT, name='notes.txt'):
+    return client.post('/api/upload', data={'file': (io.BytesIO(data), name)},
+                       content_type='multipart/form-data')
+
+
+def wait_done(client, job_id, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f'/api/upload/status/{job_id}').get_json()
+        if job['state'] in ('done', 'failed'):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"upload job {job_id} did not finish")
+
+
+def listed(client):
+    return [item['hash_name'] for item in client.get('/api/list-uploads').get_json()]
+
+
+def test_reupload_after_delete_rebuilds_kb(client):
+    file_hash = hashlib.sha256(TEXT).hexdigest()
+    kb_filename = f"{file_hash}-knowledge.json"
+
+    response = upload(client)
+    assert response.status_code == 202
+    assert wait_done(client, file_hash)['state'] == 'done'
+    assert kb_filename in listed(client)
+
+    assert client.delete(f'/api/delete-upload/{kb_filename}').get_json()['success']
+    assert kb_filename not in listed(client)
+
+    response = upload(client)
+    assert response.status_code == 202
+    assert wait_done(client, file_hash)['state'] == 'done'
+    assert kb_filename in listed(client)
+    assert upload(client).status_code == 200
+
+
+def test_precheck_reports_deleted_kb_as_missing(client):
+    data = TEXT + b"Precheck."
+    file_hash = hashlib.sha256(data).hexdigest()
+    kb_filename = f"{file_hash}-knowledge.json"
+    assert client.get(f'/api/upload/{file_hash}').status_code == 404
+
+    upload(client, data)
+    wait_done(client, file_hash)
+    assert client.get(f'/api/upload/{file_hash}').get_json()['exists'] is True
+
+    # Deleted through another worker: this one still holds the done job
+    import app
+    app.retrieval.delete_kb(app.UPLOAD_FOLDER, file_hash)
+    app.kb_store.delete(kb_filename)
+    assert app.upload_jobs.get(file_hash)['state'] == 'done'
+    response = client.get(f'/api/upload/{file_hash}')
+    assert response.status_code == 404
+    assert response.get_json() == {"exists": False}
+
+
+def test_chunked_json_keeps_single_request_limit(client):
+    import app
+    response = client.post('/api/upload/chunked', json={"filename": "big.json", "size": app.MAX_CONTENT_LENGTH + 1})
+    assert response.status_code == 400
+    response = client.post('/api/upload/chunked', json={"filename": "big.txt", "size": app.MAX_CONTENT_LENGTH + 1})
+    assert response.status_code == 201
+    client.delete(response.get_json()['upload_url'])
+
+
+def test_status_of_a_job_running_in_another_worker(client):
+    import app
+    file_hash = hashlib.sha256(b"converted elsewhere").hexdigest()
+    app.job_store.put('upload', {"id": file_hash, "state": "running", "progress": None, "result": None})
+    try:
+        job = client.get(f'/api/upload/status/{file_hash}').get_json()
+        assert job['state'] == 'running'
+        assert client.get(f'/api/upload/{file_hash}').get_json()['status'] == 'running'
+    finally:
+        app.job_store.delete('upload', file_hash, finished_only=False)
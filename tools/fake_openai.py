@@ -0,0 +1,184 @@
+"""Minimal OpenAI-compatible chat completions server for offline testing.
+
+Run it and point the app at it:
+
+    python tools/fake_openai.py --port 8765 --latency 0.2 --tokens-per-sec 50
+    OPENAI_API_KEY=test OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python app.py
+
+Supports ``POST /v1/chat/completions`` with and without ``stream``. Quiz
+generation prompts (asking for "exactly N questions") get a valid quiz
+JSON object back; everything else gets a canned answer. The handler's
+``stats`` count the calls and record the peak number of requests in
+flight per model.
+"""
+import argparse
+import json
+import re
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = ("This is a reply from the fake OpenAI server. It is split into word tokens "
+                 "so streaming clients receive several deltas before the final chunk.")
+
+
+def make_quiz(count, source_text):
+    # Questions quote words of the source so each section yields distinct ones
+    words = source_text.split() or ["text"]
+    questions = []
+    for i in range(count):
+        topic = " ".join(words[(i * 7) % len(words):(i * 7) % len(words) + 3])
+        options = [f"Option {i}-{j}" for j in range(4)]
+        questions.append({"question": f"What follows '{topic}' in the text?",
+                          "options": options, "answer": options[i % 4]})
+    return json.dumps({"questions": questions})
+
+
+def reply_for(messages):
+    text = " ".join(str(m.get('content', '')) for m in messages)
+    match = re.search(r'exactly (\d+) questions', text)
+    if match:
+        user_text = " ".join(str(m.get('content', '')) for m in messages if m.get('role') == 'user')
+        return make_quiz(int(match.group(1)), user_text)
+    return DEFAULT_REPLY
+
+
+def split_tokens(text):
+    return re.findall(r'\S+\s*|\s+', text)
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = {"latency": 0.0, "tokens_per_sec": 0.0, "fail_every": 0, "fail_status": 429}
+    stats = {"calls": 0, "in_flight": {}, "max_in_flight": {}}
+    _calls_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {"error": {"message": "Not found"}})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+
+        with self._calls_lock:
+            self.stats['calls'] += 1
+            call = self.stats['calls']
+        fail_every = self.config['fail_every']
+        if fail_every and call % fail_every == 0:
+            if self.config['fail_status'] == 429:
+                self._send_json(429, {"error": {"message": "Rate limit reached (fake)", "type": "rate_limit"}})
+            else:
+                self._send_json(self.config['fail_status'], {"error": {"message": "Server error (fake)",
+                                                                       "type": "server_error"}})
+            return
+
+        model = request.get('model', 'gpt-3.5-turbo')
+        with self._calls_lock:
+            in_flight = self.stats['in_flight'][model] = self.stats['in_flight'].get(model, 0) + 1
+            self.stats['max_in_flight'][model] = max(in_flight, self.stats['max_in_flight'].get(model, 0))
+        try:
+            self._complete(request, model)
+        finally:
+            with self._calls_lock:
+                self.stats['in_flight'][model] -= 1
+
+    def _complete(self, request, model):
+        time.sleep(self.config['latency'])
+        reply = reply_for(request.get('messages', []))
+        tokens = split_tokens(reply)
+        delay = 1.0 / self.config['tokens_per_sec'] if self.config['tokens_per_sec'] else 0.0
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        usage = {"prompt_tokens": sum(len(str(m.get('content', '')).split()) for m in request.get('messages', [])),
+                 "completion_tokens": len(tokens)}
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+        if not request.get('stream'):
+            time.sleep(delay * len(tokens))
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply},
+                             "finish_reason": "stop"}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+        def send_event(data):
+            payload = f"data: {data}\n\n".encode()
+            self.wfile.write(b"%x\r\n" % len(payload) + payload + b"\r\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish_reason=None):
+            return json.dumps({
+                "id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            })
+
+        send_event(chunk({"role": "assistant", "content": ""}))
+        for token in tokens:
+            time.sleep(delay)
+            send_event(chunk({"content": token}))
+        send_event(chunk({}, "stop"))
+        send_event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # Clients that hang up mid-stream are expected, not errors
+        if not isinstance(sys.exc_info()[1], (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+
+def start_server(host='127.0.0.1', port=0, latency=0.0, tokens_per_sec=0.0, fail_every=0, fail_status=429):
+    """Start the fake server in a daemon thread; returns (server, base_url)."""
+    handler = type('ConfiguredFakeOpenAIHandler', (FakeOpenAIHandler,), {
+        "config": {"latency": latency, "tokens_per_sec": tokens_per_sec, "fail_every": fail_every,
+                   "fail_status": fail_status},
+        "stats": {"calls": 0, "in_flight": {}, "max_in_flight": {}},
+    })
+    server = FakeOpenAIServer((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds before the first token")
+    parser.add_argument('--tokens-per-sec', type=float, default=0.0, help="0 means no per-token delay")
+    parser.add_argument('--fail-every', type=int, default=0, help="answer every Nth call with an error")
+    parser.add_argument('--fail-status', type=int, default=429, help="HTTP status of those errors")
+    args = parser.parse_args()
+    server, base_url = start_server(args.host, args.port, args.latency, args.tokens_per_sec, args.fail_every,
+                                    args.fail_status)
+    print(f"Fake OpenAI server listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+"""Local stand-in for the vedabase.io Srimad-Bhagavatam pages, for crawler tests.
+
+Run it and point the crawler or structure mapper at it:
+
+    python tools/fake_vedabase.py --port 8766
+    python static/quizzes/sb_crawler.py --base-url http://127.0.0.1:8766 --fetcher http
+
+Serves ``/en/library/sb/<canto>/<chapter>/advanced-view/`` (a whole
+chapter) and ``/en/library/sb/<canto>/<chapter>/<verse>/`` (one verse).
+Joined verses (``Texts 4-6``) have one page, ``.../4-6/``; with
+``joined_pages='redirect'`` the numbers inside the range redirect to it,
+with ``'first'`` only ``.../4/`` shows it and 5 and 6 are not found.
+The text inside ``<main>`` follows the layout of the real pages: viewer
+noise, the chapter heading and title, then ``Text N`` blocks with
+Devanagari, transliteration, Synonyms, Translation and Purport. Anything
+outside the structure is a 404 "Not Found!" page.
+
+By default a small synthetic structure is served; ``--corpus`` serves the
+chapter files under static/quizzes/sb_advanced verbatim instead.
+"""
+import argparse
+import html
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import sb_corpus  # noqa: E402
+
+# canto -> chapter -> verse count
+DEFAULT_STRUCTURE = {1: {1: 23, 2: 34, 3: 44}, 2: {1: 39, 2: 37}, 3: {1: 45, 2: 1}}
+# (canto, chapter) -> [(first, last), ...] verses shown on one page
+DEFAULT_JOINED = {(1, 2): [(4, 6)], (1, 3): [(43, 44)], (2, 2): [(36, 37)]}
+NOISE_LINES = ["Default ViewAdvanced View", "Dual Language View",
+               "DevanagariVerse TextSynonymsTranslationPurport", ""]
+PAGE_RE = re.compile(r'^/en/library/sb/(\d+)/(\d+)/(advanced-view|\d+(?:-\d+)?)/?$')
+
+ONES = ["", "ONE", "TWO", "THREE", "FOUR", "FIVE", "SIX", "SEVEN", "EIGHT", "NINE", "TEN", "ELEVEN",
+        "TWELVE", "THIRTEEN", "FOURTEEN", "FIFTEEN", "SIXTEEN", "SEVENTEEN", "EIGHTEEN", "NINETEEN"]
+TENS = ["", "", "TWENTY", "THIRTY", "FORTY", "FIFTY", "SIXTY", "SEVENTY", "EIGHTY", "NINETY"]
+
+
+def number_words(n):
+    if n < 20:
+        return ONES[n]
+    return TENS[n // 10] + (f"-{ONES[n % 10]}" if n % 10 else "")
+
+
+def verse_groups(verses, joined=()):
+    """(first, last) of each verse page of a chapter, in order."""
+    starts = {first: last for first, last in joined}
+    groups = []
+    verse = 1
+    while verse <= verses:
+        groups.append((verse, starts.get(verse, verse)))
+        verse = groups[-1][1] + 1
+    return groups
+
+
+def verse_label(first, last):
+    return f"{first}-{last}" if last != first else str(first)
+
+
+def verse_lines(canto, chapter, verse):
+    return [
+        f"Texts {verse}" if '-' in str(verse) else f"Text {verse}",
+        f"श्लोक {canto}.{chapter}.{verse} ॥",
+        f"śloka {canto} {chapter} {verse} kṛṣṇa-kathā",
+        "Synonyms",
+        f"śloka — verse {verse}; kṛṣṇa — Lord Kṛṣṇa; kathā — narration.",
+        "Translation",
+        f"This is the translation of verse {verse} of chapter {chapter} in canto {canto}.",
+        "Purport",
+        f"This purport explains verse {verse} of chapter {chapter} in canto {canto}.",
+    ]
+
+
+def chapter_lines(canto, chapter, verses, joined=()):
+    lines = NOISE_LINES + [f"CHAPTER {number_words(chapter)}", "", f"Synthetic Chapter {canto}.{chapter}"]
+    for first, last in verse_groups(verses, joined):
+        lines.extend(verse_lines(canto, chapter, verse_label(first, last)))
+    lines.append(f"Thus end the Bhaktivedanta purports of Canto {canto}, Chapter {chapter}.")
+    return lines
+
+
+def corpus_structure(corpus_dir):
+    """canto -> chapter -> verse count for the chapter files under corpus_dir."""
+    structure = {}
+    for canto, chapter, path in sb_corpus.chapter_files(corpus_dir):
+        verses = sb_corpus.parse_chapter(path, canto, chapter)['verses']
+        if verses:
+            structure.setdefault(canto, {})[chapter] = max(v['last'] for v in verses)
+    return structure
+
+
+def render(lines):
+    body = "".join(f"<div>{html.escape(line)}</div>" for line in lines)
+    return f"<!DOCTYPE html><html><head><title>Vedabase</title></head><body><nav>Library</nav><main>{body}</main></body></html>"
+
+
+class FakeVedabaseHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    config = {"structure": DEFAULT_STRUCTURE, "joined": DEFAULT_JOINED, "joined_pages": "redirect",
+              "corpus_dir": None, "latency": 0.0, "fail_every": 0}
+    stats = Counter()
+    _lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_html(self, status, lines):
+        body = render(lines).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_redirect(self, location):
+        self.send_response(301)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _page_lines(self, canto, chapter, page):
+        """Lines of a page, a redirect target (str), or None when not found."""
+        verses = self.config['structure'].get(canto, {}).get(chapter)
+        if verses is None:
+            return None
+        joined = self.config['joined'].get((canto, chapter), ())
+        if page == 'advanced-view':
+            if self.config['corpus_dir']:
+                path = os.path.join(self.config['corpus_dir'], f"canto{canto}", f"SB_Canto{canto}_Chapter{chapter}.txt")
+                with open(path, 'r', encoding='utf-8') as f:
+                    return f.read().split('\n')
+            return chapter_lines(canto, chapter, verses, joined)
+        first, _, last = page.partition('-')
+        first, last = int(first), int(last or first)
+        for group in verse_groups(verses, joined):
+            label = verse_label(*group)
+            if page == label:
+                return NOISE_LINES + verse_lines(canto, chapter, label)
+            if group[0] <= first <= group[1] and first == last:
+                if self.config['joined_pages'] == 'redirect':
+                    return f"/en/library/sb/{canto}/{chapter}/{label}/"
+                if first == group[0]:
+                    return NOISE_LINES + verse_lines(canto, chapter, label)
+        return None
+
+    def do_GET(self):
+        with self._lock:
+            self.stats['requests'] += 1
+            call = self.stats['requests']
+        fail_every = self.config['fail_every']
+        if fail_every and call % fail_every == 0:
+            with self._lock:
+                self.stats['failed'] += 1
+            self._send_html(503, ["Service Unavailable"])
+            return
+        time.sleep(self.config['latency'])
+
+        match = PAGE_RE.match(self.path.split('?', 1)[0])
+        lines = None
+        if match:
+            kind = 'chapter' if match.group(3) == 'advanced-view' else 'verse'
+            with self._lock:
+                self.stats[f'{kind}_pages'] += 1
+            lines = self._page_lines(int(match.group(1)), int(match.group(2)), match.group(3))
+        if lines is None:
+            self._send_html(404, ["Not Found!", "The page you requested does not exist."])
+        elif isinstance(lines, str):
+            self._send_redirect(lines)
+        else:
+            self._send_html(200, lines)
+
+
+def start_server(host='127.0.0.1', port=0, structure=None, joined=None, joined_pages='redirect', corpus_dir=None,
+                 latency=0.0, fail_every=0):
+    """Start the fake site in a daemon thread; returns (server, base_url).
+
+    ``server.stats`` counts requests, chapter and verse page loads and
+    injected failures.
+    """
+    if structure is None:
+        structure = corpus_structure(corpus_dir) if corpus_dir else DEFAULT_STRUCTURE
+    if joined is None:
+        joined = {} if corpus_dir else DEFAULT_JOINED
+    handler = type('ConfiguredFakeVedabaseHandler', (FakeVedabaseHandler,), {
+        "config": {"structure": structure, "joined": joined, "joined_pages": joined_pages, "corpus_dir": corpus_dir,
+                   "latency": latency, "fail_every": fail_every},
+        "stats": Counter(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.stats = handler.stats
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--corpus', help="serve these sb_advanced chapter files instead of synthetic ones")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds per request")
+    parser.add_argument('--fail-every', type=int, default=0, help="answer every Nth request with HTTP 503")
+    parser.add_argument('--joined-pages', choices=('redirect', 'first'), default='redirect',
+                        help="how verse numbers inside a joined range are served")
+    args = parser.parse_args()
+    server, base_url = start_server(args.host, args.port, joined_pages=args.joined_pages, corpus_dir=args.corpus,
+                                    latency=args.latency, fail_every=args.fail_every)
+    print(f"Fake vedabase listening on {base_url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
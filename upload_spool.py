@@ -0,0 +1,88 @@
+"""Single-pass spooling of uploaded files.
+
+Werkzeug buffers a multipart file part in a SpooledTemporaryFile; the
+upload route then read it once to hash it and once more to save it.
+``SpoolingRequest`` streams each file part straight into a ``.part`` file
+in the upload folder instead, updating its SHA-256 as the bytes arrive, so
+the route knows the hash when the body has been read and keeps the file
+by renaming it. Unkept spools are deleted when the request is closed.
+"""
+import hashlib
+import os
+import tempfile
+
+from flask import Request, current_app
+from werkzeug.formparser import FormDataParser, MultiPartParser
+
+# Read size of the multipart parser and write buffer of the spool file
+BUFFER_SIZE = 1024 * 1024
+
+
+class HashingSpool:
+    """Write-through file that hashes everything written to it."""
+
+    def __init__(self, folder, buffer_size=BUFFER_SIZE):
+        fd, self.path = tempfile.mkstemp(prefix='upload-', suffix='.part', dir=folder)
+        self._file = os.fdopen(fd, 'w+b', buffering=buffer_size)
+        self._hasher = hashlib.sha256()
+        self.size = 0
+        self._kept = False
+
+    def write(self, data):
+        self._hasher.update(data)
+        self.size += len(data)
+        return self._file.write(data)
+
+    def sha256(self):
+        return self._hasher.hexdigest()
+
+    def persist(self, path):
+        """Move the spooled file to path; it is no longer deleted on close."""
+        self._file.close()
+        os.replace(self.path, path)
+        self.path = path
+        self._kept = True
+
+    def close(self):
+        self._file.close()
+        if not self._kept:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+    def __del__(self):
+        # A body that fails to parse leaves its spool unattached to the request
+        if '_file' in self.__dict__:
+            self.close()
+
+    def __getattr__(self, name):
+        # read, seek, tell, ... of the underlying file, for FileStorage
+        return getattr(self._file, name)
+
+
+class SpoolingFormDataParser(FormDataParser):
+    """Multipart parsing with BUFFER_SIZE reads instead of Werkzeug's 64 KB."""
+
+    def _parse_multipart(self, stream, mimetype, content_length, options):
+        parser = MultiPartParser(
+            stream_factory=self.stream_factory,
+            max_form_memory_size=self.max_form_memory_size,
+            max_form_parts=self.max_form_parts,
+            cls=self.cls,
+            buffer_size=BUFFER_SIZE,
+        )
+        boundary = options.get("boundary", "").encode("ascii")
+        if not boundary:
+            raise ValueError("Missing boundary")
+        form, files = parser.parse(stream, boundary, content_length)
+        return stream, form, files
+
+
+class SpoolingRequest(Request):
+    """Request whose uploaded files are HashingSpools in UPLOAD_FOLDER."""
+
+    form_data_parser_class = SpoolingFormDataParser
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return HashingSpool(current_app.config['UPLOAD_FOLDER'])